@@ -4,9 +4,9 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from authlib.integrations.flask_client import OAuth
 from dotenv import load_dotenv
+import logging
 import os
-from flask_dance.contrib.google import make_google_blueprint
-from flask_dance.contrib.github import make_github_blueprint
+import secrets
 
 load_dotenv()
 
@@ -14,13 +14,23 @@ mongo = PyMongo()
 jwt = JWTManager()
 oauth = OAuth()
 
-def create_app():
+def create_app(config_class=None):
+    if config_class is None:
+        from config import Config as config_class
     app = Flask(__name__)
-    app.config['MONGO_URI'] = os.getenv('MONGO_URI')
-    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-    app.secret_key = os.getenv('FLASK_SECRET_KEY')
+    app.config.from_object(config_class)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY') or app.config['SECRET_KEY']
+    check_secrets(app)
 
-    mongo.init_app(app)
+    # Mongo documents (ObjectId, datetime, ...) go straight to jsonify
+    from app.serialization import init_json
+    init_json(app)
+
+    init_mongo(app)
+    from app.models.identity_map import report_round_trips
+    from app.metrics import init_metrics
+    app.after_request(report_round_trips)
+    init_metrics(app)
     jwt.init_app(app)
     CORS(app, supports_credentials=True)
     oauth.init_app(app)
@@ -68,99 +78,85 @@ def create_app():
     # github_bp = make_github_blueprint()
     # app.register_blueprint(github_bp, url_prefix='/login')
 
-    with app.app_context():
-        db = mongo.db
-        
-        # Create users collection and schema
-        if 'users' not in db.list_collection_names():
-            db.create_collection('users')
-        db.command({
-            'collMod': 'users',
-            'validator': {
-                '$jsonSchema': {
-                    'bsonType': 'object',
-                    'required': ['email', 'password_hash', 'name', 'role', 'active'],
-                    'properties': {
-                        'email': {'bsonType': 'string'},
-                        'password_hash': {'bsonType': 'string'},
-                        'name': {'bsonType': 'string'},
-                        'role': {'bsonType': 'string'},
-                        'active': {'bsonType': 'bool'},
-                        'oauth_provider': {'bsonType': ['string', 'null']},
-                        'oauth_id': {'bsonType': ['string', 'null']},
-                        'reset_token': {'bsonType': ['string', 'null']},
-                        'reset_token_expires': {'bsonType': ['date', 'null']}
-                    }
-                }
-            },
-            'validationLevel': 'strict'
-        })
-
-        # Create health_profiles collection and schema
-        if 'health_profiles' not in db.list_collection_names():
-            db.create_collection('health_profiles')
-        db.command({
-            'collMod': 'health_profiles',
-            'validator': {
-                '$jsonSchema': {
-                    'bsonType': 'object',
-                    'required': ['user_id', 'age', 'gender', 'height', 'weight', 'activity_level', 'last_updated'],
-                    'properties': {
-                        'user_id': {'bsonType': 'string'},
-                        'age': {'bsonType': 'int'},
-                        'gender': {'bsonType': 'string'},
-                        'height': {'bsonType': 'double'},
-                        'weight': {'bsonType': 'double'},
-                        'activity_level': {'bsonType': 'string'},
-                        'dietary_restrictions': {'bsonType': 'array'},
-                        'health_goals': {'bsonType': 'array'},
-                        'last_updated': {'bsonType': 'date'}
-                    }
-                }
-            },
-            'validationLevel': 'strict'
-        })
-
-        # Create meal_plans collection and schema
-        if 'meal_plans' not in db.list_collection_names():
-            db.create_collection('meal_plans')
-        db.command({
-            'collMod': 'meal_plans',
-            'validator': {
-                '$jsonSchema': {
-                    'bsonType': 'object',
-                    'required': ['user_id', 'meals', 'duration', 'start_date', 'status'],
-                    'properties': {
-                        'user_id': {'bsonType': 'string'},
-                        'meals': {'bsonType': 'array'},
-                        'duration': {'bsonType': 'int'},
-                        'start_date': {'bsonType': 'date'},
-                        'status': {'bsonType': 'string'}
-                    }
-                }
-            },
-            'validationLevel': 'strict'
-        })
-
-        from app.controllers import auth_controller
-        app.register_blueprint(auth_controller.bp)
-        
-        # Initialize database collections
-        init_database(mongo.db)
-
-    from app.controllers import auth_controller, profile_controller, meal_plan_controlller
+    from app.controllers import auth_controller, profile_controller, meal_plan_controlller, health_controller
+    app.register_blueprint(health_controller.bp)
     app.register_blueprint(auth_controller.bp)
     app.register_blueprint(profile_controller.bp)
     app.register_blueprint(meal_plan_controlller.bp)
 
-    #Initialize database collections
-    init_database(mongo.db)
-    
-    
+    # Collections, validators and indexes are owned by `flask db-bootstrap`;
+    # workers do no DDL unless explicitly asked to (handy for local dev)
+    if os.getenv('DB_BOOTSTRAP_ON_STARTUP', '').lower() in ('1', 'true', 'yes'):
+        with app.app_context():
+            init_database(mongo.db)
+
+    # Send queued mail from a thread in this process instead of a separate
+    # `flask email-sender` process (serve.py turns this on by default)
+    email_sender_in_process = os.getenv('EMAIL_SENDER_IN_PROCESS', '').lower()
+    if email_sender_in_process in ('1', 'true', 'yes'):
+        from app.services.email_service import init_outbox_sender
+        init_outbox_sender(app)
+    elif not email_sender_in_process and not app.testing:
+        logging.getLogger(__name__).warning(
+            'EMAIL_SENDER_IN_PROCESS is not set: queued mail, including password reset codes, '
+            'is only delivered while `flask email-sender` runs. Set it to 1 to send from this '
+            'process, or to 0 when a separate sender is running.'
+        )
+
+    from app.cli import register_commands
+    register_commands(app)
+
     return app
+
+# Values earlier versions shipped as defaults; anyone could sign with them
+INSECURE_SECRETS = frozenset({'dev-secret-key', 'jwt-secret-key'})
+
+def check_secrets(app):
+    """
+    SECRET_KEY and JWT_SECRET_KEY sign sessions and access tokens, so they
+    have no defaults: raise if either is unset or a known placeholder. In
+    debug or testing a random per-process key is used instead.
+    """
+    missing = [
+        key for key in ('SECRET_KEY', 'JWT_SECRET_KEY')
+        if not app.config.get(key) or app.config[key] in INSECURE_SECRETS
+    ]
+    if not missing:
+        return
+    if not (app.debug or app.testing):
+        raise RuntimeError(
+            f"{' and '.join(missing)} must be set in the environment or .env "
+            "(or set FLASK_DEBUG=1 for a throwaway key)"
+        )
+    for key in missing:
+        app.config[key] = secrets.token_hex(32)
+
+def init_mongo(app):
+    """
+    (Re)create the MongoClient with the pool settings from the config. The
+    client doesn't connect until first used, so it is safe to build before
+    a fork; serve.py calls this again in every worker after forking.
+    """
+    # Count commands per request and report them in X-DB-Round-Trips, and
+    # time them by collection for /metrics
+    from app.models.identity_map import RoundTripCounter
+    from app.metrics import MongoCommandMetrics
+    config = app.config
+    mongo.init_app(
+        app,
+        connect=False,
+        event_listeners=[RoundTripCounter(), MongoCommandMetrics()],
+        maxPoolSize=config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=config['MONGO_MAX_IDLE_TIME_MS'],
+        waitQueueTimeoutMS=config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        connectTimeoutMS=config['MONGO_CONNECT_TIMEOUT_MS'],
+        serverSelectionTimeoutMS=config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        socketTimeoutMS=config['MONGO_SOCKET_TIMEOUT_MS']
+    )
+
 def init_database(db):
-    # Create collections if they don't exist
-    if 'users' not in db.list_collection_names():
-        db.create_collection('users')
-        db.users.create_index('email', unique=True)
-        db.users.create_index([('oauth_provider', 1), ('oauth_id', 1)], unique=True)
+    from app.models.schemas import apply_schemas
+    from app.models.indexes import ensure_indexes
+    apply_schemas(db)
+    return ensure_indexes(db)
@@ -0,0 +1,132 @@
+"""
+Motor versions of the data access in app.models, for the ASGI app.
+
+Documents, queries and indexes are the same as the synchronous models, and
+the plain model classes still build documents and queries
+(`User(...).to_dict()`, `MealPlan.page_query`, ...). The per-request
+identity map lives on flask.g and has no equivalent here; the health
+profile cache is shared, and reached through a thread when its backend
+does I/O (SQLite) so a slow disk doesn't stall the event loop.
+"""
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.aio.mongo import aio_mongo
+from app.cache import MISSING
+from app.models.health_profile import HealthProfile, cache_version, profile_cache
+from app.models.meal_plan import MealPlan
+from app.models.user import User
+
+
+class AsyncUser:
+    @staticmethod
+    async def save(user):
+        user_data = user.to_dict()
+        user_data['password_hash'] = user.password_hash
+        result = await aio_mongo.db.users.insert_one(user_data)
+        return str(result.inserted_id)
+
+    @staticmethod
+    async def find_by_email(email):
+        return await aio_mongo.db.users.find_one(User.email_query(email))
+
+    @staticmethod
+    async def find_by_id(user_id):
+        return await aio_mongo.db.users.find_one({'_id': ObjectId(user_id)})
+
+    @staticmethod
+    async def update_password_hash(user_id, old_hash, new_hash):
+        return await aio_mongo.db.users.update_one(
+            {'_id': ObjectId(user_id), 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash}}
+        )
+
+
+async def _profile_cache(method, *args, **kwargs):
+    call = getattr(profile_cache, method)
+    if not profile_cache.blocking:
+        return call(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: call(*args, **kwargs))
+
+
+class AsyncHealthProfile:
+    @staticmethod
+    async def save(health_profile):
+        """
+        Upsert `health_profile` (an app.models.HealthProfile) by user_id and
+        return the stored _id as a string.
+        """
+        try:
+            profile = await AsyncHealthProfile._upsert(health_profile)
+        except DuplicateKeyError:
+            profile = await AsyncHealthProfile._upsert(health_profile)
+        await _profile_cache('set', health_profile.user_id, profile, version=cache_version(profile))
+        return str(profile['_id'])
+
+    @staticmethod
+    async def _upsert(health_profile):
+        return await aio_mongo.db.health_profiles.find_one_and_update(
+            {'user_id': health_profile.user_id},
+            {'$set': health_profile.to_dict()},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    async def find_by_user_id(user_id):
+        profile = await _profile_cache('get', user_id)
+        if profile is MISSING:
+            profile = await aio_mongo.db.health_profiles.find_one(HealthProfile.user_query(user_id))
+            await _profile_cache('set', user_id, profile, version=cache_version(profile))
+        return profile
+
+    @staticmethod
+    async def update(user_id, updates):
+        updates['last_updated'] = datetime.utcnow()
+        profile = await aio_mongo.db.health_profiles.find_one_and_update(
+            {'user_id': user_id},
+            {'$set': updates},
+            return_document=ReturnDocument.AFTER
+        )
+        if profile is not None:
+            await _profile_cache('set', user_id, profile, version=cache_version(profile))
+        else:
+            await _profile_cache('delete', user_id)
+        return profile
+
+
+class AsyncMealPlan:
+    @staticmethod
+    async def save(meal_plan):
+        result = await aio_mongo.db.meal_plans.insert_one(meal_plan.to_dict())
+        return str(result.inserted_id)
+
+    @staticmethod
+    def iter_by_user_id(user_id, after=None, projection=None, limit=0, batch_size=50):
+        """
+        Motor cursor over a user's plans, like MealPlan.iter_by_user_id.
+        """
+        return aio_mongo.db.meal_plans.find(
+            MealPlan.page_query(user_id, after), projection, sort=MealPlan.SORT, limit=limit, batch_size=batch_size
+        )
+
+    @staticmethod
+    async def find_page(user_id, limit, after=None, projection=None):
+        """
+        Same paging as MealPlan.find_page: up to `limit` plans and the
+        cursor for the next page, or None on the last page.
+        """
+        cursor = AsyncMealPlan.iter_by_user_id(
+            user_id, after=after, projection=projection, limit=limit + 1, batch_size=limit + 1
+        )
+        plans = await cursor.to_list(length=limit + 1)
+        next_cursor = None
+        if len(plans) > limit:
+            plans = plans[:limit]
+            next_cursor = MealPlan.encode_cursor(plans[-1])
+        return plans, next_cursor
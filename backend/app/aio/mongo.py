@@ -0,0 +1,35 @@
+import os
+
+# Motor is only needed for the ASGI entry point (asgi.py)
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:  # pragma: no cover - depends on the environment
+    AsyncIOMotorClient = None
+
+
+class AsyncMongo:
+    """
+    The async counterpart of the flask_pymongo `mongo` object: a Motor client
+    and its default database. Motor binds to the running event loop on
+    first use, so init() belongs in the ASGI app's startup, not at import.
+    """
+
+    def __init__(self):
+        self.cx = None
+        self.db = None
+
+    def init(self, uri=None, **kwargs):
+        if AsyncIOMotorClient is None:
+            raise RuntimeError('The async mode needs motor: pip install motor')
+        uri = uri or os.getenv('MONGO_URI')
+        kwargs.setdefault('maxPoolSize', int(os.getenv('ASYNC_MONGO_POOL_SIZE', 100)))
+        self.cx = AsyncIOMotorClient(uri, **kwargs)
+        self.db = self.cx.get_default_database()
+
+    def close(self):
+        if self.cx is not None:
+            self.cx.close()
+            self.cx = self.db = None
+
+
+aio_mongo = AsyncMongo()
@@ -0,0 +1,205 @@
+"""
+The ASGI app: the I/O-bound endpoints served natively on the event loop,
+everything else forwarded to the Flask app.
+
+Native routes answer with the same paths, bodies and status codes as their
+Flask controllers. JWTs are checked with flask_jwt_extended inside the
+Flask app context, so tokens and configuration are shared between modes.
+"""
+from contextlib import asynccontextmanager
+
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+
+from app import http_cache
+from app.aio.mongo import aio_mongo
+from app.aio.services import AsyncAssessmentService, AsyncAuthService, AsyncMealPlanningService
+from app.metrics import MongoCommandMetrics
+from app.models.meal_plan import MealPlan
+from app.serialization import dumps_bytes, loads
+from app.services.meal_planning_service import DEFAULT_PAGE_SIZE
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+assessment_service = AsyncAssessmentService()
+meal_planning_service = AsyncMealPlanningService()
+
+
+class HTTPError(Exception):
+    def __init__(self, body, status_code):
+        self.body = body
+        self.status_code = status_code
+
+
+def json_response(body, status_code=200, headers=None):
+    return Response(dumps_bytes(body), status_code, headers, media_type='application/json')
+
+
+async def json_body(request):
+    try:
+        return loads(await request.body())
+    except ValueError:
+        raise HTTPError({'success': False, 'message': 'Invalid JSON body'}, 400)
+
+
+def current_identity(request):
+    """
+    The JWT identity from the Authorization header, rejected the way
+    @jwt_required() rejects it. Needs the Flask app context.
+    """
+    header = request.headers.get('Authorization', '')
+    if not header:
+        raise HTTPError({'msg': 'Missing Authorization Header'}, 401)
+    scheme, _, token = header.partition(' ')
+    if scheme != 'Bearer' or not token:
+        raise HTTPError({'msg': "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+    try:
+        decoded = decode_token(token)
+    except ExpiredSignatureError:
+        raise HTTPError({'msg': 'Token has expired'}, 401)
+    except (InvalidTokenError, JWTExtendedException) as e:
+        raise HTTPError({'msg': str(e)}, 422)
+    if decoded.get('type') != 'access':
+        raise HTTPError({'msg': 'Only non-refresh tokens are allowed'}, 422)
+    return decoded[request.app.state.flask_app.config['JWT_IDENTITY_CLAIM']]
+
+
+def endpoint(handler):
+    """
+    Run `handler(request)` inside the Flask app context and turn its
+    (body, status) result or HTTPError into a JSON response.
+    """
+    async def view(request):
+        with request.app.state.flask_app.app_context():
+            try:
+                result = await handler(request)
+            except HTTPError as e:
+                return json_response(e.body, e.status_code)
+        if isinstance(result, Response):
+            return result
+        return json_response(*result)
+    return view
+
+
+@endpoint
+async def register(request):
+    data = await json_body(request)
+    if not all(k in data for k in ['email', 'password', 'name', 'role']):
+        return {'success': False, 'message': 'Missing required fields'}, 400
+    return await AsyncAuthService.register(data['email'], data['password'], data['name'], data['role'])
+
+
+@endpoint
+async def login(request):
+    data = await json_body(request)
+    if not all(k in data for k in ['email', 'password']):
+        return {'success': False, 'message': 'Missing required fields'}, 400
+    return await AsyncAuthService.login(data['email'], data['password'])
+
+
+@endpoint
+async def create_health_profile(request):
+    user_id = current_identity(request)
+    data = await json_body(request)
+    required_fields = ['age', 'gender', 'height', 'weight', 'activity_level']
+    if not all(k in data for k in required_fields):
+        return {'success': False, 'message': 'Missing required fields'}, 400
+    return await assessment_service.create_health_profile(user_id, data)
+
+
+@endpoint
+async def get_health_profile(request):
+    user_id = current_identity(request)
+    result, status_code = await assessment_service.get_health_profile(user_id)
+    if status_code != 200:
+        return result, status_code
+
+    profile = result['profile']
+    etag = http_cache.make_etag('health_profile', user_id, profile.get('_id'), profile.get('last_updated'))
+    headers = {'ETag': etag, 'Cache-Control': http_cache.PRIVATE_REVALIDATE}
+    if parse_etags(request.headers.get('If-None-Match')).contains_weak(etag.strip('"')):
+        return Response(status_code=304, headers=headers)
+    return json_response(result, headers=headers)
+
+
+@endpoint
+async def update_health_profile(request):
+    user_id = current_identity(request)
+    data = await json_body(request)
+    return await assessment_service.update_health_profile(user_id, data)
+
+
+@endpoint
+async def create_meal_plan(request):
+    user_id = current_identity(request)
+    data = await json_body(request)
+    if 'duration' not in data:
+        return {'success': False, 'message': 'Duration is required'}, 400
+    return await meal_planning_service.create_meal_plan(user_id, data['duration'])
+
+
+@endpoint
+async def get_meal_plans(request):
+    user_id = current_identity(request)
+    params = request.query_params
+    fields = params.get('fields', 'full')
+    if fields not in MealPlan.PROJECTIONS:
+        return {'success': False, 'message': f'Unknown fields value: {fields}'}, 400
+    if params.get('stream') in ('1', 'true') or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        try:
+            lines = meal_planning_service.stream_meal_plans(user_id, cursor=params.get('cursor'), fields=fields)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
+        return StreamingResponse(lines, media_type='application/x-ndjson')
+    try:
+        limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return {'success': False, 'message': 'limit must be an integer'}, 400
+    return await meal_planning_service.get_meal_plans(
+        user_id, limit=limit, cursor=params.get('cursor'), fields=fields
+    )
+
+
+def create_asgi_app(flask_app):
+    """
+    Wrap `flask_app` (from create_app()) in a Starlette app that serves the
+    routes above with Motor and passes every other request to Flask.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        aio_mongo.init(flask_app.config['MONGO_URI'], event_listeners=[MongoCommandMetrics()])
+        try:
+            yield
+        finally:
+            aio_mongo.close()
+
+    app = Starlette(
+        routes=[
+            Route('/api/auth/register', register, methods=['POST']),
+            Route('/api/auth/login', login, methods=['POST']),
+            Route('/api/profile/health', get_health_profile, methods=['GET']),
+            Route('/api/profile/health', create_health_profile, methods=['POST']),
+            Route('/api/profile/health', update_health_profile, methods=['PUT']),
+            Route('/api/meal-plan', get_meal_plans, methods=['GET']),
+            Route('/api/meal-plan', create_meal_plan, methods=['POST']),
+            Mount('/', WSGIMiddleware(flask_app))
+        ],
+        # Matches CORS(app, supports_credentials=True) on the Flask side
+        middleware=[Middleware(
+            CORSMiddleware, allow_origin_regex='.*', allow_credentials=True,
+            allow_methods=['*'], allow_headers=['*']
+        )],
+        lifespan=lifespan
+    )
+    app.state.flask_app = flask_app
+    return app
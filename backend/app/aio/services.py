@@ -0,0 +1,194 @@
+"""
+Async versions of the auth, assessment and meal planning services. They
+return the same (dict, status) pairs as app.services, so the ASGI routes
+can answer exactly like the Flask controllers.
+
+Anything CPU-bound (password hashing, nutrition and meal selection) runs
+off the event loop; the services only await I/O.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from flask_jwt_extended import create_access_token
+
+from app.aio.models import AsyncHealthProfile, AsyncMealPlan, AsyncUser
+from app.models.health_profile import HealthProfile
+from app.models.meal_plan import MealPlan
+from app.models.user import User
+from app.serialization import dumps
+from app.services.meal_planning_service import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MealPlanningService
+from app.services.password_hasher import HashingOverloaded, password_hasher
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAuthService:
+    # Background rehash tasks, kept referenced until they finish
+    _pending = set()
+
+    @staticmethod
+    async def register(email, password, name, role):
+        if await AsyncUser.find_by_email(email):
+            return {'success': False, 'message': 'Email already registered'}, 400
+
+        try:
+            password_hash = await asyncio.wrap_future(password_hasher.hash_async(password))
+            user = User(email=email, name=name, role=role, password_hash=password_hash)
+            user_id = await AsyncUser.save(user)
+            return {
+                'success': True,
+                'message': 'User registered successfully',
+                'access_token': create_access_token(identity=user_id),
+                'user': user.to_dict()
+            }, 201
+        except HashingOverloaded:
+            return {'success': False, 'message': 'Server busy, please retry'}, 503
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    @staticmethod
+    async def login(email, password):
+        user = await AsyncUser.find_by_email(email)
+        if not user:
+            return {'success': False, 'message': 'User not found'}, 404
+
+        try:
+            valid = await asyncio.wrap_future(password_hasher.verify_async(user['password_hash'], password))
+        except HashingOverloaded:
+            return {'success': False, 'message': 'Server busy, please retry'}, 503
+
+        if not valid:
+            return {'success': False, 'message': 'Invalid credentials'}, 401
+        if password_hasher.needs_rehash(user['password_hash']):
+            AsyncAuthService._rehash_in_background(user['_id'], user['password_hash'], password)
+        return {
+            'success': True,
+            'access_token': create_access_token(identity=str(user['_id'])),
+            'user': {
+                'id': str(user['_id']),
+                'email': user['email'],
+                'name': user['name'],
+                'role': user['role']
+            }
+        }, 200
+
+    @staticmethod
+    def _rehash_in_background(user_id, old_hash, password):
+        async def rehash():
+            try:
+                new_hash = await asyncio.wrap_future(password_hasher.hash_async(password))
+                await AsyncUser.update_password_hash(user_id, old_hash, new_hash)
+            except HashingOverloaded:
+                pass  # Try again on a later login
+            except Exception as e:
+                logger.warning(f"Password rehash failed for {user_id}: {e}")
+
+        task = asyncio.ensure_future(rehash())
+        AsyncAuthService._pending.add(task)
+        task.add_done_callback(AsyncAuthService._pending.discard)
+
+
+class AsyncAssessmentService:
+    async def create_health_profile(self, user_id, profile_data):
+        try:
+            health_profile = HealthProfile(
+                user_id=user_id,
+                age=profile_data['age'],
+                gender=profile_data['gender'],
+                height=profile_data['height'],
+                weight=profile_data['weight'],
+                activity_level=profile_data['activity_level'],
+                dietary_restrictions=profile_data.get('dietary_restrictions', []),
+                health_goals=profile_data.get('health_goals', [])
+            )
+            profile_id = await AsyncHealthProfile.save(health_profile)
+            return {
+                'success': True,
+                'message': 'Health profile created successfully',
+                'profile_id': profile_id,
+                'profile': health_profile.to_dict()
+            }, 201
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    async def get_health_profile(self, user_id):
+        try:
+            profile = await AsyncHealthProfile.find_by_user_id(user_id)
+            if not profile:
+                return {'success': False, 'message': 'Health profile not found'}, 404
+            return {'success': True, 'profile': profile}, 200
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    async def update_health_profile(self, user_id, updates):
+        try:
+            updated_profile = await AsyncHealthProfile.update(user_id, updates)
+            if updated_profile is None:
+                return {'success': False, 'message': 'Health profile not found'}, 404
+            return {
+                'success': True,
+                'message': 'Health profile updated successfully',
+                'profile': updated_profile
+            }, 200
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+
+class AsyncMealPlanningService:
+    def __init__(self):
+        # Nutrition and meal selection are shared with the sync service
+        self.planner = MealPlanningService()
+
+    def _plan(self, health_profile, duration):
+        recommendations = self.planner.nutrition_recommender.recommend_nutrition(health_profile)
+        return self.planner._generate_meals(
+            recommendations, duration, health_profile.get('dietary_restrictions', [])
+        )
+
+    async def create_meal_plan(self, user_id, duration):
+        try:
+            health_profile = await AsyncHealthProfile.find_by_user_id(user_id)
+            if not health_profile:
+                return {'success': False, 'message': 'Health profile not found'}, 404
+
+            loop = asyncio.get_running_loop()
+            meals = await loop.run_in_executor(None, self._plan, health_profile, duration)
+            meal_plan = MealPlan(user_id=user_id, meals=meals, duration=duration, start_date=datetime.utcnow())
+            meal_plan_id = await AsyncMealPlan.save(meal_plan)
+            return {
+                'success': True,
+                'message': 'Meal plan created successfully',
+                'meal_plan_id': meal_plan_id,
+                'meal_plan': meal_plan.to_dict(),
+                'unrecognized_restrictions': self.planner.unrecognized_restrictions(health_profile)
+            }, 201
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    async def get_meal_plans(self, user_id, limit=DEFAULT_PAGE_SIZE, cursor=None, fields='full'):
+        try:
+            plans, next_cursor = await AsyncMealPlan.find_page(
+                user_id,
+                limit=min(max(limit, 1), MAX_PAGE_SIZE),
+                after=MealPlan.decode_cursor(cursor) if cursor else None,
+                projection=MealPlan.PROJECTIONS[fields]
+            )
+            return {'success': True, 'meal_plans': plans, 'next_cursor': next_cursor}, 200
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    def stream_meal_plans(self, user_id, cursor=None, fields='full'):
+        """
+        Async generator of NDJSON lines straight off a Motor cursor. Raises
+        ValueError up front for a malformed cursor.
+        """
+        after = MealPlan.decode_cursor(cursor) if cursor else None
+        plans = AsyncMealPlan.iter_by_user_id(user_id, after=after, projection=MealPlan.PROJECTIONS[fields])
+
+        async def lines():
+            async for plan in plans:
+                yield dumps(plan) + '\n'
+        return lines()
@@ -0,0 +1,264 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import bson
+from bson.errors import BSONError
+
+# Returned by get() on a miss, so that None can be cached too
+MISSING = object()
+
+# Every backend's set() takes an optional `version` (any number that grows
+# with the underlying data, e.g. a last-modified timestamp). A versioned set
+# is refused while a live entry with a newer version exists, so a reader
+# that loaded a value before a concurrent write can't put the old value back
+# over the writer's. Unversioned sets always overwrite.
+
+
+class CacheStats:
+    # Whether get/set/delete do I/O, so async callers know to run them off
+    # the event loop
+    blocking = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class NullCache(CacheStats):
+    """
+    Cache that never stores anything, for turning caching off.
+    """
+
+    def get(self, key):
+        self.record(False)
+        return MISSING
+
+    def set(self, key, value, version=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheStats):
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL.
+
+    Values are pickled on the way in and unpickled on the way out, so callers
+    can mutate what they get back without corrupting the cached copy. With
+    `copy_values=False` values are stored as is, for callers that never
+    mutate them or copy them more cheaply themselves.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60, copy_values=True):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.copy_values = copy_values
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.record(True)
+                return pickle.loads(entry[0]) if self.copy_values else entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.record(False)
+        return MISSING
+
+    def set(self, key, value, version=None):
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL) if self.copy_values else value
+        now = time.monotonic()
+        with self._lock:
+            current = self._entries.get(key)
+            if (version is not None and current is not None and current[1] > now
+                    and current[2] is not None and current[2] > version):
+                return
+            self._entries[key] = (payload, now + self.ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(CacheStats):
+    """
+    TTL cache in a local SQLite file shared by every worker process on the
+    host, so an invalidation in one worker is seen by all of them.
+
+    Once the table grows past `max_entries`, the entries closest to expiry
+    are evicted. Hit/miss counters are per process.
+
+    Values are stored as BSON, so the usual Mongo types (ObjectId,
+    datetime) round-trip but nothing read back from the file can run code.
+    The file is created 0600 and refused if another user owns it.
+    """
+
+    blocking = True
+
+    def __init__(self, path, max_entries=100000, ttl=300, evict_every=256):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        # SQLite connections can't cross threads or forks
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            _open_private(self.path)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, version REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+            try:
+                # Files created before entries were versioned
+                conn.execute('ALTER TABLE cache ADD COLUMN version REAL')
+            except sqlite3.OperationalError:
+                pass
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        if row is not None:
+            try:
+                value = bson.decode(row[0])['v']
+            except (BSONError, KeyError):
+                # Not ours (e.g. written by an older, pickling version)
+                row = None
+        self.record(row is not None)
+        return value if row is not None else MISSING
+
+    def set(self, key, value, version=None):
+        conn = self._conn()
+        now = time.time()
+        # One statement, so the version check and the write are atomic
+        # across processes
+        conn.execute(
+            'INSERT INTO cache (key, value, expires_at, version) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires_at = excluded.expires_at, version = excluded.version '
+            'WHERE excluded.version IS NULL OR cache.version IS NULL '
+            'OR cache.version <= excluded.version OR cache.expires_at <= ?',
+            (key, bson.encode({'v': value}), now + self.ttl, version, now)
+        )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        overflow = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY expires_at LIMIT ?)', (overflow,)
+            )
+            self.evictions += overflow
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache')
+
+
+def _check_owner(st, path):
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise PermissionError(f'{path} is owned by another user; refusing to use it')
+
+
+def _open_private(path):
+    """
+    Create `path` readable by this user only, or check that the existing
+    file is this user's. Symlinks are not followed.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    try:
+        _check_owner(os.fstat(fd), path)
+    finally:
+        os.close(fd)
+
+
+def private_dir(name):
+    """
+    A 0700 directory for `name` under the system temp dir, owned by this
+    user.
+    """
+    path = os.path.join(tempfile.gettempdir(), f'{name}-{os.getuid()}' if hasattr(os, 'getuid') else name)
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    _check_owner(st, path)
+    if not os.path.isdir(path) or os.path.islink(path) or st.st_mode & 0o077:
+        raise PermissionError(f'{path} must be a directory only its owner can access')
+    return path
+
+
+def make_cache(prefix, default_backend='memory', default_ttl=60, default_size=10000):
+    """
+    Build a cache configured from <PREFIX>_BACKEND (memory, sqlite or none),
+    <PREFIX>_TTL, <PREFIX>_MAX_ENTRIES and, for sqlite, <PREFIX>_PATH
+    (default: a file in a private per-user directory under the temp dir).
+    """
+    backend = os.getenv(f'{prefix}_BACKEND', default_backend).lower()
+    ttl = float(os.getenv(f'{prefix}_TTL', default_ttl))
+    size = int(os.getenv(f'{prefix}_MAX_ENTRIES', default_size))
+    if backend == 'none':
+        return NullCache()
+    if backend == 'sqlite':
+        path = os.getenv(f'{prefix}_PATH') or os.path.join(private_dir('dietcraft-cache'), f'{prefix.lower()}.sqlite3')
+        return SQLiteCache(path, max_entries=size, ttl=ttl)
+    if backend == 'memory':
+        return MemoryCache(max_entries=size, ttl=ttl)
+    raise ValueError(f'Unknown cache backend for {prefix}: {backend}')
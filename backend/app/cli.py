@@ -0,0 +1,253 @@
+import click
+from flask.cli import with_appcontext
+
+from app import mongo, init_database
+from app.models.indexes import DuplicateKeysError, ensure_indexes, check_query_plans, remove_duplicates
+
+
+@click.command('db-bootstrap')
+@with_appcontext
+def db_bootstrap_command():
+    """Create collections, install validators and build indexes.
+
+    Run once per deploy (or after changing app/models/schemas.py or
+    app/models/indexes.py) instead of on every worker start.
+    """
+    try:
+        actions = init_database(mongo.db)
+    except DuplicateKeysError as e:
+        raise click.ClickException(str(e))
+    click.echo('Collection validators applied')
+    for collection, name, action in actions:
+        click.echo(f'{collection}.{name}: {action}')
+
+
+@click.command('db-indexes')
+@with_appcontext
+def db_indexes_command():
+    """Create or update every index in the registry."""
+    try:
+        actions = ensure_indexes(mongo.db)
+    except DuplicateKeysError as e:
+        raise click.ClickException(str(e))
+    for collection, name, action in actions:
+        click.echo(f'{collection}.{name}: {action}')
+    if not actions:
+        click.echo('All indexes up to date')
+
+
+@click.command('db-dedupe-profiles')
+@click.option('--dry-run', is_flag=True, help='Only count the profiles that would be removed.')
+@with_appcontext
+def db_dedupe_profiles_command(dry_run):
+    """Keep only the newest health profile of every user.
+
+    Older versions created a new profile on every save; run this before
+    `flask db-indexes` builds the unique user_id index on such a database.
+    """
+    removed = remove_duplicates(
+        mongo.db.health_profiles, ['user_id'], [('last_updated', -1), ('_id', -1)], dry_run=dry_run
+    )
+    click.echo(f"{removed} duplicate profiles {'would be ' if dry_run else ''}removed")
+
+
+@click.command('db-check-plans')
+@click.option('--skip-indexes', is_flag=True, help='Explain against the indexes as they are.')
+@with_appcontext
+def db_check_plans_command(skip_indexes):
+    """Fail if any model query falls back to a collection scan.
+
+    Meant to run against a local mongod, e.g.
+    MONGO_URI=mongodb://localhost:27017/dietcraft_test flask db-check-plans
+    """
+    if not skip_indexes:
+        ensure_indexes(mongo.db)
+    offenders = check_query_plans(mongo.db)
+    for name, stages in offenders:
+        click.echo(f"COLLSCAN: {name} ({' -> '.join(stages)})", err=True)
+    if offenders:
+        raise SystemExit(1)
+    click.echo('All model queries use an index')
+
+
+@click.command('model-activate')
+@click.argument('version')
+@click.option('--model-dir', envvar='NUTRITION_MODEL_DIR', required=True,
+              help='Artifact root (defaults to NUTRITION_MODEL_DIR).')
+def model_activate_command(version, model_dir):
+    """Make VERSION the model every worker serves.
+
+    Workers notice the change on their next reload check, without a restart.
+    """
+    from app.ml_models.model_artifact import activate_version
+    activate_version(model_dir, version)
+    click.echo(f'{model_dir}: serving {version}')
+
+
+@click.command('email-sender')
+@click.option('--once', is_flag=True, help='Send one batch and exit.')
+@with_appcontext
+def email_sender_command(once):
+    """Deliver queued mail from the email outbox until interrupted."""
+    from flask import current_app
+    from app.services.email_service import OutboxSender
+    sender = OutboxSender(current_app._get_current_object())
+    if once:
+        click.echo(f'Processed {sender.drain_once()} messages')
+        return
+    sender.run_forever()
+
+
+@click.command('email-requeue-dead')
+@with_appcontext
+def email_requeue_dead_command():
+    """Give dead-lettered messages that still have a body a fresh set of attempts."""
+    from app.models.email_outbox import EmailOutbox
+    click.echo(f'Requeued {EmailOutbox.requeue_dead()} messages')
+
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+@click.command('import-data')
+@click.argument('collection', type=click.Choice(['users', 'health_profiles', 'meal_plans']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--reject-file', type=click.Path(dir_okay=False),
+              help='Where rejected rows go (defaults to PATH.rejects.jsonl).')
+@click.option('--upsert-key', help='Replace documents matching this field instead of inserting, e.g. user_id.')
+@with_appcontext
+def import_data_command(collection, path, fmt, chunk_size, reject_file, upsert_key):
+    """Bulk load COLLECTION from a CSV or JSONL file.
+
+    Rows are validated against app/models/schemas.py before they are sent;
+    invalid rows and rows the server refuses go to the reject file.
+    """
+    from app.services.bulk_io import import_documents
+    reject_file = reject_file or f'{path}.rejects.jsonl'
+    with open(path, newline='', encoding='utf-8') as stream, \
+            open(reject_file, 'w', encoding='utf-8') as rejects:
+        stats = import_documents(
+            collection, stream, _format_for(path, fmt), rejects, chunk_size=chunk_size,
+            upsert_key=upsert_key,
+            progress=lambda s: click.echo(f'{s.read} rows read, {s.rows_per_second:.0f} rows/s', err=True)
+        )
+    click.echo(f'{collection}: {stats.to_dict()}')
+    if stats.rejected:
+        click.echo(f'Rejected rows written to {reject_file}')
+
+
+@click.command('export-data')
+@click.argument('collection', type=click.Choice(['users', 'health_profiles', 'meal_plans']))
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@with_appcontext
+def export_data_command(collection, path, fmt, batch_size):
+    """Stream COLLECTION to a CSV or JSONL file (stdout by default)."""
+    from app.services.bulk_io import export_documents
+    with click.open_file(path, 'w', encoding='utf-8') as stream:
+        count = export_documents(collection, stream, _format_for(path, fmt), batch_size=batch_size)
+    click.echo(f'{collection}: exported {count} documents', err=True)
+
+
+@click.command('regenerate-meal-plans')
+@click.option('--chunk-size', default=500, show_default=True, help='Profiles per worker task.')
+@click.option('--workers', type=int, help='Worker processes (defaults to the CPU count).')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first profile.')
+@click.option('--include-without-plan', is_flag=True,
+              help='Also create a plan for users who have no active one.')
+@with_appcontext
+def regenerate_meal_plans_command(chunk_size, workers, restart, include_without_plan):
+    """Rebuild every user's active meal plan, e.g. after nutrition rules change.
+
+    Resumes from the last checkpoint when interrupted.
+    """
+    from app.services.plan_regeneration import MealPlanRegenerationJob
+    job = MealPlanRegenerationJob(
+        chunk_size=chunk_size, workers=workers, include_without_plan=include_without_plan
+    )
+    state = job.run(
+        restart=restart,
+        progress=lambda s: click.echo(
+            f'{s.processed} profiles, {s.written} plans written, {s.profiles_per_second:.0f} profiles/s',
+            err=True
+        )
+    )
+    click.echo(f'Done: {state.to_dict()}')
+    if state.failed:
+        from app.models.job_checkpoint import JobCheckpoint
+        failures = JobCheckpoint.load(job.job_name).get('failures', [])
+        click.echo(f'{state.failed} profiles could not be planned and kept their plans; first {len(failures)}:', err=True)
+        for failure in failures:
+            click.echo(f"  {failure['user_id']}: {failure['error']}", err=True)
+
+
+@click.command('replanning-consumer')
+@click.option('--debounce', default=5.0, show_default=True,
+              help='Seconds a profile must be quiet before its plans are re-planned.')
+@click.option('--max-wait', default=60.0, show_default=True,
+              help='Re-plan at most this many seconds after the first pending edit.')
+@click.option('--restart', is_flag=True, help='Ignore the saved resume token and start from now.')
+@with_appcontext
+def replanning_consumer_command(debounce, max_wait, restart):
+    """Re-plan future meal plan days as health profiles change.
+
+    Follows the health_profiles change stream (needs a replica set) and
+    resumes from its checkpoint after a restart. Stop with Ctrl-C.
+    """
+    import threading
+    from app.services.replanning_consumer import ReplanningConsumer
+    consumer = ReplanningConsumer(debounce=debounce, max_wait=max_wait)
+    stop = threading.Event()
+    crashed = []
+
+    def run():
+        try:
+            consumer.run(
+                restart=restart, stop=stop,
+                on_replan=lambda user_id, plans: click.echo(f'{user_id}: {plans} plan(s) re-planned')
+            )
+        except Exception as e:
+            crashed.append(e)
+
+    worker = threading.Thread(target=run, name='replanning-consumer')
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        click.echo('Stopping after pending users are re-planned...', err=True)
+        stop.set()
+        worker.join()
+    if crashed:
+        # Users not yet re-planned are replayed from the checkpoint on restart
+        raise click.ClickException(
+            f'Consumer stopped on {type(crashed[0]).__name__}: {crashed[0]} '
+            f'(so far: {consumer.stats.to_dict()}); restart to resume from the checkpoint'
+        )
+    click.echo(f'Done: {consumer.stats.to_dict()}')
+    if consumer.stats.failed:
+        from app.models.job_checkpoint import JobCheckpoint
+        failures = JobCheckpoint.load(consumer.job_name).get('failures', [])
+        click.echo(f'{consumer.stats.failed} users could not be re-planned; last {len(failures)} recorded:', err=True)
+        for failure in failures:
+            click.echo(f"  {failure['user_id']}: {failure['error']}", err=True)
+
+
+def register_commands(app):
+    app.cli.add_command(db_bootstrap_command)
+    app.cli.add_command(db_indexes_command)
+    app.cli.add_command(db_dedupe_profiles_command)
+    app.cli.add_command(db_check_plans_command)
+    app.cli.add_command(model_activate_command)
+    app.cli.add_command(email_sender_command)
+    app.cli.add_command(email_requeue_dead_command)
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(regenerate_meal_plans_command)
+    app.cli.add_command(replanning_consumer_command)
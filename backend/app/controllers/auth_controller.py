@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app, url_for, redirect, s
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app.models.user import User
 from app.services.auth_service import AuthService
+from app.services.password_hasher import HashingOverloaded
 from app import oauth
 import os
 from flask import url_for, redirect
@@ -71,22 +72,7 @@ def google_callback():
         if not all([email, name, google_id]):
             raise BadRequest('Missing required user information')
 
-        user = User.find_by_oauth('google', google_id)
-        if not user:
-            user = User.find_by_email(email)
-            if user:
-                User.update_oauth_info(str(user['_id']), 'google', google_id)
-            else:
-                new_user = User(
-                    email=email,
-                    name=name,
-                    password=None,
-                    role='user',
-                    oauth_provider='google',
-                    oauth_id=google_id
-                )
-                user_id = new_user.save()
-                user = User.find_by_id(user_id)
+        user = User.upsert_oauth_user(email, name, 'google', google_id)
 
         access_token = create_access_token(identity=str(user['_id']))
         frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:5173')
@@ -132,22 +118,7 @@ def github_callback():
         if not all([email, name, github_id]):
             raise BadRequest('Missing required user information')
 
-        user = User.find_by_oauth('github', github_id)
-        if not user:
-            user = User.find_by_email(email)
-            if user:
-                User.update_oauth_info(str(user['_id']), 'github', github_id)
-            else:
-                new_user = User(
-                    email=email,
-                    name=name,
-                    password=None,
-                    role='user',
-                    oauth_provider='github',
-                    oauth_id=github_id
-                )
-                user_id = new_user.save()
-                user = User.find_by_id(user_id)
+        user = User.upsert_oauth_user(email, name, 'github', github_id)
 
         access_token = create_access_token(identity=str(user['_id']))
         frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:5173')
@@ -193,11 +164,16 @@ def reset_password_request():
 
 @bp.route('/reset-password/<token>', methods=['POST'])
 def reset_password(token):
+    # `token` is the emailed code; it is only valid together with the email
+    email = request.json.get('email')
     new_password = request.json.get('new_password')
-    if not new_password:
-        return jsonify({"message": "New password is required"}), 400
-    
-    result = auth_service.complete_password_reset(token, new_password)
+    if not email or not new_password:
+        return jsonify({"message": "Email and new password are required"}), 400
+
+    try:
+        result = auth_service.complete_password_reset(email, token, new_password)
+    except HashingOverloaded:
+        return jsonify({"message": "Server busy, please retry"}), 503
     if result:
         return jsonify({"message": "Password reset successful"}), 200
     else:
@@ -0,0 +1,33 @@
+import time
+
+from flask import Blueprint, jsonify
+from pymongo.errors import PyMongoError
+
+from app import mongo
+
+bp = Blueprint('health', __name__)
+
+@bp.route('/healthz', methods=['GET'])
+def liveness():
+    # The process is up and serving; never touches Mongo so a database
+    # outage doesn't get healthy workers restarted
+    return jsonify({'status': 'ok'}), 200
+
+@bp.route('/readyz', methods=['GET'])
+def readiness():
+    """
+    Ready when a connection can be checked out of this worker's pool and
+    the server answers a ping within the server selection timeout.
+    """
+    pool_options = mongo.cx.options.pool_options
+    pool = {
+        'max_pool_size': pool_options.max_pool_size,
+        'min_pool_size': pool_options.min_pool_size
+    }
+    start = time.perf_counter()
+    try:
+        mongo.cx.admin.command('ping')
+    except PyMongoError as e:
+        return jsonify({'status': 'unavailable', 'mongo': {'error': str(e), **pool}}), 503
+    ping_ms = round((time.perf_counter() - start) * 1000, 2)
+    return jsonify({'status': 'ready', 'mongo': {'ping_ms': ping_ms, **pool}}), 200
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.meal_planning_service import MealPlanningService
+from app.services.meal_planning_service import MealPlanningService, DEFAULT_PAGE_SIZE
 from app.models.meal_plan import MealPlan
+from bson.errors import InvalidId
+from app import http_cache
+from app.serialization import stream_object
+
+# Plans with more days than this are streamed instead of encoded in one go
+STREAM_MEALS_THRESHOLD = 90
 
 bp = Blueprint('meal_plan', __name__, url_prefix='/api/meal-plan')
 meal_planning_service = MealPlanningService()
@@ -26,16 +32,88 @@ def create_meal_plan():
 @jwt_required()
 def get_meal_plans():
     user_id = get_jwt_identity()
-    result, status_code = meal_planning_service.get_meal_plans(user_id)
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields', 'full')
+    if fields not in MealPlan.PROJECTIONS:
+        return jsonify({'success': False, 'message': f'Unknown fields value: {fields}'}), 400
+
+    wants_stream = (
+        request.args.get('stream') in ('1', 'true')
+        or request.accept_mimetypes.best == 'application/x-ndjson'
+    )
+    if wants_stream:
+        try:
+            lines = meal_planning_service.stream_meal_plans(user_id, cursor=cursor, fields=fields)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit must be an integer'}), 400
+
+    result, status_code = meal_planning_service.get_meal_plans(
+        user_id, limit=limit, cursor=cursor, fields=fields
+    )
     return jsonify(result), status_code
 
 @bp.route('/<meal_plan_id>', methods=['GET'])
 @jwt_required()
 def get_meal_plan(meal_plan_id):
+    user_id = get_jwt_identity()
     try:
+        # A client revalidating a copy it holds is answered from a projected
+        # read of the owner and version alone, without loading meals. Other
+        # users' plans fall through to the same 404 as missing ones.
+        if request.if_none_match:
+            current = MealPlan.find_version(meal_plan_id)
+            if current and current['user_id'] == user_id and http_cache.is_fresh(meal_plan_etag(current)):
+                return http_cache.not_modified(meal_plan_etag(current), http_cache.PRIVATE_REVALIDATE)
+
         meal_plan = MealPlan.find_by_id(meal_plan_id)
-        if not meal_plan:
+        if not meal_plan or meal_plan['user_id'] != user_id:
             return jsonify({'success': False, 'message': 'Meal plan not found'}), 404
-        return jsonify({'success': True, 'meal_plan': meal_plan}), 200
+        return http_cache.conditional(
+            meal_plan_etag(meal_plan), http_cache.PRIVATE_REVALIDATE,
+            lambda: meal_plan_response(meal_plan)
+        )
+    except InvalidId:
+        return jsonify({'success': False, 'message': 'Meal plan not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+
+@bp.route('/<meal_plan_id>/days', methods=['PATCH'])
+@jwt_required()
+def regenerate_meal_plan_days(meal_plan_id):
+    # Body: start_day, optional end_day (inclusive), slot and seed, and the
+    # plan version the client last saw (409 if it has moved on since).
+    # The version is required: without it a stale client would overwrite
+    # whatever changed since it loaded the plan
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    missing = [field for field in ('start_day', 'version') if data.get(field) is None]
+    if missing:
+        verb = 'is' if len(missing) == 1 else 'are'
+        return jsonify({'success': False, 'message': f"{' and '.join(missing)} {verb} required"}), 400
+    try:
+        start_day = int(data['start_day'])
+        end_day = int(data['end_day']) if data.get('end_day') is not None else None
+        version = int(data['version'])
+        seed = int(data['seed']) if data.get('seed') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'start_day, end_day, version and seed must be integers'}), 400
+
+    result, status_code = meal_planning_service.regenerate_days(
+        user_id, meal_plan_id, start_day, version, end_day=end_day, slot=data.get('slot'), seed=seed
+    )
+    return jsonify(result), status_code
+
+def meal_plan_etag(meal_plan):
+    return http_cache.make_etag('meal_plan', meal_plan['_id'], meal_plan.get('version', 0))
+
+def meal_plan_response(meal_plan):
+    body = {'success': True, 'meal_plan': meal_plan}
+    if len(meal_plan.get('meals', [])) > STREAM_MEALS_THRESHOLD:
+        return Response(stream_object(body), mimetype='application/json')
+    return jsonify(body)
@@ -1,10 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.assessment_service import AssessmentService
+from app import http_cache
 
 bp = Blueprint('profile', __name__, url_prefix='/api/profile')
 assessment_service = AssessmentService()
 
+# Seeded questionnaires only change with the question bank
+QUESTIONNAIRE_CACHE_CONTROL = 'private, max-age=3600'
+MAX_QUESTIONNAIRE_QUESTIONS = 50
+
 @bp.route('/health', methods=['POST'])
 @jwt_required()
 def create_health_profile():
@@ -23,7 +28,14 @@ def create_health_profile():
 def get_health_profile():
     user_id = get_jwt_identity()
     result, status_code = assessment_service.get_health_profile(user_id)
-    return jsonify(result), status_code
+    if status_code != 200:
+        return jsonify(result), status_code
+
+    # The profile usually comes from the profile cache, so a revalidation
+    # that ends in 304 skips both Mongo and serialization
+    profile = result['profile']
+    etag = http_cache.make_etag('health_profile', user_id, profile.get('_id'), profile.get('last_updated'))
+    return http_cache.conditional(etag, http_cache.PRIVATE_REVALIDATE, lambda: jsonify(result))
 
 @bp.route('/health', methods=['PUT'])
 @jwt_required()
@@ -36,8 +48,29 @@ def update_health_profile():
 @bp.route('/questionnaire', methods=['GET'])
 @jwt_required()
 def get_questionnaire():
-    result, status_code = assessment_service.generate_questionnaire()
-    return jsonify(result), status_code
+    # Unseeded requests get a fresh random sample each time and can't be
+    # cached; ?seed=N pins the sample so clients and proxies can keep it
+    seed = request.args.get('seed')
+    try:
+        seed = int(seed) if seed is not None else None
+        count = int(request.args.get('count', 5))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'seed and count must be integers'}), 400
+    if not 1 <= count <= MAX_QUESTIONNAIRE_QUESTIONS:
+        return jsonify({'success': False, 'message': f'count must be between 1 and {MAX_QUESTIONNAIRE_QUESTIONS}'}), 400
+    if seed is None:
+        result, status_code = assessment_service.generate_questionnaire(count)
+        response = jsonify(result)
+        response.headers['Cache-Control'] = http_cache.NO_STORE
+        return response, status_code
+
+    bank_version = assessment_service.questionnaire_generator.bank_version
+    etag = http_cache.make_etag('questionnaire', bank_version, seed, count)
+
+    def build():
+        result, status_code = assessment_service.generate_questionnaire(count, seed=seed)
+        return jsonify(result), status_code
+    return http_cache.conditional(etag, QUESTIONNAIRE_CACHE_CONTROL, build)
 
 @bp.route('/questionnaire/analyze', methods=['POST'])
 @jwt_required()
@@ -47,4 +80,14 @@ def analyze_questionnaire():
         return jsonify({'success': False, 'message': 'Missing responses'}), 400
     
     result, status_code = assessment_service.analyze_responses(data['responses'])
-    return jsonify(result), status_code
\ No newline at end of file
+    return jsonify(result), status_code
+
+@bp.route('/questionnaire/analyze-batch', methods=['POST'])
+@jwt_required()
+def analyze_questionnaire_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get('responses'), list):
+        return jsonify({'success': False, 'message': 'Missing responses'}), 400
+
+    result, status_code = assessment_service.analyze_responses_batch(data['responses'])
+    return jsonify(result), status_code
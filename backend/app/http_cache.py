@@ -0,0 +1,46 @@
+import hashlib
+
+from flask import request, make_response
+
+# Per-user data: browsers may keep it but must revalidate every time
+PRIVATE_REVALIDATE = 'private, no-cache'
+NO_STORE = 'no-store'
+
+
+def make_etag(*parts):
+    """
+    Strong ETag over the values that determine a response body, e.g. a
+    document id plus its version or last_updated timestamp.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def is_fresh(etag):
+    """
+    Whether the client's If-None-Match already names `etag`. The header is
+    compared weakly, as RFC 7232 requires for If-None-Match.
+    """
+    return request.if_none_match.contains_weak(etag.strip('"'))
+
+
+def not_modified(etag, cache_control):
+    response = make_response('', 304)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def conditional(etag, cache_control, build):
+    """
+    Answer 304 when the client holds `etag`; otherwise call `build()` for
+    the full response and tag it if it is a 200. `build` is never called
+    for a 304, so no body is serialized.
+    """
+    if is_fresh(etag):
+        return not_modified(etag, cache_control)
+    response = make_response(build())
+    if response.status_code == 200:
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,171 @@
+import hmac
+import os
+import time
+
+from flask import Response, abort, current_app, g, request
+from pymongo import monitoring
+
+# prometheus_client is optional; without it every metric is a no-op and
+# /metrics is not registered
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - depends on the environment
+    prometheus_client = None
+
+
+class _NullMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return _NullMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+# Bucket edges tuned for web requests and fast database calls
+_REQUEST_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+_COMMAND_BUCKETS = (.0001, .0005, .001, .0025, .005, .01, .025, .05, .1, .5, 1, 5)
+
+REQUEST_LATENCY = _metric(
+    'Histogram', 'http_request_duration_seconds', 'Time spent handling a request',
+    ('blueprint', 'route', 'method'), buckets=_REQUEST_BUCKETS
+)
+REQUESTS_IN_PROGRESS = _metric(
+    'Gauge', 'http_requests_in_progress', 'Requests currently being handled',
+    multiprocess_mode='livesum'
+)
+RESPONSES = _metric(
+    'Counter', 'http_responses_total', 'Responses sent, by status code',
+    ('blueprint', 'route', 'method', 'status')
+)
+MONGO_COMMAND_LATENCY = _metric(
+    'Histogram', 'mongo_command_duration_seconds', 'Server round trip time of MongoDB commands',
+    ('collection', 'command'), buckets=_COMMAND_BUCKETS
+)
+MONGO_COMMAND_FAILURES = _metric(
+    'Counter', 'mongo_command_failures_total', 'MongoDB commands that returned an error',
+    ('collection', 'command')
+)
+SMTP_SEND_LATENCY = _metric(
+    'Histogram', 'smtp_send_duration_seconds', 'Time to hand one message to the SMTP server',
+    ('outcome',), buckets=_REQUEST_BUCKETS
+)
+MODEL_INFERENCE_LATENCY = _metric(
+    'Histogram', 'model_inference_duration_seconds', 'Time spent in nutrition model predict calls',
+    ('backend',), buckets=_COMMAND_BUCKETS
+)
+
+
+def register_stats_collector(prefix, documentation, stats_fn, counters=()):
+    """
+    Expose the numbers in the dict `stats_fn()` returns as `<prefix>_<key>`
+    metrics, read at scrape time: keys in `counters` as counters, the rest
+    as gauges. Only the default registry, so with PROMETHEUS_MULTIPROC_DIR
+    these are not exported.
+    """
+    if prometheus_client is None:
+        return
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+    class StatsCollector:
+        def collect(self):
+            for key, value in stats_fn().items():
+                family = CounterMetricFamily if key in counters else GaugeMetricFamily
+                yield family(f'{prefix}_{key}', f'{documentation}: {key.replace("_", " ")}', value=value)
+
+    prometheus_client.REGISTRY.register(StatsCollector())
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Times every command by collection and command name. The durations come
+    from PyMongo's events, so the only cost here is a dict insert and pop.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get('collection') if event.command_name == 'getMore' \
+            else command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = \
+            collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), '')
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+def _route_labels():
+    rule = request.url_rule
+    return request.blueprint or '', rule.rule if rule is not None else '<unmatched>', request.method
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+    REQUESTS_IN_PROGRESS.inc()
+
+
+def _record_response(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        REQUESTS_IN_PROGRESS.dec()
+        labels = _route_labels()
+        REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+        RESPONSES.labels(*labels, str(response.status_code)).inc()
+    return response
+
+
+def _finish(exc):
+    # Requests that died before after_request ran still leave the gauge
+    if g.pop('metrics_started', None) is not None:
+        REQUESTS_IN_PROGRESS.dec()
+
+
+def metrics_view():
+    # Bearer METRICS_TOKEN; a 404 rather than a 401 so the endpoint's
+    # existence isn't advertised
+    token = current_app.config.get('METRICS_TOKEN') or ''
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        abort(404)
+    registry = prometheus_client.REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        # Under a pre-fork server each worker writes its own files; merge them
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """
+    Time every request and serve the registry at /metrics to scrapers
+    that send `Authorization: Bearer <METRICS_TOKEN>`. Without a token
+    the endpoint is not served. Set PROMETHEUS_MULTIPROC_DIR when running
+    several worker processes.
+    """
+    if prometheus_client is None:
+        return
+    app.before_request(_start_timer)
+    app.after_request(_record_response)
+    app.teardown_request(_finish)
+    if app.config.get('METRICS_TOKEN'):
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
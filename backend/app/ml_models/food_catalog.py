@@ -0,0 +1,193 @@
+import csv
+import logging
+import os
+from itertools import product
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'data', 'food_catalog.csv')
+
+MEAL_SLOTS = ('breakfast', 'lunch', 'dinner')
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+RESTRICTION_TAGS = (
+    'vegetarian', 'vegan', 'pescatarian',
+    'gluten_free', 'dairy_free', 'nut_free', 'shellfish_free'
+)
+
+# A stricter diet also satisfies the looser ones
+TAG_IMPLICATIONS = {
+    'vegan': ('vegetarian', 'pescatarian'),
+    'vegetarian': ('pescatarian',)
+}
+
+# What an allergy or intolerance answer excludes, by the food it names;
+# covers the questionnaire's allergy options and common free-text forms
+RESTRICTION_ALIASES = {
+    'dairy': 'dairy_free', 'milk': 'dairy_free', 'lactose': 'dairy_free',
+    'gluten': 'gluten_free', 'wheat': 'gluten_free', 'celiac': 'gluten_free', 'coeliac': 'gluten_free',
+    'nut': 'nut_free', 'nuts': 'nut_free', 'peanut': 'nut_free', 'peanuts': 'nut_free',
+    'tree_nut': 'nut_free', 'tree_nuts': 'nut_free',
+    'shellfish': 'shellfish_free', 'shrimp': 'shellfish_free', 'crustacean': 'shellfish_free',
+    'crustaceans': 'shellfish_free'
+}
+# Answers that mean "no restriction"
+NO_RESTRICTION = ('', 'none', 'no', 'omnivore', 'n/a')
+_PREFIXES = ('no_', 'non_')
+_SUFFIXES = ('_allergy', '_allergies', '_allergic', '_intolerance', '_intolerant', '_free')
+
+CALORIES_PER_GRAM = np.array([4.0, 4.0, 9.0])
+
+
+def normalize_restriction(restriction: str) -> str:
+    return restriction.strip().lower().replace('-', '_').replace(' ', '_')
+
+
+def restriction_tag(restriction: str) -> Optional[str]:
+    """
+    The catalog tag a restriction maps to: 'Vegan' -> 'vegan', 'Nuts' or
+    'peanut allergy' -> 'nut_free', 'dairy-free' -> 'dairy_free'. None if
+    it names nothing the catalog can filter on.
+    """
+    tag = normalize_restriction(restriction)
+    if tag in RESTRICTION_TAGS:
+        return tag
+    for prefix in _PREFIXES:
+        if tag.startswith(prefix):
+            tag = tag[len(prefix):]
+    for suffix in _SUFFIXES:
+        if tag.endswith(suffix):
+            tag = tag[:-len(suffix)]
+    if tag.startswith('allergic_to_'):
+        tag = tag[len('allergic_to_'):]
+    return RESTRICTION_ALIASES.get(tag)
+
+
+class FoodCatalog:
+    """
+    Array-backed food catalog.
+
+    Nutrition values are stored per serving in a (n_foods, 4) float array in
+    MACROS order; meal slots and restriction tags are bitmasks so eligibility
+    checks are a single vectorized AND.
+    """
+
+    def __init__(self, names: List[str], serving_g: Iterable[float], macros: np.ndarray,
+                 slot_mask: Iterable[int], tag_mask: Iterable[int]):
+        self.names = list(names)
+        self.serving_g = np.asarray(serving_g, dtype=np.float64)
+        self.macros = np.asarray(macros, dtype=np.float64).reshape(-1, len(MACROS))
+        self.slot_mask = np.asarray(slot_mask, dtype=np.uint8)
+        self.tag_mask = np.asarray(tag_mask, dtype=np.uint16)
+
+        # Share of macro calories that comes from protein, carbs and fat;
+        # each column's descending argsort is the macro density index
+        macro_calories = self.macros[:, 1:] * CALORIES_PER_GRAM
+        totals = macro_calories.sum(axis=1, keepdims=True)
+        self.macro_density = np.divide(
+            macro_calories, totals, out=np.zeros_like(macro_calories), where=totals > 0
+        )
+        self.density_index = {
+            macro: np.argsort(-self.macro_density[:, i], kind='stable')
+            for i, macro in enumerate(MACROS[1:])
+        }
+        # (slot, restriction mask) -> eligible food indices, filled on demand
+        self._eligible_cache = {}
+        self._candidate_cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_csv(cls, path: str = DEFAULT_CATALOG_PATH) -> 'FoodCatalog':
+        names, serving_g, macros, slot_mask, tag_mask = [], [], [], [], []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                names.append(row['name'])
+                serving_g.append(float(row['serving_g']))
+                macros.append([float(row[m]) for m in MACROS])
+                slot_mask.append(cls.slot_bits(row['meal_types'].split('|')))
+                tags = [t for t in row['tags'].split('|') if t]
+                for tag in list(tags):
+                    tags.extend(TAG_IMPLICATIONS.get(tag, ()))
+                tag_mask.append(cls.restriction_mask(tags))
+        return cls(names, serving_g, np.array(macros), slot_mask, tag_mask)
+
+    @staticmethod
+    def slot_bits(slots: Iterable[str]) -> int:
+        return sum(1 << MEAL_SLOTS.index(s) for s in set(slots))
+
+    @staticmethod
+    def resolve_restrictions(restrictions: Iterable[str]) -> Tuple[int, List[str]]:
+        """
+        Bitmask for the restrictions the catalog can filter on, and the ones
+        it can't (e.g. 'Other' or 'sesame allergy'), which do not constrain
+        selection and have to be surfaced to the user instead.
+        """
+        mask, unknown = 0, []
+        for restriction in restrictions or []:
+            tag = restriction_tag(restriction)
+            if tag is not None:
+                mask |= 1 << RESTRICTION_TAGS.index(tag)
+            elif normalize_restriction(restriction) not in NO_RESTRICTION:
+                unknown.append(restriction)
+        return mask, unknown
+
+    @classmethod
+    def restriction_mask(cls, restrictions: Iterable[str]) -> int:
+        mask, unknown = cls.resolve_restrictions(restrictions)
+        if unknown:
+            logger.warning(f"Dietary restrictions not in the food catalog, not applied: {unknown}")
+        return mask
+
+    def eligible(self, slot: str, restriction_mask: int = 0) -> np.ndarray:
+        """
+        Indices of foods usable in `slot` that carry every restriction tag.
+        """
+        key = (slot, restriction_mask)
+        foods = self._eligible_cache.get(key)
+        if foods is None:
+            ok = (self.slot_mask & (1 << MEAL_SLOTS.index(slot))) != 0
+            ok &= (self.tag_mask & restriction_mask) == restriction_mask
+            foods = np.flatnonzero(ok)
+            self._eligible_cache[key] = foods
+        return foods
+
+    def candidate_triples(self, slot: str, restriction_mask: int = 0,
+                          per_macro: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate three-food meals for a slot and their macro solvers.
+
+        Each triple takes one of the `per_macro` densest eligible foods for
+        protein, carbs and fat. Returns the (n, 3) food indices and the stacked
+        pseudo-inverses of their (protein, carbs, fat) x food matrices, so the
+        servings hitting a macro target are a single matrix product.
+        """
+        key = (slot, restriction_mask, per_macro)
+        cached = self._candidate_cache.get(key)
+        if cached is not None:
+            return cached
+
+        eligible = np.zeros(len(self), dtype=bool)
+        eligible[self.eligible(slot, restriction_mask)] = True
+        tops = [
+            order[eligible[order]][:per_macro]
+            for order in self.density_index.values()
+        ]
+        triples = np.array(
+            [t for t in product(*tops) if len(set(t)) == 3],
+            dtype=np.intp
+        ).reshape(-1, 3)
+        if len(triples):
+            # Drop permutations of the same three foods, keeping the first seen
+            _, first = np.unique(np.sort(triples, axis=1), axis=0, return_index=True)
+            triples = triples[np.sort(first)]
+
+        # (n, 3 macros, 3 foods) grams per serving
+        matrices = self.macros[triples][:, :, 1:].transpose(0, 2, 1)
+        solvers = np.linalg.pinv(matrices) if len(triples) else np.empty((0, 3, 3))
+        cached = (triples, solvers)
+        self._candidate_cache[key] = cached
+        return cached
@@ -0,0 +1,117 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.ml_models.food_catalog import FoodCatalog, MACROS, MEAL_SLOTS
+
+
+class MealSelector:
+    """
+    Picks concrete foods from a FoodCatalog so each meal lands on its share of
+    the daily targets.
+    """
+    MEAL_SHARES = {'breakfast': 0.3, 'lunch': 0.35, 'dinner': 0.35}
+
+    def __init__(self, catalog: Optional[FoodCatalog] = None, tolerance: float = 0.1,
+                 gram_step: float = 5.0, min_servings: float = 0.25, max_servings: float = 4.0,
+                 rotation: int = 31):
+        self.catalog = catalog or FoodCatalog.from_csv()
+        self.tolerance = tolerance
+        self.gram_step = gram_step
+        self.min_servings = min_servings
+        self.max_servings = max_servings
+        # Distinct meals per slot that a plan cycles through
+        self.rotation = rotation
+
+    def rank_meals(self, slot: str, target: np.ndarray, restriction_mask: int = 0):
+        """
+        Score every candidate meal for a slot against a (calories, protein,
+        carbs, fat) target.
+
+        Returns (triples, grams, macros, errors) sorted best first, where
+        errors is the largest relative miss across the four targets.
+        """
+        catalog = self.catalog
+        triples, solvers = catalog.candidate_triples(slot, restriction_mask)
+        if not len(triples):
+            raise ValueError(f'No foods in the catalog fit the dietary restrictions for {slot}')
+
+        servings = np.clip(solvers @ target[1:], self.min_servings, self.max_servings)
+        serving_g = catalog.serving_g[triples]
+        grams = np.maximum(np.round(servings * serving_g / self.gram_step) * self.gram_step, self.gram_step)
+        servings = grams / serving_g
+
+        macros = np.einsum('cf,cfm->cm', servings, catalog.macros[triples])
+        errors = np.max(np.abs(macros - target) / np.maximum(target, 1e-9), axis=1)
+        order = np.argsort(errors, kind='stable')
+        return triples[order], grams[order], macros[order], errors[order]
+
+    def _candidates(self, slot, target, restriction_mask):
+        triples, grams, macros, errors = self.rank_meals(slot, target, restriction_mask)
+        # Rotate through the best meals within tolerance; fall back to the closest
+        count = int(np.searchsorted(errors, self.tolerance, side='right'))
+        count = min(max(count, 1), self.rotation)
+        # Plain lists keep per-meal dict building free of NumPy scalar overhead
+        return list(zip(
+            triples[:count].tolist(),
+            grams[:count].tolist(),
+            np.round(macros[:count], 1).tolist(),
+            (errors[:count] <= self.tolerance).tolist()
+        ))
+
+    def _build_meal(self, triple, grams, macros, within_tolerance) -> Dict[str, Any]:
+        names = [self.catalog.names[i] for i in triple]
+        meal = {
+            'name': f"{', '.join(names[:-1])} & {names[-1]}",
+            'items': [{'name': name, 'grams': g} for name, g in zip(names, grams)],
+            'within_tolerance': within_tolerance
+        }
+        meal.update(zip(MACROS, macros))
+        return meal
+
+    @staticmethod
+    def daily_target(recommendations: Dict[str, float]) -> np.ndarray:
+        return np.array([float(recommendations[m]) for m in MACROS])
+
+    def select_meal(self, slot: str, recommendations: Dict[str, float],
+                    dietary_restrictions: Optional[Iterable[str]] = None,
+                    day: int = 1, seed: int = 0) -> Dict[str, Any]:
+        """
+        Choose a single meal for `slot` on `day`. Different seeds give
+        different meals for the same day.
+        """
+        target = self.daily_target(recommendations) * self.MEAL_SHARES[slot]
+        mask = self.catalog.restriction_mask(dietary_restrictions)
+        candidates = self._candidates(slot, target, mask)
+        return self._build_meal(*candidates[(day - 1 + seed) % len(candidates)])
+
+    def plan(self, recommendations: Dict[str, float], duration: int,
+             dietary_restrictions: Optional[Iterable[str]] = None,
+             start_day: int = 1, seed: int = 0) -> List[Dict[str, Any]]:
+        """
+        Build `duration` days of meals starting at `start_day`.
+
+        Candidates are ranked once per slot and the plan rotates through the
+        ones within tolerance, so cost barely grows with duration.
+        """
+        daily = self.daily_target(recommendations)
+        mask = self.catalog.restriction_mask(dietary_restrictions)
+
+        per_slot = {
+            slot: self._candidates(slot, daily * self.MEAL_SHARES[slot], mask)
+            for slot in MEAL_SLOTS
+        }
+        # Each distinct meal is built once per plan and copied into its days
+        built = {}
+
+        days = []
+        for day in range(start_day, start_day + duration):
+            daily_meals = {'day': day}
+            for slot, candidates in per_slot.items():
+                pick = (day - 1 + seed) % len(candidates)
+                meal = built.get((slot, pick))
+                if meal is None:
+                    meal = built[(slot, pick)] = self._build_meal(*candidates[pick])
+                daily_meals[slot] = dict(meal)
+            days.append(daily_meals)
+        return days
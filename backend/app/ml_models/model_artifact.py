@@ -0,0 +1,185 @@
+"""
+On-disk format for trained tree ensembles.
+
+An artifact root holds one directory per version plus a CURRENT file naming
+the active one:
+
+    <root>/CURRENT
+    <root>/<version>/manifest.json
+    <root>/<version>/{roots,children_left,children_right,feature,threshold,value}.npy
+
+The trees of the forest are flattened into shared node arrays (child indices
+are global), so every worker can np.load them with mmap_mode='r' and the
+kernel keeps a single copy in the page cache no matter how many processes
+serve predictions.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+ARRAYS = ('roots', 'children_left', 'children_right', 'feature', 'threshold', 'value')
+TREE_LEAF = -1
+
+
+class ForestArtifact:
+    """
+    A loaded forest that predicts straight from (possibly memory-mapped)
+    node arrays without scikit-learn.
+    """
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.n_features = manifest['n_features']
+        self.n_outputs = manifest['n_outputs']
+        self.max_depth = manifest['max_depth']
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        Mean prediction over all trees, matching RandomForestRegressor.predict.
+        """
+        X = np.asarray(features, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+
+        rows = np.arange(X.shape[0])
+        # Walk every (tree, row) pair down one level per iteration
+        nodes = np.repeat(np.asarray(self.roots)[:, None], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            internal = left != TREE_LEAF
+            if not internal.any():
+                break
+            feature = np.where(internal, self.feature[nodes], 0)
+            go_left = X[rows, feature] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+
+        # Trees are summed in order before dividing, as scikit-learn does
+        prediction = np.add.reduce(self.value[nodes], axis=0) / len(self.roots)
+        return prediction[:, 0] if self.n_outputs == 1 else prediction
+
+
+def export_forest(forest, root: str, version: Optional[str] = None, activate: bool = True) -> str:
+    """
+    Write a fitted RandomForestRegressor as a new artifact version under
+    `root` and optionally make it CURRENT. Returns the version name.
+    """
+    version = version or datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    trees = [estimator.tree_ for estimator in forest.estimators_]
+
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+    arrays = {
+        'roots': offsets[:-1].astype(np.int64),
+        'feature': np.concatenate([tree.feature for tree in trees]).astype(np.int32),
+        'threshold': np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+        'value': np.concatenate([tree.value[:, :, 0] for tree in trees]).astype(np.float64)
+    }
+    for side in ('children_left', 'children_right'):
+        arrays[side] = np.concatenate([
+            np.where(getattr(tree, side) == TREE_LEAF, TREE_LEAF, getattr(tree, side) + offset)
+            for tree, offset in zip(trees, offsets)
+        ]).astype(np.int64)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'kind': type(forest).__name__,
+        'n_features': int(forest.n_features_in_),
+        'n_outputs': int(forest.n_outputs_),
+        'n_trees': len(trees),
+        'max_depth': int(max(tree.max_depth for tree in trees)),
+        'created_at': datetime.utcnow().isoformat()
+    }
+
+    os.makedirs(root, exist_ok=True)
+    # Build in a scratch directory and rename, so readers never see a partial version
+    staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=root)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), array)
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    if activate:
+        activate_version(root, version)
+    return version
+
+
+def activate_version(root: str, version: str) -> None:
+    """
+    Atomically point CURRENT at `version`.
+    """
+    if not os.path.isfile(os.path.join(root, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f'No model artifact {version!r} under {root}')
+    fd, tmp_path = tempfile.mkstemp(prefix='.CURRENT-', dir=root)
+    with os.fdopen(fd, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_forest(path: str, mmap: bool = True) -> ForestArtifact:
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format: {manifest.get('format')}")
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in ARRAYS
+    }
+    return ForestArtifact(manifest, arrays)
+
+
+class ModelStore:
+    """
+    Serves the CURRENT artifact under `root` and swaps in a new one when
+    CURRENT changes, checking at most every `check_interval` seconds.
+    """
+
+    def __init__(self, root: str, check_interval: float = 5.0):
+        self.root = root
+        self.check_interval = check_interval
+        self._artifact = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[ForestArtifact]:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.reload()
+        return self._artifact
+
+    def reload(self) -> Optional[ForestArtifact]:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = current_version(self.root)
+            if version and (self._artifact is None or self._artifact.version != version):
+                # Requests already holding the old artifact finish with it;
+                # its mappings go away once they drop the reference
+                self._artifact = load_forest(os.path.join(self.root, version))
+            return self._artifact
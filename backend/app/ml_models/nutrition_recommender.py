@@ -1,21 +1,125 @@
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from typing import Dict, Any
+from typing import Dict, Any, Mapping, Optional, Union, TYPE_CHECKING
+import os
+import time
+
+from app.cache import MISSING, MemoryCache, NullCache
+from app.metrics import MODEL_INFERENCE_LATENCY
+
+# NumPy and scikit-learn are imported on first use so that importing the
+# controllers (and every CLI command) doesn't pay for the ML stack
+if TYPE_CHECKING:
+    import numpy as np
 
 class NutritionRecommender:
-    def __init__(self):
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self._initialize_model()
+    # Activity level multipliers
+    ACTIVITY_MULTIPLIERS = {
+        'sedentary': 1.2,
+        'lightly_active': 1.375,
+        'moderately_active': 1.55,
+        'very_active': 1.725,
+        'extra_active': 1.9
+    }
+    DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+    # Share of total calories per macronutrient and calories per gram
+    MACRO_SPLIT = {'protein': 0.3, 'carbs': 0.4, 'fat': 0.3}
+    CALORIES_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+    # Part of every memoization key: bump it whenever the formula or the
+    # constants above change so targets computed the old way are not served
+    FORMULA_VERSION = 1
+
+    # Field layout for structured arrays accepted by recommend_nutrition_batch
+    PROFILE_FIELDS = [
+        ('weight', 'f8'),
+        ('height', 'f8'),
+        ('age', 'i8'),
+        ('gender', 'U16'),
+        ('activity_level', 'U32')
+    ]
+
+    def __init__(self, model_dir: Optional[str] = None):
+        self._model = None
+        self.model_store = None
+        self.batcher = None
+        self._initialize_model(model_dir or os.getenv('NUTRITION_MODEL_DIR'))
 
-    def _initialize_model(self):
-        # In a real application, this would load a pre-trained model
-        # For now, we'll use a simple rule-based system
-        pass
+        # Targets are a pure function of the profile fingerprint, so entries
+        # never expire; they only fall out of the LRU. 0 disables memoization.
+        cache_size = int(os.getenv('NUTRITION_CACHE_SIZE', 4096))
+        self.recommendation_cache = MemoryCache(
+            max_entries=cache_size, ttl=float('inf'), copy_values=False
+        ) if cache_size > 0 else NullCache()
+
+        # Coalesce concurrent single-row predictions when a window is set
+        batch_window_ms = float(os.getenv('NUTRITION_PREDICT_BATCH_WINDOW_MS', 0))
+        if batch_window_ms > 0:
+            from app.ml_models.predict_batcher import PredictBatcher
+            self.batcher = PredictBatcher(
+                self._predict_now,
+                max_wait_ms=batch_window_ms,
+                max_batch_size=int(os.getenv('NUTRITION_PREDICT_MAX_BATCH', 256)),
+                timeout=float(os.getenv('NUTRITION_PREDICT_TIMEOUT', 10))
+            )
+
+    def _initialize_model(self, model_dir):
+        # Serve predictions from a persisted artifact when one is configured;
+        # otherwise predict() falls back to an in-process forest
+        if model_dir:
+            from app.ml_models.model_artifact import ModelStore
+            self.model_store = ModelStore(
+                model_dir,
+                check_interval=float(os.getenv('NUTRITION_MODEL_RELOAD_INTERVAL', 5))
+            )
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sklearn.ensemble import RandomForestRegressor
+            self._model = RandomForestRegressor(n_estimators=100, random_state=42)
+        return self._model
+
+    @classmethod
+    def profile_dtype(cls) -> 'np.dtype':
+        import numpy as np
+        return np.dtype(cls.PROFILE_FIELDS)
 
     def recommend_nutrition(self, health_profile: Dict[str, Any]) -> Dict[str, float]:
         """
-        Calculate recommended daily nutrition based on health profile.
+        Calculate recommended daily nutrition based on health profile,
+        memoized on the profile's fingerprint.
         """
+        key = self.fingerprint(health_profile)
+        recommendations = self.recommendation_cache.get(key)
+        if recommendations is MISSING:
+            recommendations = self._compute_nutrition(health_profile)
+            self.recommendation_cache.set(key, recommendations)
+        return dict(recommendations)
+
+    def fingerprint(self, health_profile: Dict[str, Any]) -> tuple:
+        """
+        Canonical memoization key: profiles that produce the same targets map
+        to the same key, and it changes with the formula or model version.
+        """
+        activity_level = health_profile['activity_level']
+        return (
+            self.FORMULA_VERSION,
+            self.model_version(),
+            float(health_profile['weight']),
+            float(health_profile['height']),
+            int(health_profile['age']),
+            health_profile['gender'].lower() == 'male',
+            activity_level if activity_level in self.ACTIVITY_MULTIPLIERS else None
+        )
+
+    def model_version(self) -> Optional[str]:
+        artifact = self.model_store.current() if self.model_store else None
+        return artifact.version if artifact is not None else None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.recommendation_cache.stats()
+
+    def _compute_nutrition(self, health_profile: Dict[str, Any]) -> Dict[str, float]:
         # Basic BMR calculation using Mifflin-St Jeor Equation
         weight = float(health_profile['weight'])
         height = float(health_profile['height'])
@@ -29,38 +133,121 @@ class NutritionRecommender:
         else:
             bmr = 10 * weight + 6.25 * height - 5 * age - 161
 
-        # Activity level multipliers
-        activity_multipliers = {
-            'sedentary': 1.2,
-            'lightly_active': 1.375,
-            'moderately_active': 1.55,
-            'very_active': 1.725,
-            'extra_active': 1.9
-        }
-
         # Calculate total daily energy expenditure
-        tdee = bmr * activity_multipliers.get(activity_level, 1.2)
+        tdee = bmr * self.ACTIVITY_MULTIPLIERS.get(activity_level, self.DEFAULT_ACTIVITY_MULTIPLIER)
 
         # Calculate macronutrient distribution
-        protein_calories = tdee * 0.3  # 30% of calories from protein
-        carb_calories = tdee * 0.4    # 40% of calories from carbs
-        fat_calories = tdee * 0.3     # 30% of calories from fat
+        protein_calories = tdee * self.MACRO_SPLIT['protein']
+        carb_calories = tdee * self.MACRO_SPLIT['carbs']
+        fat_calories = tdee * self.MACRO_SPLIT['fat']
 
         return {
             'calories': round(tdee, 2),
-            'protein': round(protein_calories / 4, 2),  # 4 calories per gram of protein
-            'carbs': round(carb_calories / 4, 2),      # 4 calories per gram of carbs
-            'fat': round(fat_calories / 9, 2)          # 9 calories per gram of fat
+            'protein': round(protein_calories / self.CALORIES_PER_GRAM['protein'], 2),
+            'carbs': round(carb_calories / self.CALORIES_PER_GRAM['carbs'], 2),
+            'fat': round(fat_calories / self.CALORIES_PER_GRAM['fat'], 2)
+        }
+
+    def recommend_nutrition_batch(self, profiles: Union[Mapping[str, Any], 'np.ndarray']) -> Dict[str, 'np.ndarray']:
+        """
+        Vectorized version of recommend_nutrition for many profiles at once.
+
+        `profiles` is either a mapping of column name to array-like or a
+        structured array with the fields of PROFILE_FIELDS. Returns a dict of
+        float64 arrays aligned with the input rows.
+        """
+        import numpy as np
+
+        weight = np.asarray(profiles['weight'], dtype=np.float64)
+        height = np.asarray(profiles['height'], dtype=np.float64)
+        age = np.asarray(profiles['age']).astype(np.int64)
+        gender = np.asarray(profiles['gender']).astype(str)
+        activity_level = np.asarray(profiles['activity_level']).astype(str)
+
+        # Exact comparisons are cheap; only lowercase the odd spellings
+        is_male = gender == 'male'
+        odd = np.flatnonzero(~is_male & (gender != 'female'))
+        if len(odd):
+            is_male[odd] = np.char.lower(gender[odd]) == 'male'
+
+        # Same operation order as the scalar path so results match bit for bit
+        # before rounding
+        offset = np.where(is_male, 5.0, -161.0)
+        bmr = 10 * weight + 6.25 * height - 5 * age + offset
+
+        multipliers = np.full(len(activity_level), self.DEFAULT_ACTIVITY_MULTIPLIER)
+        for level, multiplier in self.ACTIVITY_MULTIPLIERS.items():
+            multipliers[activity_level == level] = multiplier
+        tdee = bmr * multipliers
+
+        return {
+            'calories': self._round2(tdee),
+            'protein': self._round2(tdee * self.MACRO_SPLIT['protein'] / self.CALORIES_PER_GRAM['protein']),
+            'carbs': self._round2(tdee * self.MACRO_SPLIT['carbs'] / self.CALORIES_PER_GRAM['carbs']),
+            'fat': self._round2(tdee * self.MACRO_SPLIT['fat'] / self.CALORIES_PER_GRAM['fat'])
         }
 
-    def train(self, X: np.ndarray, y: np.ndarray) -> None:
+    @staticmethod
+    def _round2(values: 'np.ndarray') -> 'np.ndarray':
+        """
+        Round to 2 decimals exactly like the builtin round().
+
+        np.round scales by 100 first, which can put a value sitting on a
+        half-cent on the other cent. It is right everywhere else, so only
+        the values near a half-cent are re-rounded with round().
+        """
+        import numpy as np
+        rounded = np.round(values, 2)
+        scaled = values * 100
+        near = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+        if len(near):
+            rounded[near] = [round(x, 2) for x in values[near].tolist()]
+        return rounded
+
+    @classmethod
+    def profiles_to_array(cls, health_profiles) -> 'np.ndarray':
+        """
+        Pack an iterable of health profile documents into a structured array.
+        """
+        import numpy as np
+        return np.array([
+            (float(p['weight']), float(p['height']), int(p['age']), p['gender'], p['activity_level'])
+            for p in health_profiles
+        ], dtype=cls.profile_dtype())
+
+    def train(self, X: 'np.ndarray', y: 'np.ndarray') -> None:
         """
         Train the model with new data.
         """
         self.model.fit(X, y)
 
-    def predict(self, features: np.ndarray) -> np.ndarray:
+    def save_model(self, model_dir: Optional[str] = None, version: Optional[str] = None,
+                   activate: bool = True) -> str:
+        """
+        Persist the trained forest as a new artifact version. Workers serving
+        from the same directory pick it up on their next reload check.
+        """
+        from app.ml_models.model_artifact import export_forest
+        model_dir = model_dir or (self.model_store and self.model_store.root)
+        if not model_dir:
+            raise ValueError('No model directory configured')
+        return export_forest(self.model, model_dir, version=version, activate=activate)
+
+    def predict(self, features: 'np.ndarray') -> 'np.ndarray':
         """
         Make predictions using the trained model.
         """
-        return self.model.predict(features)
\ No newline at end of file
+        if self.batcher is not None:
+            return self.batcher.predict(features)
+        return self._predict_now(features)
+
+    def _predict_now(self, features: 'np.ndarray') -> 'np.ndarray':
+        artifact = self.model_store.current() if self.model_store else None
+        started = time.perf_counter()
+        if artifact is not None:
+            predictions = artifact.predict(features)
+            MODEL_INFERENCE_LATENCY.labels('artifact').observe(time.perf_counter() - started)
+        else:
+            predictions = self.model.predict(features)
+            MODEL_INFERENCE_LATENCY.labels('sklearn').observe(time.perf_counter() - started)
+        return predictions
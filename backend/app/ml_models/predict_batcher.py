@@ -0,0 +1,169 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.metrics import register_stats_collector
+
+# Every live batcher, for the /metrics collector below
+_batchers = weakref.WeakSet()
+
+_COUNTERS = ('requests', 'rows', 'batches', 'errors', 'fallbacks', 'rejected', 'timeouts')
+
+
+class PredictBatcher:
+    """
+    Coalesces concurrent predict calls into one batched call.
+
+    Callers block in predict() while a background thread gathers whatever
+    arrives within `max_wait_ms` of the first queued request (up to
+    `max_batch_size` rows), runs `predict_fn` once on the stacked rows and
+    hands each caller back its own slice.
+
+    Rows with the wrong number of features are rejected in predict() before
+    they can join a batch. If a batched call still fails, each request in
+    it is retried on its own so only the caller that caused the failure
+    sees it. Callers give up after `timeout` seconds.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_wait_ms: float = 2.0, max_batch_size: int = 256,
+                 n_features: Optional[int] = None, timeout: float = 10.0):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        # Learned from the first request unless given
+        self.n_features = n_features
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(_COUNTERS + ('largest_batch',), 0)
+        _batchers.add(self)
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so start one lazily in each process,
+        # and again if it ever died
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+                self._thread.start()
+
+    def _validate(self, features) -> np.ndarray:
+        rows = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        if rows.ndim != 2 or not len(rows):
+            raise ValueError(f'Expected a non-empty 2-D feature array, got shape {rows.shape}')
+        if self.n_features is None:
+            self.n_features = rows.shape[1]
+        elif rows.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features per row, got {rows.shape[1]}')
+        return rows
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        try:
+            rows = self._validate(features)
+        except ValueError:
+            self._stats['rejected'] += 1
+            raise
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((rows, future))
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._stats['timeouts'] += 1
+            # Nobody will read the result now; skip it if it hasn't started
+            future.cancel()
+            raise TimeoutError(f'No prediction within {self.timeout} s')
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, _ = self._collect()
+            # Callers that timed out are dropped here
+            batch = [(rows, future) for rows, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            size = sum(len(rows) for rows, _ in batch)
+            stats = self._stats
+            stats['requests'] += len(batch)
+            stats['rows'] += size
+            stats['batches'] += 1
+            stats['largest_batch'] = max(stats['largest_batch'], size)
+
+            try:
+                predictions = self.predict_fn(np.vstack([rows for rows, _ in batch]))
+            except Exception as e:
+                stats['errors'] += 1
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._predict_each(batch)
+                continue
+
+            offset = 0
+            for rows, future in batch:
+                future.set_result(predictions[offset:offset + len(rows)])
+                offset += len(rows)
+
+    def _predict_each(self, batch):
+        """
+        Fallback after a failed batch: one predict_fn call per request.
+        """
+        for rows, future in batch:
+            self._stats['fallbacks'] += 1
+            try:
+                future.set_result(self.predict_fn(rows))
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['mean_batch_size'] = stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+
+def batcher_stats():
+    """
+    stats() summed over every batcher in this process.
+    """
+    total = dict.fromkeys(_COUNTERS + ('queue_depth',), 0)
+    total['largest_batch'] = 0
+    for batcher in list(_batchers):
+        stats = batcher.stats()
+        for key in total:
+            total[key] = max(total[key], stats[key]) if key == 'largest_batch' else total[key] + stats[key]
+    total['mean_batch_size'] = total['rows'] / total['batches'] if total['batches'] else 0.0
+    return total
+
+
+register_stats_collector(
+    'nutrition_predict_batcher', 'Nutrition model predict batching', batcher_stats, counters=_COUNTERS
+)
@@ -1,6 +1,96 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import hashlib
+import json
 import random
 
+# Each rule fires when the answer to `question_id` is one of `answers`, or,
+# for rules written with `answers_except`, when it is anything else
+# (including no answer at all).
+ANALYSIS_RULES = [
+    {
+        'question_id': 'diet_type',
+        'answers': ['Vegetarian', 'Vegan'],
+        'category': 'dietary_recommendations',
+        'recommendation': 'Ensure adequate protein intake through plant-based sources'
+    },
+    {
+        'question_id': 'exercise_frequency',
+        'answers': ['Never', '1-2 times/week'],
+        'category': 'lifestyle_recommendations',
+        'recommendation': 'Consider increasing physical activity to at least 3-4 times per week'
+    },
+    {
+        'question_id': 'sleep_quality',
+        'answers': ['Poor', 'Fair'],
+        'category': 'lifestyle_recommendations',
+        'recommendation': 'Focus on improving sleep quality through better sleep hygiene'
+    },
+    {
+        'question_id': 'medical_conditions',
+        'answers_except': ['None'],
+        'category': 'health_alerts',
+        'recommendation': 'Consult with a healthcare provider for personalized dietary advice'
+    }
+]
+
+ANALYSIS_CATEGORIES = ['dietary_recommendations', 'lifestyle_recommendations', 'health_alerts']
+
+# Stands in for any answer no rule lists when compiling the default case
+_UNLISTED = object()
+
+
+class CompiledRules:
+    """
+    ANALYSIS_RULES turned into one lookup table per question, mapping an
+    answer straight to the (category, recommendation) pairs it produces.
+    Answers a table doesn't list get that question's `answers_except` rules.
+
+    Questions are evaluated in the order they first appear in the rules, and
+    each question's rules in declaration order.
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        by_question = {}
+        for rule in rules:
+            by_question.setdefault(rule['question_id'], []).append(rule)
+
+        self.tables = []
+        for qid, question_rules in by_question.items():
+            listed = {
+                answer for rule in question_rules
+                for answer in rule.get('answers', rule.get('answers_except', []))
+            }
+            table = {answer: self._firing(question_rules, answer) for answer in listed}
+            default = self._firing(question_rules, _UNLISTED)
+            self.tables.append((qid, table, default))
+
+    @staticmethod
+    def _firing(question_rules, answer):
+        return tuple(
+            (rule['category'], rule['recommendation'])
+            for rule in question_rules if CompiledRules._matches(rule, answer)
+        )
+
+    @staticmethod
+    def _matches(rule, answer):
+        if 'answers_except' in rule:
+            return answer not in rule['answers_except']
+        return answer in rule['answers']
+
+    def analyze(self, responses: Dict[str, Any]) -> Dict[str, List[str]]:
+        analysis = {category: [] for category in ANALYSIS_CATEGORIES}
+        answer_to = responses.get
+        for qid, table, default in self.tables:
+            try:
+                fired = table.get(answer_to(qid), default)
+            except TypeError:
+                # Unhashable answers (lists, objects) match no listed option
+                fired = default
+            for category, recommendation in fired:
+                analysis[category].append(recommendation)
+        return analysis
+
+
 class QuestionnaireGenerator:
     def __init__(self):
         self.questions_bank = {
@@ -41,50 +131,33 @@ class QuestionnaireGenerator:
                 }
             ]
         }
+        # Flattened once; generate_questionnaire samples from this list
+        self.all_questions = [
+            question for category in self.questions_bank.values() for question in category
+        ]
+        self.rules = CompiledRules(ANALYSIS_RULES)
+        # Changes whenever the bank's content does; part of questionnaire ETags
+        self.bank_version = hashlib.sha1(
+            json.dumps(self.questions_bank, sort_keys=True).encode()
+        ).hexdigest()[:12]
 
-    def generate_questionnaire(self, num_questions: int = 5) -> List[Dict[str, Any]]:
+    def generate_questionnaire(self, num_questions: int = 5, seed: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Generate a questionnaire with specified number of questions.
+        Generate a questionnaire with specified number of questions. The same
+        seed always yields the same questions for a given bank version.
         """
-        all_questions = []
-        for category in self.questions_bank.values():
-            all_questions.extend(category)
-        
-        return random.sample(all_questions, min(num_questions, len(all_questions)))
+        rng = random if seed is None else random.Random(seed)
+        return rng.sample(self.all_questions, min(num_questions, len(self.all_questions)))
 
     def analyze_responses(self, responses: Dict[str, str]) -> Dict[str, Any]:
         """
         Analyze questionnaire responses and provide recommendations.
         """
-        analysis = {
-            'dietary_recommendations': [],
-            'lifestyle_recommendations': [],
-            'health_alerts': []
-        }
+        return self.rules.analyze(responses)
 
-        # Analyze dietary preferences
-        if responses.get('diet_type') in ['Vegetarian', 'Vegan']:
-            analysis['dietary_recommendations'].append(
-                'Ensure adequate protein intake through plant-based sources'
-            )
-
-        # Analyze exercise habits
-        exercise_freq = responses.get('exercise_frequency')
-        if exercise_freq in ['Never', '1-2 times/week']:
-            analysis['lifestyle_recommendations'].append(
-                'Consider increasing physical activity to at least 3-4 times per week'
-            )
-
-        # Analyze sleep patterns
-        if responses.get('sleep_quality') in ['Poor', 'Fair']:
-            analysis['lifestyle_recommendations'].append(
-                'Focus on improving sleep quality through better sleep hygiene'
-            )
-
-        # Check for health conditions
-        if responses.get('medical_conditions') != 'None':
-            analysis['health_alerts'].append(
-                'Consult with a healthcare provider for personalized dietary advice'
-            )
-
-        return analysis
\ No newline at end of file
+    def analyze_responses_batch(self, response_sets: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Analyze many response sets in one call.
+        """
+        analyze = self.rules.analyze
+        return [analyze(responses) for responses in response_sets]
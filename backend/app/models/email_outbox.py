@@ -0,0 +1,133 @@
+from app import mongo
+from bson import ObjectId
+from datetime import datetime, timedelta
+
+# Sent messages are removed by a TTL index this long after sending
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+class EmailOutbox:
+    """
+    Mongo-backed queue of outgoing mail.
+
+    Messages move pending -> sending -> sent, go back to pending with a
+    backoff after a failed attempt, and end up dead once they run out of
+    attempts. A claim is a lease tagged with the claiming batch: if a sender
+    dies mid-batch, its messages become claimable again when the lease
+    expires, and a sender whose lease was taken over can no longer update
+    them. Sent and dead messages lose their body straight away (it may hold
+    an OTP); sent ones are removed after SENT_RETENTION_SECONDS.
+    """
+
+    def __init__(self, to, subject, text, html=None):
+        self.to = to
+        self.subject = subject
+        self.text = text
+        self.html = html
+
+    def to_dict(self):
+        now = datetime.utcnow()
+        return {
+            'to': self.to,
+            'subject': self.subject,
+            'text': self.text,
+            'html': self.html,
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now,
+            'last_error': None
+        }
+
+    def save(self):
+        result = mongo.db.email_outbox.insert_one(self.to_dict())
+        return str(result.inserted_id)
+
+    # Oldest due message first
+    CLAIM_SORT = [('next_attempt_at', 1)]
+
+    @staticmethod
+    def claimable_query(now):
+        """
+        Messages that are due, or whose sender's lease has run out.
+        """
+        return {'$or': [
+            {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+            {'status': 'sending', 'lease_until': {'$lte': now}}
+        ]}
+
+    @staticmethod
+    def claim_batch(limit, lease_seconds=60):
+        """
+        Lease up to `limit` due messages in three round trips, whatever the
+        batch size. Each message carries the batch's `claim` id, which the
+        other methods require so only the current lease holder updates it.
+        """
+        now = datetime.utcnow()
+        candidates = [
+            message['_id'] for message in mongo.db.email_outbox.find(
+                EmailOutbox.claimable_query(now), {'_id': 1}, sort=EmailOutbox.CLAIM_SORT, limit=limit
+            )
+        ]
+        if not candidates:
+            return []
+        claim = ObjectId()
+        # Re-checks the claimable filter, so candidates another sender took
+        # in between are skipped rather than stolen
+        mongo.db.email_outbox.update_many(
+            {'_id': {'$in': candidates}, **EmailOutbox.claimable_query(now)},
+            {'$set': {'status': 'sending', 'claim': claim, 'lease_until': now + timedelta(seconds=lease_seconds)}}
+        )
+        return list(mongo.db.email_outbox.find({'_id': {'$in': candidates}, 'claim': claim}, sort=EmailOutbox.CLAIM_SORT))
+
+    @staticmethod
+    def extend_lease(claim, message_ids, lease_seconds):
+        """
+        Push the lease of the still-unsent messages of a claim forward.
+        Returns the new lease expiry.
+        """
+        lease_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+        if message_ids:
+            mongo.db.email_outbox.update_many(
+                {'_id': {'$in': list(message_ids)}, 'claim': claim, 'status': 'sending'},
+                {'$set': {'lease_until': lease_until}}
+            )
+        return lease_until
+
+    @staticmethod
+    def mark_sent(claim, message_ids):
+        if message_ids:
+            mongo.db.email_outbox.update_many(
+                {'_id': {'$in': list(message_ids)}, 'claim': claim},
+                {
+                    '$set': {'status': 'sent', 'sent_at': datetime.utcnow()},
+                    '$unset': {'text': '', 'html': '', 'lease_until': '', 'claim': ''}
+                }
+            )
+
+    @staticmethod
+    def mark_failed(message, error, max_attempts, base_backoff_seconds, permanent=False):
+        attempts = message.get('attempts', 0) + 1
+        update = {'attempts': attempts, 'last_error': str(error)}
+        unset = {'lease_until': '', 'claim': ''}
+        if permanent or attempts >= max_attempts:
+            update['status'] = 'dead'
+            unset.update(text='', html='')
+        else:
+            update['status'] = 'pending'
+            delay = base_backoff_seconds * 2 ** (attempts - 1)
+            update['next_attempt_at'] = datetime.utcnow() + timedelta(seconds=delay)
+        mongo.db.email_outbox.update_one(
+            {'_id': message['_id'], 'claim': message['claim']},
+            {'$set': update, '$unset': unset}
+        )
+
+    @staticmethod
+    def requeue_dead():
+        """
+        Retry dead messages that still have a body (dead-lettered before
+        bodies were cleared); the rest can't be sent again.
+        """
+        return mongo.db.email_outbox.update_many(
+            {'status': 'dead', 'text': {'$exists': True}},
+            {'$set': {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()}}
+        ).modified_count
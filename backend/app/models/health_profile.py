@@ -1,6 +1,26 @@
 from app import mongo
+from app.cache import MISSING, make_cache
+from app.models import identity_map
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Read-through cache for profile lookups; configured with HEALTH_PROFILE_CACHE_*.
+# The memory backend is per process: run several workers with the sqlite
+# backend (serve.py defaults to it) so a write is seen by all of them.
+profile_cache = make_cache('HEALTH_PROFILE_CACHE')
+
+
+def cache_version(profile):
+    """
+    Version of a profile for profile_cache: its last_updated, 0 for "no
+    profile". Writes put the new profile in the cache with its version, and
+    a lookup that read the old one before the write can't overwrite it.
+    """
+    if profile is None or profile.get('last_updated') is None:
+        return 0.0
+    return profile['last_updated'].timestamp()
 
 class HealthProfile:
     def __init__(self, user_id, age, gender, height, weight, activity_level, 
@@ -29,18 +49,84 @@ class HealthProfile:
         }
 
     def save(self):
-        health_profile_data = self.to_dict()
-        result = mongo.db.health_profiles.insert_one(health_profile_data)
-        return str(result.inserted_id)
+        """
+        Create the user's profile, or replace its fields if one exists, in a
+        single upsert. The unique user_id index keeps it to one per user.
+        """
+        identity_map.evict('health_profiles')
+        try:
+            profile = self._upsert()
+        except DuplicateKeyError:
+            # A concurrent save inserted first; this one now updates it
+            profile = self._upsert()
+        # Replaces a cached "no profile" so the new one is visible straight away
+        profile_cache.set(self.user_id, profile, version=cache_version(profile))
+        identity_map.remember('health_profiles', profile)
+        return str(profile['_id'])
+
+    def _upsert(self):
+        return mongo.db.health_profiles.find_one_and_update(
+            {'user_id': self.user_id},
+            {'$set': self.to_dict()},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def user_query(user_ids):
+        """
+        The profile of one user, or of any of a list of users.
+        """
+        if isinstance(user_ids, (list, tuple, set)):
+            return {'user_id': {'$in': list(user_ids)}}
+        return {'user_id': user_ids}
 
     @staticmethod
     def find_by_user_id(user_id):
-        return mongo.db.health_profiles.find_one({'user_id': user_id})
+        return identity_map.find_one(
+            'health_profiles', ('user_id', user_id),
+            lambda: HealthProfile._load(user_id)
+        )
+
+    @staticmethod
+    def _load(user_id):
+        profile = profile_cache.get(user_id)
+        if profile is MISSING:
+            profile = mongo.db.health_profiles.find_one(HealthProfile.user_query(user_id))
+            profile_cache.set(user_id, profile, version=cache_version(profile))
+        return profile
+
+    @staticmethod
+    def find_many_by_user_ids(user_ids):
+        """
+        Return {user_id: profile or None}, fetching whatever isn't already
+        loaded in one query. Bypasses the profile cache.
+        """
+        return identity_map.find_many(
+            'health_profiles', 'user_id', user_ids,
+            lambda ids: mongo.db.health_profiles.find(HealthProfile.user_query(ids))
+        )
 
     @staticmethod
     def update(user_id, updates):
+        """
+        Apply `updates` and return the updated profile, or None if the user
+        has no profile.
+        """
         updates['last_updated'] = datetime.utcnow()
-        return mongo.db.health_profiles.update_one(
+        identity_map.evict('health_profiles')
+        profile = mongo.db.health_profiles.find_one_and_update(
             {'user_id': user_id},
-            {'$set': updates}
-        )
\ No newline at end of file
+            {'$set': updates},
+            return_document=ReturnDocument.AFTER
+        )
+        if profile is not None:
+            profile_cache.set(user_id, profile, version=cache_version(profile))
+            identity_map.remember('health_profiles', profile)
+        else:
+            profile_cache.delete(user_id)
+        return profile
+
+    @staticmethod
+    def cache_stats():
+        return profile_cache.stats()
\ No newline at end of file
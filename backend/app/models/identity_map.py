@@ -0,0 +1,116 @@
+from flask import g, has_app_context, has_request_context
+from pymongo import monitoring
+
+# Marks a lookup the map hasn't seen; a cached None means "known missing"
+MISSING = object()
+
+
+class IdentityMap:
+    """
+    Documents loaded during one request, keyed by (collection, (field, value)).
+
+    Every document is also filed under its _id, so loading a user by email
+    and then by id costs one query. Writes evict the whole collection, which
+    is cheap because a request touches a handful of documents.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, collection, key):
+        return self._entries.get((collection, key), MISSING)
+
+    def put(self, collection, key, document):
+        # Keep one object per _id, however many keys lead to it
+        if isinstance(document, dict) and '_id' in document:
+            document = self._entries.setdefault((collection, ('_id', document['_id'])), document)
+        self._entries[(collection, key)] = document
+        return document
+
+    def evict(self, collection):
+        for entry in [entry for entry in self._entries if entry[0] == collection]:
+            del self._entries[entry]
+
+
+def current_identity_map():
+    # Only requests get a map; CLI commands and background workers run in
+    # long-lived app contexts where cached documents would go stale
+    if not has_request_context():
+        return None
+    if 'identity_map' not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def find_one(collection, key, fetch):
+    """
+    Return the document for `key` from the request's map, calling `fetch()`
+    on the first lookup only.
+    """
+    identity_map = current_identity_map()
+    if identity_map is None:
+        return fetch()
+    document = identity_map.get(collection, key)
+    if document is MISSING:
+        document = identity_map.put(collection, key, fetch())
+    return document
+
+
+def find_many(collection, field, values, fetch_many):
+    """
+    Return {value: document or None} for every value, loading the ones not
+    yet in the map with a single `fetch_many(missing_values)` call, which
+    should run one `$in` query on `field`.
+    """
+    identity_map = current_identity_map()
+    found = {}
+    missing = []
+    for value in dict.fromkeys(values):
+        document = identity_map.get(collection, (field, value)) if identity_map else MISSING
+        if document is MISSING:
+            missing.append(value)
+        else:
+            found[value] = document
+    if missing:
+        loaded = {document[field]: document for document in fetch_many(missing)}
+        for value in missing:
+            found[value] = loaded.get(value)
+            if identity_map is not None:
+                found[value] = identity_map.put(collection, (field, value), found[value])
+    return found
+
+
+def remember(collection, document):
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        identity_map.put(collection, ('_id', document['_id']), document)
+
+
+def evict(collection):
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        identity_map.evict(collection)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """
+    Counts database commands issued while handling the current request.
+
+    PyMongo calls listeners on the thread that runs the command, so the count
+    lands on the right request's `g`.
+    """
+
+    def started(self, event):
+        if has_app_context():
+            g.db_round_trips = g.get('db_round_trips', 0) + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def report_round_trips(response):
+    response.headers['X-DB-Round-Trips'] = str(g.get('db_round_trips', 0))
+    return response
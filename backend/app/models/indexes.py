@@ -0,0 +1,203 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+from datetime import datetime
+
+from app.models.email_outbox import SENT_RETENTION_SECONDS
+
+# Every index the models rely on, keyed by collection. ensure_indexes applies
+# this idempotently, so adding an entry here is all a new index needs.
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+        # Password users store null OAuth fields, so uniqueness only applies
+        # to documents that actually carry a provider id
+        IndexModel(
+            [('oauth_provider', ASCENDING), ('oauth_id', ASCENDING)],
+            name='oauth_identity_unique',
+            unique=True,
+            partialFilterExpression={'oauth_id': {'$type': 'string'}}
+        ),
+        IndexModel([('reset_token', ASCENDING)], name='reset_token')
+    ],
+    'health_profiles': [
+        # One profile per user; HealthProfile.save upserts against it
+        IndexModel([('user_id', ASCENDING)], name='user_id_unique', unique=True)
+    ],
+    'meal_plans': [
+        # Serves both the per-user lookup and the keyset-paginated listing
+        IndexModel(
+            [('user_id', ASCENDING), ('start_date', DESCENDING), ('_id', DESCENDING)],
+            name='user_id_start_date'
+        )
+    ],
+    'email_outbox': [
+        IndexModel([('status', ASCENDING), ('next_attempt_at', ASCENDING)], name='status_next_attempt'),
+        IndexModel([('status', ASCENDING), ('lease_until', ASCENDING)], name='status_lease'),
+        # Only sent messages have sent_at, so only they expire
+        IndexModel([('sent_at', ASCENDING)], name='sent_ttl', expireAfterSeconds=SENT_RETENTION_SECONDS)
+    ]
+}
+
+# Options that make two indexes on the same keys different
+_COMPARED_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+
+class DuplicateKeysError(Exception):
+    """
+    A unique index can't be built because documents already share a key.
+    """
+
+
+def query_shapes():
+    """
+    Representative filter/sort for every query the models issue, built with
+    the models' own query builders so they can't drift from the real ones.
+    check_query_plans explains each of them and reports any that would
+    scan the whole collection.
+    """
+    from app.models.email_outbox import EmailOutbox
+    from app.models.health_profile import HealthProfile
+    from app.models.meal_plan import MealPlan
+    from app.models.user import User
+    from app.services.plan_regeneration import MealPlanRegenerationJob
+
+    user_id, plan_id, when = 'user', ObjectId(), datetime(2024, 1, 1)
+    return [
+        ('User.find_by_email', 'users', User.email_query('user@example.com'), None),
+        ('User.find_by_oauth', 'users', User.oauth_query('google', '1234'), None),
+        ('User.find_by_id', 'users', {'_id': ObjectId()}, None),
+        ('User.find_by_reset_token', 'users', User.reset_token_query('123456'), None),
+        ('HealthProfile.find_by_user_id', 'health_profiles', HealthProfile.user_query(user_id), None),
+        ('HealthProfile.find_many_by_user_ids', 'health_profiles', HealthProfile.user_query([user_id, 'other']), None),
+        ('MealPlan.find_by_id', 'meal_plans', {'_id': plan_id}, None),
+        ('MealPlan.find_by_user_id', 'meal_plans', MealPlan.user_query(user_id), None),
+        ('MealPlan.replace_meals', 'meal_plans', MealPlan.version_query(plan_id, 1), None),
+        ('MealPlan.iter_by_user_id', 'meal_plans', MealPlan.page_query(user_id, (when, plan_id)), MealPlan.SORT),
+        ('MealPlanRegenerationJob._chunks', 'health_profiles',
+         MealPlanRegenerationJob.chunk_query(ObjectId()), [('_id', ASCENDING)]),
+        ('MealPlanRegenerationJob._work_for', 'meal_plans', MealPlan.active_query([user_id, 'other']), MealPlan.SORT),
+        ('ReplanningConsumer.replan_user', 'meal_plans', MealPlan.active_query(user_id), None),
+        ('EmailOutbox.claim_batch', 'email_outbox', EmailOutbox.claimable_query(when), EmailOutbox.CLAIM_SORT)
+    ]
+
+
+def _key_spec(keys):
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def _options(spec):
+    return {option: spec[option] for option in _COMPARED_OPTIONS if option in spec}
+
+
+def find_duplicates(collection, model, limit=5):
+    """
+    Up to `limit` key values that more than one document in `collection`
+    holds, among the documents a unique `model` would cover.
+    """
+    spec = model.document
+    pipeline = [{'$match': spec['partialFilterExpression']}] if 'partialFilterExpression' in spec else []
+    pipeline += [
+        {'$group': {'_id': {field: f'${field}' for field in spec['key']}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': limit}
+    ]
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def remove_duplicates(collection, keys, keep_sort, dry_run=False):
+    """
+    Delete all but the first document (in `keep_sort` order) of every
+    group sharing the same `keys`. Returns how many were (or, with
+    `dry_run`, would be) deleted.
+    """
+    pipeline = [
+        {'$sort': dict(keep_sort)},
+        {'$group': {'_id': {field: f'${field}' for field in keys}, 'ids': {'$push': '$_id'}}},
+        {'$match': {'ids.1': {'$exists': True}}}
+    ]
+    removed = 0
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        extra = group['ids'][1:]
+        if not dry_run:
+            collection.delete_many({'_id': {'$in': extra}})
+        removed += len(extra)
+    return removed
+
+
+def ensure_indexes(db, registry=INDEXES):
+    """
+    Create every registered index that is missing and rebuild any whose
+    options drifted. Safe to run repeatedly; returns a list of
+    (collection, index name, action) tuples for what changed.
+
+    A unique index is only built once no documents share a key, otherwise
+    DuplicateKeysError is raised before anything is dropped; if building
+    a replacement fails anyway, the index it replaces is put back.
+    """
+    actions = []
+    for collection_name, models in registry.items():
+        collection = db[collection_name]
+        existing = {
+            _key_spec(info['key']): (name, info)
+            for name, info in collection.index_information().items()
+        }
+        for model in models:
+            spec = model.document
+            current = existing.get(_key_spec(spec['key'].items()))
+            if current and _options(current[1]) == _options(spec):
+                continue
+            if spec.get('unique'):
+                duplicates = find_duplicates(collection, model)
+                if duplicates:
+                    examples = ', '.join(str(group['_id']) for group in duplicates)
+                    raise DuplicateKeysError(
+                        f"{collection_name}.{spec['name']}: several documents share {examples}; "
+                        f"remove the duplicates (flask db-dedupe-profiles for health_profiles) and retry"
+                    )
+            if current:
+                name, info = current
+                collection.drop_index(name)
+                actions.append((collection_name, name, 'dropped'))
+            try:
+                collection.create_indexes([model])
+            except OperationFailure:
+                if current:
+                    collection.create_indexes([IndexModel(info['key'], name=name, **_options(info))])
+                raise
+            actions.append((collection_name, spec['name'], 'created'))
+    return actions
+
+
+def _plan_stages(plan):
+    """
+    Yield every stage name in an explain() plan tree, covering both the
+    classic and slot-based execution engine layouts.
+    """
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for key in ('inputStage', 'queryPlan', 'winningPlan'):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for key in ('inputStages', 'shards'):
+            for child in plan.get(key, []):
+                yield from _plan_stages(child)
+
+
+def check_query_plans(db, shapes=None):
+    """
+    Explain every query in `shapes` (default: query_shapes()) and return
+    (name, stages) for those whose winning plan contains a COLLSCAN. An
+    empty list means all queries are served by an index.
+    """
+    offenders = []
+    for name, collection_name, query, sort in shapes or query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        stages = list(_plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {})))
+        if 'COLLSCAN' in stages:
+            offenders.append((name, stages))
+    return offenders
@@ -0,0 +1,38 @@
+from app import mongo
+from datetime import datetime
+
+class JobCheckpoint:
+    """
+    Progress of a long-running job, one document per job name, so a job
+    that is stopped or crashes picks up where it left off.
+    """
+
+    @staticmethod
+    def load(job_name):
+        return mongo.db.job_checkpoints.find_one({'_id': job_name})
+
+    @staticmethod
+    def save(job_name, **state):
+        state['updated_at'] = datetime.utcnow()
+        mongo.db.job_checkpoints.update_one(
+            {'_id': job_name},
+            {'$set': state, '$setOnInsert': {'started_at': state['updated_at']}},
+            upsert=True
+        )
+
+    @staticmethod
+    def record_failures(job_name, failures, keep=100):
+        """
+        Append to the job's `failures` list, keeping the first `keep`, or
+        the last `-keep` when it is negative.
+        """
+        mongo.db.job_checkpoints.update_one(
+            {'_id': job_name},
+            {'$push': {'failures': {'$each': failures, '$slice': keep}},
+             '$setOnInsert': {'started_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def clear(job_name):
+        mongo.db.job_checkpoints.delete_one({'_id': job_name})
@@ -1,14 +1,30 @@
 from app import mongo
+from app.models import identity_map
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
+from pymongo import ReturnDocument
+import base64
+import json
 
 class MealPlan:
+    # Named field projections accepted by the list endpoint
+    PROJECTIONS = {
+        'full': None,
+        'summary': {'meals': 0}
+    }
+    # Newest first; _id breaks ties between plans with the same start_date
+    SORT = [('start_date', -1), ('_id', -1)]
+
     def __init__(self, user_id, meals, duration, start_date=None):
         self.user_id = user_id
         self.meals = meals
         self.duration = duration
         self.start_date = start_date or datetime.utcnow()
         self.status = 'active'
+        # Bumped by every write so ETags and concurrent editors can tell
+        # revisions apart
+        self.version = 1
 
     def to_dict(self):
         return {
@@ -16,25 +32,164 @@ class MealPlan:
             'meals': self.meals,
             'duration': self.duration,
             'start_date': self.start_date,
-            'status': self.status
+            'status': self.status,
+            'version': self.version
         }
 
     def save(self):
         meal_plan_data = self.to_dict()
         result = mongo.db.meal_plans.insert_one(meal_plan_data)
+        identity_map.evict('meal_plans')
+        identity_map.remember('meal_plans', meal_plan_data)
         return str(result.inserted_id)
 
+    # Query builders, shared with app.models.indexes.query_shapes so the
+    # query-plan check explains exactly what the methods send
+
+    @staticmethod
+    def user_query(user_id):
+        return {'user_id': user_id}
+
+    @staticmethod
+    def page_query(user_id, after=None):
+        """
+        A user's plans after the (start_date, _id) position `after` in SORT
+        order.
+        """
+        query = {'user_id': user_id}
+        if after:
+            start_date, plan_id = after
+            query['$or'] = [
+                {'start_date': {'$lt': start_date}},
+                {'start_date': start_date, '_id': {'$lt': plan_id}}
+            ]
+        return query
+
+    @staticmethod
+    def active_query(user_ids):
+        """
+        Active plans of one user, or of any of a list of users.
+        """
+        if isinstance(user_ids, (list, tuple, set)):
+            return {'user_id': {'$in': list(user_ids)}, 'status': 'active'}
+        return {'user_id': user_ids, 'status': 'active'}
+
+    @staticmethod
+    def version_query(meal_plan_id, expected_version):
+        # Plans written before versioning have no version field; they read as 0
+        version = expected_version if expected_version else {'$in': [0, None]}
+        return {'_id': ObjectId(meal_plan_id), 'version': version}
+
     @staticmethod
     def find_by_user_id(user_id):
-        return list(mongo.db.meal_plans.find({'user_id': user_id}))
+        return identity_map.find_one(
+            'meal_plans', ('user_id', user_id),
+            lambda: list(mongo.db.meal_plans.find(MealPlan.user_query(user_id)))
+        )
+
+    @staticmethod
+    def iter_by_user_id(user_id, after=None, projection=None, limit=0, batch_size=50):
+        """
+        Cursor over a user's plans in SORT order, resuming after the
+        (start_date, _id) position decoded from a page cursor.
+        """
+        return mongo.db.meal_plans.find(
+            MealPlan.page_query(user_id, after), projection, sort=MealPlan.SORT, limit=limit, batch_size=batch_size
+        )
+
+    @staticmethod
+    def find_page(user_id, limit, after=None, projection=None):
+        """
+        Return up to `limit` plans and the cursor for the next page, or None
+        when this is the last page.
+        """
+        plans = list(MealPlan.iter_by_user_id(
+            user_id, after=after, projection=projection, limit=limit + 1, batch_size=limit + 1
+        ))
+        next_cursor = None
+        if len(plans) > limit:
+            plans = plans[:limit]
+            next_cursor = MealPlan.encode_cursor(plans[-1])
+        return plans, next_cursor
+
+    @staticmethod
+    def encode_cursor(meal_plan):
+        payload = json.dumps({
+            'start_date': meal_plan['start_date'].isoformat(),
+            'id': str(meal_plan['_id'])
+        }, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return datetime.fromisoformat(payload['start_date']), ObjectId(payload['id'])
+        except (ValueError, KeyError, TypeError, InvalidId):
+            raise ValueError('Invalid cursor')
 
     @staticmethod
     def find_by_id(meal_plan_id):
-        return mongo.db.meal_plans.find_one({'_id': ObjectId(meal_plan_id)})
+        meal_plan_id = ObjectId(meal_plan_id)
+        return identity_map.find_one(
+            'meal_plans', ('_id', meal_plan_id),
+            lambda: mongo.db.meal_plans.find_one({'_id': meal_plan_id})
+        )
+
+    @staticmethod
+    def find_version(meal_plan_id):
+        """
+        Just enough of a plan to build its ETag, for cheap revalidation.
+        """
+        return mongo.db.meal_plans.find_one(
+            {'_id': ObjectId(meal_plan_id)}, {'user_id': 1, 'version': 1}
+        )
 
     @staticmethod
     def update(meal_plan_id, updates):
+        identity_map.evict('meal_plans')
         return mongo.db.meal_plans.update_one(
             {'_id': ObjectId(meal_plan_id)},
-            {'$set': updates}
-        )
\ No newline at end of file
+            {'$set': updates, '$inc': {'version': 1}}
+        )
+
+    @staticmethod
+    def meals_update(days=(), slots=()):
+        """
+        The $set and arrayFilters that overwrite whole days (day dicts as
+        built by MealSelector.plan) and single meals ((day, slot, meal)
+        triples). Elements are matched by their `day` number, so only the
+        changed elements are sent and written.
+        """
+        updates = {}
+        filters = {}
+
+        def element(day):
+            name = f'd{day}'
+            filters[name] = {f'{name}.day': day}
+            return f'meals.$[{name}]'
+
+        for meals in days:
+            updates[element(meals['day'])] = meals
+        for day, slot, meal in slots:
+            updates[f'{element(day)}.{slot}'] = meal
+        return updates, list(filters.values())
+
+    @staticmethod
+    def replace_meals(meal_plan_id, expected_version, days=(), slots=()):
+        """
+        Apply meals_update() in place and bump the version, but only if the
+        plan is still at `expected_version`. Returns the new version, or
+        None if the plan does not exist or was changed in the meantime.
+        """
+        updates, array_filters = MealPlan.meals_update(days, slots)
+        identity_map.evict('meal_plans')
+        updated = mongo.db.meal_plans.find_one_and_update(
+            MealPlan.version_query(meal_plan_id, expected_version),
+            {'$set': updates, '$inc': {'version': 1}},
+            projection={'version': 1},
+            array_filters=array_filters,
+            return_document=ReturnDocument.AFTER
+        )
+        return updated['version'] if updated else None
@@ -0,0 +1,61 @@
+# $jsonSchema validators for every collection, applied by `flask db-bootstrap`
+SCHEMAS = {
+    'users': {
+        'bsonType': 'object',
+        'required': ['email', 'password_hash', 'name', 'role', 'active'],
+        'properties': {
+            'email': {'bsonType': 'string'},
+            'password_hash': {'bsonType': 'string'},
+            'name': {'bsonType': 'string'},
+            'role': {'bsonType': 'string'},
+            'active': {'bsonType': 'bool'},
+            'oauth_provider': {'bsonType': ['string', 'null']},
+            'oauth_id': {'bsonType': ['string', 'null']},
+            'reset_token': {'bsonType': ['string', 'null']},
+            'reset_token_expires': {'bsonType': ['date', 'null']},
+            'reset_attempts': {'bsonType': 'int'}
+        }
+    },
+    'health_profiles': {
+        'bsonType': 'object',
+        'required': ['user_id', 'age', 'gender', 'height', 'weight', 'activity_level', 'last_updated'],
+        'properties': {
+            'user_id': {'bsonType': 'string'},
+            'age': {'bsonType': 'int'},
+            'gender': {'bsonType': 'string'},
+            'height': {'bsonType': 'double'},
+            'weight': {'bsonType': 'double'},
+            'activity_level': {'bsonType': 'string'},
+            'dietary_restrictions': {'bsonType': 'array'},
+            'health_goals': {'bsonType': 'array'},
+            'last_updated': {'bsonType': 'date'}
+        }
+    },
+    'meal_plans': {
+        'bsonType': 'object',
+        'required': ['user_id', 'meals', 'duration', 'start_date', 'status'],
+        'properties': {
+            'user_id': {'bsonType': 'string'},
+            'meals': {'bsonType': 'array'},
+            'duration': {'bsonType': 'int'},
+            'start_date': {'bsonType': 'date'},
+            'status': {'bsonType': 'string'},
+            'version': {'bsonType': 'int'}
+        }
+    }
+}
+
+
+def apply_schemas(db, schemas=SCHEMAS):
+    """
+    Create missing collections and install their validators.
+    """
+    existing = set(db.list_collection_names())
+    for name, schema in schemas.items():
+        if name not in existing:
+            db.create_collection(name)
+        db.command({
+            'collMod': name,
+            'validator': {'$jsonSchema': schema},
+            'validationLevel': 'strict'
+        })
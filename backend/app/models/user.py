@@ -1,12 +1,16 @@
 from app import mongo
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.models import identity_map
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 class User:
-    def __init__(self, email, password, name, role, oauth_provider=None, oauth_id=None, reset_token=None, reset_token_expires=None):
+    # Hashing is the caller's job (see app.services.password_hasher), so
+    # building a User never burns CPU. OAuth-only users have an empty hash.
+    def __init__(self, email, name, role, password_hash='', oauth_provider=None, oauth_id=None, reset_token=None, reset_token_expires=None):
         self.email = email
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hash
         self.name = name
         self.role = role
         self.active = True
@@ -15,9 +19,6 @@ class User:
         self.reset_token = reset_token
         self.reset_token_expires = reset_token_expires
 
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
     def to_dict(self):
         return {
             'email': self.email,
@@ -43,27 +44,95 @@ class User:
             'reset_token_expires': self.reset_token_expires
         }
         result = mongo.db.users.insert_one(user_data)
+        identity_map.evict('users')
+        # insert_one filled in _id, so a follow-up find_by_id needs no query
+        identity_map.remember('users', user_data)
         return str(result.inserted_id)
 
+    # Query builders, shared with app.models.indexes.query_shapes so the
+    # query-plan check explains exactly what the methods below send
+
+    @staticmethod
+    def email_query(email):
+        return {'email': email}
+
+    @staticmethod
+    def oauth_query(oauth_provider, oauth_id):
+        # The $type clause matches the partial unique index's filter so the
+        # planner can use it
+        return {'oauth_provider': oauth_provider, 'oauth_id': {'$eq': oauth_id, '$type': 'string'}}
+
+    @staticmethod
+    def reset_token_query(token):
+        return {'reset_token': token}
+
     @staticmethod
     def find_by_email(email):
-        return mongo.db.users.find_one({'email': email})
+        return identity_map.find_one(
+            'users', ('email', email),
+            lambda: mongo.db.users.find_one(User.email_query(email))
+        )
 
     @staticmethod
     def find_by_oauth(oauth_provider, oauth_id):
-        return mongo.db.users.find_one({'oauth_provider': oauth_provider, 'oauth_id': oauth_id})
+        return identity_map.find_one(
+            'users', ('oauth', oauth_provider, oauth_id),
+            lambda: mongo.db.users.find_one(User.oauth_query(oauth_provider, oauth_id))
+        )
 
     @staticmethod
     def find_by_id(user_id):
-        return mongo.db.users.find_one({'_id': ObjectId(user_id)})
+        user_id = ObjectId(user_id)
+        return identity_map.find_one(
+            'users', ('_id', user_id),
+            lambda: mongo.db.users.find_one({'_id': user_id})
+        )
+
+    @staticmethod
+    def upsert_oauth_user(email, name, oauth_provider, oauth_id, attempts=3):
+        """
+        Find the user by OAuth identity, otherwise link the identity to the
+        user with this email, otherwise create the user. Returns the final
+        user document.
+
+        The identity is looked up on its own first so that, when it and the
+        email belong to two different users, the identity's owner is the one
+        signed in and the other account is left alone. Two first-time logins
+        racing each other both try to insert; the unique indexes reject the
+        loser, whose retry then finds the winner's document.
+        """
+        identity_map.evict('users')
+        for _ in range(attempts):
+            user = mongo.db.users.find_one(User.oauth_query(oauth_provider, oauth_id))
+            if user is not None:
+                identity_map.remember('users', user)
+                return user
+            try:
+                user = mongo.db.users.find_one_and_update(
+                    User.email_query(email),
+                    {'$set': {'oauth_provider': oauth_provider, 'oauth_id': oauth_id}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if user is None:
+                    user_id = User(email=email, name=name, role='user',
+                                   oauth_provider=oauth_provider, oauth_id=oauth_id).save()
+                    return User.find_by_id(user_id)
+            except DuplicateKeyError:
+                # Someone else linked or created this identity or email in
+                # the meantime; look again
+                continue
+            identity_map.remember('users', user)
+            return user
+        raise DuplicateKeyError(f'Could not upsert {oauth_provider} user {oauth_id}')
 
     @staticmethod
     def create_oauth_user(email, name, oauth_provider, oauth_id):
-        user = User(email=email, name=name, oauth_provider=oauth_provider, oauth_id=oauth_id)
+        user = User(email=email, name=name, role='user', oauth_provider=oauth_provider, oauth_id=oauth_id)
         user_id = user.save()
         return User.find_by_id(user_id)
     @staticmethod
     def update_oauth_info(user_id, oauth_provider, oauth_id):
+        identity_map.evict('users')
         mongo.db.users.update_one(
             {'_id': ObjectId(user_id)},
             {'$set': {'oauth_provider': oauth_provider, 'oauth_id': oauth_id}}
@@ -71,30 +140,58 @@ class User:
 
     @staticmethod
     def update_reset_token(user_id, token, expires):
+        identity_map.evict('users')
         mongo.db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {'reset_token': token, 'reset_token_expires': expires}}
+            {'$set': {'reset_token': token, 'reset_token_expires': expires, 'reset_attempts': 0}}
         )
     
     @staticmethod
     def clear_reset_token(user_id):
+        identity_map.evict('users')
         mongo.db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$unset': {'reset_token': '', 'reset_token_expires': ''}}
+            {'$unset': {'reset_token': '', 'reset_token_expires': '', 'reset_attempts': ''}}
+        )
+
+    @staticmethod
+    def use_reset_attempt(user_id, max_attempts):
+        """
+        Count one guess at the user's reset code and return the updated
+        user, or None if they have no code or no guesses left.
+        """
+        identity_map.evict('users')
+        return mongo.db.users.find_one_and_update(
+            {'_id': ObjectId(user_id), 'reset_token': {'$type': 'string'},
+             'reset_attempts': {'$not': {'$gte': max_attempts}}},
+            {'$inc': {'reset_attempts': 1}},
+            return_document=ReturnDocument.AFTER
         )
 
     @staticmethod
     def find_by_reset_token(token):
-        return mongo.db.users.find_one({'reset_token': token})
+        return identity_map.find_one(
+            'users', ('reset_token', token),
+            lambda: mongo.db.users.find_one(User.reset_token_query(token))
+        )
 
     @staticmethod
-    def update_password(user_id, new_password):
-        password_hash = generate_password_hash(new_password)
+    def update_password(user_id, password_hash):
+        identity_map.evict('users')
         mongo.db.users.update_one(
             {'_id': ObjectId(user_id)},
             {
                 '$set': {'password_hash': password_hash},
-                '$unset': {'reset_token': ''}
+                '$unset': {'reset_token': '', 'reset_token_expires': '', 'reset_attempts': ''}
             }
         )
 
+    @staticmethod
+    def update_password_hash(user_id, old_hash, new_hash):
+        identity_map.evict('users')
+        # Only replaces the hash it was computed from, so a password change
+        # that lands in between wins
+        return mongo.db.users.update_one(
+            {'_id': ObjectId(user_id), 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash}}
+        )
@@ -0,0 +1,129 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from bson import Binary, Decimal128, ObjectId
+
+# orjson is optional: several times faster than the standard library, and
+# handles datetime natively. Without it the same output comes from json.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def default(obj):
+    """
+    Encode the BSON and Python types that show up in Mongo documents.
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (Binary, bytes)):
+        return base64.b64encode(obj).decode()
+    if hasattr(obj, 'tolist'):
+        # NumPy arrays and scalars
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj, sort_keys=False, indent=False):
+        option = _OPTIONS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj, sort_keys=False, indent=False):
+        return json.dumps(
+            obj, default=default, sort_keys=sort_keys, indent=2 if indent else None,
+            separators=(',', ': ') if indent else (',', ':'), ensure_ascii=False
+        ).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps(obj, sort_keys=False, indent=False):
+    return dumps_bytes(obj, sort_keys=sort_keys, indent=indent).decode()
+
+
+class BSONJSONEncoder(json.JSONEncoder):
+    """
+    Drop-in app.json_encoder for Flask < 2.2. Flask's json.dumps builds one
+    of these and calls encode(), which is handed straight to dumps().
+    """
+
+    def default(self, obj):
+        return default(obj)
+
+    def encode(self, obj):
+        return dumps(obj, sort_keys=self.sort_keys, indent=bool(self.indent))
+
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
+if DefaultJSONProvider is not None:
+    class BSONJSONProvider(DefaultJSONProvider):
+        """
+        The same encoding through Flask 2.2+'s JSON provider interface.
+        """
+
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                         indent=bool(kwargs.get('indent')))
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+
+def init_json(app):
+    """
+    Make jsonify and every other Flask JSON response use this module.
+    """
+    if DefaultJSONProvider is not None:
+        app.json = BSONJSONProvider(app)
+    else:
+        app.json_encoder = BSONJSONEncoder
+
+
+def stream_object(obj, chunk_size=32):
+    """
+    Yield the JSON for a dict piece by piece. List values are emitted
+    `chunk_size` items at a time, so a large array is never encoded into a
+    single string and the first bytes go out before the last are encoded.
+    """
+    yield '{'
+    for position, (key, value) in enumerate(obj.items()):
+        prefix = (',' if position else '') + dumps(str(key)) + ':'
+        if isinstance(value, dict):
+            yield prefix
+            yield from stream_object(value, chunk_size)
+        elif isinstance(value, list) and len(value) > chunk_size:
+            yield prefix + '['
+            for start in range(0, len(value), chunk_size):
+                chunk = dumps(value[start:start + chunk_size])[1:-1]
+                yield (',' if start else '') + chunk
+            yield ']'
+        else:
+            yield prefix + dumps(value)
+    yield '}'
@@ -1,6 +1,8 @@
 from app.models.health_profile import HealthProfile
 from app.ml_models.questionnaire_generator import QuestionnaireGenerator
 
+MAX_ANALYSIS_BATCH = 10000
+
 class AssessmentService:
     def __init__(self):
         self.questionnaire_generator = QuestionnaireGenerator()
@@ -42,11 +44,10 @@ class AssessmentService:
 
     def update_health_profile(self, user_id, updates):
         try:
-            result = HealthProfile.update(user_id, updates)
-            if result.modified_count == 0:
+            updated_profile = HealthProfile.update(user_id, updates)
+            if updated_profile is None:
                 return {'success': False, 'message': 'Health profile not found'}, 404
 
-            updated_profile = HealthProfile.find_by_user_id(user_id)
             return {
                 'success': True,
                 'message': 'Health profile updated successfully',
@@ -56,9 +57,9 @@ class AssessmentService:
         except Exception as e:
             return {'success': False, 'message': str(e)}, 500
 
-    def generate_questionnaire(self):
+    def generate_questionnaire(self, num_questions=5, seed=None):
         try:
-            questions = self.questionnaire_generator.generate_questionnaire()
+            questions = self.questionnaire_generator.generate_questionnaire(num_questions, seed=seed)
             return {'success': True, 'questions': questions}, 200
         except Exception as e:
             return {'success': False, 'message': str(e)}, 500
@@ -68,4 +69,15 @@ class AssessmentService:
             analysis = self.questionnaire_generator.analyze_responses(responses)
             return {'success': True, 'analysis': analysis}, 200
         except Exception as e:
-            return {'success': False, 'message': str(e)}, 500
\ No newline at end of file
+            return {'success': False, 'message': str(e)}, 500
+
+    def analyze_responses_batch(self, response_sets):
+        if len(response_sets) > MAX_ANALYSIS_BATCH:
+            return {'success': False, 'message': f'At most {MAX_ANALYSIS_BATCH} response sets per request'}, 413
+        if not all(isinstance(responses, dict) for responses in response_sets):
+            return {'success': False, 'message': 'Each response set must be an object'}, 400
+        try:
+            analyses = self.questionnaire_generator.analyze_responses_batch(response_sets)
+            return {'success': True, 'analyses': analyses}, 200
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
@@ -1,10 +1,17 @@
 from app.models.user import User
+from flask import current_app
 from flask_jwt_extended import create_access_token
 from datetime import timedelta, datetime
+import hmac
 import secrets
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.services.email_service import send_otp_email
-import random
+from app.services.password_hasher import password_hasher, HashingOverloaded
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Guesses allowed per reset code; after that the code is thrown away
+MAX_RESET_ATTEMPTS = 5
 
 
 class AuthService:
@@ -14,7 +21,7 @@ class AuthService:
             return {'success': False, 'message': 'Email already registered'}, 400
         
         try:
-            user = User(email=email, password=password, name=name, role=role)
+            user = User(email=email, name=name, role=role, password_hash=password_hasher.hash(password))
             user_id = user.save()
             access_token = create_access_token(identity=user_id)
             
@@ -24,6 +31,8 @@ class AuthService:
                 'access_token': access_token,
                 'user': user.to_dict()
             }, 201
+        except HashingOverloaded:
+            return {'success': False, 'message': 'Server busy, please retry'}, 503
         except Exception as e:
             return {'success': False, 'message': str(e)}, 500
 
@@ -34,7 +43,14 @@ class AuthService:
         if not user:
             return {'success': False, 'message': 'User not found'}, 404
 
-        if check_password_hash(user['password_hash'], password):
+        try:
+            valid = password_hasher.verify(user['password_hash'], password)
+        except HashingOverloaded:
+            return {'success': False, 'message': 'Server busy, please retry'}, 503
+
+        if valid:
+            if password_hasher.needs_rehash(user['password_hash']):
+                AuthService._rehash_in_background(user['_id'], user['password_hash'], password)
             access_token = create_access_token(identity=str(user['_id']))
             return {
                 'success': True,
@@ -50,31 +66,39 @@ class AuthService:
             return {'success': False, 'message': 'Invalid credentials'}, 401
      
      @staticmethod
-     def oauth_login_or_register(provider, email, name, oauth_id):
-        user = User.find_by_oauth(provider, oauth_id)
-        if not user:
-            user = User.find_by_email(email)
-            if user:
-                # Update existing user with OAuth info
-                User.update_oauth_info(user['_id'], provider, oauth_id)
-            else:
-                # Create new user
-                user = User(email=email, name=name, password=None, role='user', oauth_provider=provider, oauth_id=oauth_id)
-                user_id = user.save()
-                user = User.find_by_id(user_id)
+     def _rehash_in_background(user_id, old_hash, password):
+        """
+        Upgrade a hash made with outdated parameters without delaying login.
+        """
+        app = current_app._get_current_object()
 
+        def store(future):
+            if future.exception():
+                logger.warning(f"Password rehash failed for {user_id}: {future.exception()}")
+                return
+            with app.app_context():
+                User.update_password_hash(user_id, old_hash, future.result())
+
+        try:
+            password_hasher.hash_async(password).add_done_callback(store)
+        except HashingOverloaded:
+            pass  # Try again on a later login
+
+     @staticmethod
+     def oauth_login_or_register(provider, email, name, oauth_id):
+        user = User.upsert_oauth_user(email, name, provider, oauth_id)
         access_token = create_access_token(identity=str(user['_id']))
         return {
             'success': True,
             'access_token': access_token,
-            'user': User(email=user['email'], password=None, name=user['name'], role=user['role']).to_dict()
+            'user': User(email=user['email'], name=user['name'], role=user['role']).to_dict()
         }, 200
 
      @staticmethod
      def initiate_password_reset(email):
         user = User.find_by_email(email)
         if user:
-            otp = ''.join([str(random.randint(0, 9)) for _ in range(6)])
+            otp = f'{secrets.randbelow(10 ** 6):06d}'
             expiry = datetime.utcnow() + timedelta(minutes=10)
             User.update_reset_token(user['_id'], otp, expiry)
             send_otp_email(email, otp)
@@ -82,19 +106,48 @@ class AuthService:
         return False
 
      @staticmethod
-     def verify_otp(email, otp):
+     def _check_otp(email, otp):
+        """
+        The user behind `email` if `otp` is their current reset code, else
+        None. Every guess uses up one of MAX_RESET_ATTEMPTS before it is
+        compared, so parallel guesses can't get past the limit either.
+        """
         user = User.find_by_email(email)
-        if user and user['reset_token'] == otp and user['reset_token_expires'] > datetime.utcnow():
-            return True
-        return False
+        if not user or not otp:
+            return None
+        user = User.use_reset_attempt(user['_id'], MAX_RESET_ATTEMPTS)
+        if not user:
+            return None
+        if user['reset_attempts'] >= MAX_RESET_ATTEMPTS:
+            User.clear_reset_token(user['_id'])
+        if user['reset_token_expires'] <= datetime.utcnow():
+            return None
+        if not hmac.compare_digest(user['reset_token'].encode(), str(otp).encode()):
+            return None
+        return user
+
+     @staticmethod
+     def verify_otp(email, otp):
+        return AuthService._check_otp(email, otp) is not None
 
      @staticmethod
      def reset_password(email, new_password):
         user = User.find_by_email(email)
         if user:
-            User.update_password(user['_id'], new_password)
-            User.clear_reset_token(user['_id'])
+            User.update_password(user['_id'], password_hasher.hash(new_password))
             return True
         return False
 
+     @staticmethod
+     def complete_password_reset(email, otp, new_password):
+        """
+        Set a new password with the reset code sent to `email`. The code
+        is cleared on success, so it works once.
+        """
+        user = AuthService._check_otp(email, otp)
+        if not user:
+            return False
+        User.update_password(user['_id'], password_hasher.hash(new_password))
+        return True
+
 
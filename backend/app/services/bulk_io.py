@@ -0,0 +1,328 @@
+import csv
+import json
+import re
+import time
+from datetime import datetime
+from itertools import islice
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from app import mongo
+from app.models.schemas import SCHEMAS
+
+# Filled in for fields a row leaves out, so imports needn't repeat them
+DEFAULTS = {
+    'users': lambda: {'password_hash': '', 'role': 'user', 'active': True},
+    'health_profiles': lambda: {'dietary_restrictions': [], 'health_goals': [], 'last_updated': datetime.utcnow()},
+    'meal_plans': lambda: {'status': 'active', 'start_date': datetime.utcnow(), 'version': 1}
+}
+
+# Fields the app writes besides the validator's properties. Imports accept
+# these; any other field the schema doesn't know rejects the row.
+EXTRA_PROPERTIES = {
+    'meal_plans': {'superseded_at': {'bsonType': ['date', 'null']}}
+}
+
+# A plaintext `password` column for users is hashed into password_hash on
+# import. Any other credential-looking column is refused, never stored.
+PASSWORD_FIELD = 'password'
+_CREDENTIAL_FIELD = re.compile(r'pass|pwd|secret', re.IGNORECASE)
+_HASH_METHODS = ('pbkdf2', 'scrypt')
+
+_TRUE = ('1', 'true', 'yes')
+_FALSE = ('0', 'false', 'no')
+
+
+def _types(spec):
+    types = spec.get('bsonType', [])
+    return [types] if isinstance(types, str) else list(types)
+
+
+def _coerce(value, types):
+    """
+    Turn a CSV string or JSON value into the BSON type the validator wants.
+    Raises ValueError when it can't.
+    """
+    if value is None or value == '':
+        if 'null' in types:
+            return None
+        raise ValueError('is required')
+    if 'int' in types:
+        if isinstance(value, float) and not value.is_integer():
+            raise ValueError(f'expected an integer, got {value!r}')
+        return int(value)
+    if 'double' in types:
+        return float(value)
+    if 'bool' in types:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in _TRUE:
+            return True
+        if str(value).lower() in _FALSE:
+            return False
+        raise ValueError(f'expected a boolean, got {value!r}')
+    if 'date' in types:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value).rstrip('Z'))
+    if 'array' in types or 'object' in types:
+        if isinstance(value, str):
+            # CSV cells hold JSON, or a plain ;-separated list for arrays
+            if value.lstrip().startswith(('[', '{')):
+                return json.loads(value)
+            return [item.strip() for item in value.split(';') if item.strip()]
+        return value
+    if 'string' in types:
+        return str(value)
+    return value
+
+
+def _matches(value, types):
+    checks = {
+        'string': lambda v: isinstance(v, str),
+        'int': lambda v: isinstance(v, int) and not isinstance(v, bool),
+        'double': lambda v: isinstance(v, float),
+        'bool': lambda v: isinstance(v, bool),
+        'date': lambda v: isinstance(v, datetime),
+        'array': lambda v: isinstance(v, list),
+        'object': lambda v: isinstance(v, dict),
+        'null': lambda v: v is None
+    }
+    return any(checks[t](value) for t in types if t in checks)
+
+
+def prepare_document(collection, row):
+    """
+    Apply defaults, coerce types and check the row against the collection's
+    $jsonSchema. Returns (document, errors); the document is only usable
+    when errors is empty.
+    """
+    schema = SCHEMAS[collection]
+    properties = {**schema.get('properties', {}), **EXTRA_PROPERTIES.get(collection, {})}
+    document = DEFAULTS.get(collection, dict)()
+    errors = []
+    failed = set()
+    for field, value in row.items():
+        if field == '_id':
+            if value:
+                try:
+                    document['_id'] = ObjectId(value)
+                except Exception:
+                    errors.append(f'_id: invalid ObjectId {value!r}')
+            continue
+        if collection == 'users' and field == PASSWORD_FIELD:
+            if value not in (None, ''):
+                if row.get('password_hash'):
+                    errors.append(f'{field}: give either password or password_hash, not both')
+                else:
+                    # Left for import_documents to hash; never written as is
+                    document[PASSWORD_FIELD] = str(value)
+            continue
+        spec = properties.get(field)
+        if spec is None:
+            if value not in (None, ''):
+                if _CREDENTIAL_FIELD.search(field):
+                    errors.append(f'{field}: refusing to import a plaintext credential')
+                else:
+                    errors.append(f'{field}: unknown field')
+            continue
+        if value in (None, '') and field not in schema.get('required', []):
+            if 'null' in _types(spec):
+                document[field] = None
+            continue
+        try:
+            document[field] = _coerce(value, _types(spec))
+        except (ValueError, TypeError) as e:
+            errors.append(f'{field}: {e}')
+            failed.add(field)
+    for field in schema.get('required', []):
+        if field not in document and field not in failed:
+            errors.append(f'{field}: is required')
+    if document.get('password_hash') and not _is_password_hash(document['password_hash']):
+        errors.append('password_hash: not a password hash; import plaintext as password')
+    if not errors:
+        for field, value in document.items():
+            spec = properties.get(field)
+            if spec is not None and not _matches(value, _types(spec)):
+                errors.append(f'{field}: expected {"/".join(_types(spec))}')
+    return document, errors
+
+
+def _redact(row):
+    # Credentials never reach the reject file in the clear
+    if not isinstance(row, dict):
+        return row
+    return {
+        field: '<redacted>' if _CREDENTIAL_FIELD.search(field) and value not in (None, '') else value
+        for field, value in row.items()
+    }
+
+
+def _is_password_hash(value):
+    method, sep, _ = str(value).partition('$')
+    return bool(sep) and method.split(':', 1)[0] in _HASH_METHODS
+
+
+def hash_passwords(documents):
+    """
+    Replace the plaintext `password` of imported users with password_hash,
+    hashing the whole batch concurrently on the shared hashing pool.
+    """
+    from app.services.password_hasher import password_hasher
+    pending = [
+        (document, password_hasher.hash_async(document.pop(PASSWORD_FIELD)))
+        for document in documents if PASSWORD_FIELD in document
+    ]
+    for document, future in pending:
+        document['password_hash'] = future.result()
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (raw row, parsed row) from a CSV or JSONL stream. Lines that are
+    not valid JSON come through with a parsed row of None.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            yield row, row
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    yield line, json.loads(line)
+                except ValueError:
+                    yield line, None
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.written = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return self.read / elapsed if elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'read': self.read,
+            'written': self.written,
+            'rejected': self.rejected,
+            'rows_per_second': round(self.rows_per_second)
+        }
+
+
+def import_documents(collection, stream, fmt, rejects, chunk_size=1000, upsert_key=None, progress=None):
+    """
+    Validate rows client-side and write them in unordered batches.
+
+    Rows that fail validation, or that the server rejects (duplicate keys,
+    validator errors), are written to `rejects` as JSON lines with their
+    errors. With `upsert_key`, rows replace the document with the same value
+    of that field instead of being inserted.
+    """
+    stats = ImportStats()
+
+    def reject(row_number, raw, errors):
+        stats.rejected += 1
+        rejects.write(json.dumps({'row_number': row_number, 'row': _redact(raw), 'errors': errors}, default=str) + '\n')
+
+    rows = enumerate(read_rows(stream, fmt), start=1)
+    for chunk in _chunks(rows, chunk_size):
+        batch = []
+        for row_number, (raw, row) in chunk:
+            stats.read += 1
+            if not isinstance(row, dict):
+                reject(row_number, raw, ['invalid JSON' if row is None else 'row is not an object'])
+                continue
+            # The parsed row, so the reject file can redact credentials
+            raw = row
+            document, errors = prepare_document(collection, row)
+            if errors:
+                reject(row_number, raw, errors)
+            elif upsert_key and upsert_key not in document:
+                reject(row_number, raw, [f'{upsert_key}: is required for upserts'])
+            else:
+                batch.append((row_number, raw, document))
+        if batch:
+            if collection == 'users':
+                hash_passwords([document for _, _, document in batch])
+            stats.written += _write_batch(collection, batch, upsert_key, reject)
+        if progress:
+            progress(stats)
+    return stats
+
+
+def _write_batch(collection, batch, upsert_key, reject):
+    documents = [document for _, _, document in batch]
+    try:
+        if upsert_key:
+            result = mongo.db[collection].bulk_write([
+                ReplaceOne({upsert_key: document[upsert_key]}, document, upsert=True)
+                for document in documents
+            ], ordered=False)
+            written = result.upserted_count + result.matched_count
+        else:
+            written = len(mongo.db[collection].insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        for error in errors:
+            row_number, raw, _ = batch[error['index']]
+            reject(row_number, raw, [error.get('errmsg', 'write failed')])
+        written = len(batch) - len(errors)
+    _invalidate(collection, documents)
+    return written
+
+
+def _invalidate(collection, documents):
+    # Imports bypass the model layer, so drop anything it may have cached
+    if collection == 'health_profiles':
+        from app.models.health_profile import profile_cache
+        for document in documents:
+            profile_cache.delete(document.get('user_id'))
+
+
+def _jsonable(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def export_documents(collection, stream, fmt, batch_size=1000, query=None):
+    """
+    Stream every document of `collection` to CSV or JSONL. Memory stays at
+    one cursor batch regardless of collection size. Returns the row count.
+    """
+    cursor = mongo.db[collection].find(query or {}, batch_size=batch_size)
+    count = 0
+    if fmt == 'csv':
+        columns = ['_id'] + list(SCHEMAS[collection].get('properties', {}))
+        writer = csv.DictWriter(stream, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for document in cursor:
+            writer.writerow({
+                field: json.dumps(value, default=_jsonable) if isinstance(value, (list, dict))
+                else _jsonable(value) if isinstance(value, (ObjectId, datetime))
+                else value
+                for field, value in document.items()
+            })
+            count += 1
+    else:
+        for document in cursor:
+            stream.write(json.dumps(document, default=_jsonable) + '\n')
+            count += 1
+    return count
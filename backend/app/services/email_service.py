@@ -1,19 +1,26 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import logging
 import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
 
-def send_otp_email(to_email, otp):
-    smtp_server = "smtp.gmail.com"
-    port = 587
-    sender_email = os.getenv("EMAIL_USER")
-    password = os.getenv("EMAIL_PASSWORD")
+from app.models.email_outbox import EmailOutbox
+from app.metrics import SMTP_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Errors that retrying will not fix; the message is dead-lettered right away
+PERMANENT_SMTP_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
 
-    message = MIMEMultipart("alternative")
-    message["Subject"] = "Password Reset OTP"
-    message["From"] = sender_email
-    message["To"] = to_email
 
+def send_otp_email(to_email, otp):
+    """
+    Queue the password reset OTP for delivery and return immediately.
+    """
     text = f"""
     Your OTP for password reset is: {otp}
     This OTP will expire in 10 minutes.
@@ -28,14 +35,193 @@ def send_otp_email(to_email, otp):
     </html>
     """
 
-    part1 = MIMEText(text, "plain")
-    part2 = MIMEText(html, "html")
+    message_id = EmailOutbox(to_email, "Password Reset OTP", text, html).save()
+    if outbox_sender is not None:
+        outbox_sender.wake()
+    return message_id
+
+
+def build_message(sender_email, outbox_message):
+    message = MIMEMultipart("alternative")
+    message["Subject"] = outbox_message['subject']
+    message["From"] = sender_email
+    message["To"] = outbox_message['to']
+
+    message.attach(MIMEText(outbox_message['text'], "plain"))
+    if outbox_message.get('html'):
+        message.attach(MIMEText(outbox_message['html'], "html"))
+    return message
+
+
+class SMTPConnectionPool:
+    """
+    Keeps logged-in SMTP connections open between batches.
+
+    For local testing point SMTP_HOST/SMTP_PORT at a debugging server such as
+    `python -m aiosmtpd -n -l localhost:1025` and set SMTP_STARTTLS=0.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None,
+                 starttls=None, size=None, timeout=None, idle_check_seconds=30):
+        self.host = host or os.getenv('SMTP_HOST', 'smtp.gmail.com')
+        self.port = int(port or os.getenv('SMTP_PORT', 587))
+        self.username = username or os.getenv('EMAIL_USER')
+        self.password = password or os.getenv('EMAIL_PASSWORD')
+        if starttls is None:
+            starttls = os.getenv('SMTP_STARTTLS', '1').lower() not in ('0', 'false', 'no')
+        self.starttls = starttls
+        self.timeout = float(timeout or os.getenv('SMTP_TIMEOUT', 30))
+        self.idle_check_seconds = idle_check_seconds
+        self._idle = queue.LifoQueue(maxsize=int(size or os.getenv('SMTP_POOL_SIZE', 2)))
+
+    @property
+    def sender_email(self):
+        return self.username or os.getenv('EMAIL_FROM', 'no-reply@localhost')
 
-    message.attach(part1)
-    message.attach(part2)
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
 
-    with smtplib.SMTP(smtp_server, port) as server:
-        server.starttls()
-        server.login(sender_email, password)
-        server.sendmail(sender_email, to_email, message.as_string())
+    def acquire(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.idle_check_seconds:
+                return server
+            # Servers drop idle sessions; check before reusing an old one
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            self.discard(server)
 
+    def release(self, server):
+        try:
+            self._idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            self.discard(server)
+
+    def discard(self, server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+class OutboxSender:
+    """
+    Drains the email outbox over pooled SMTP connections.
+
+    Each pass claims up to `batch_size` due messages and sends them over one
+    connection. Failures are retried with exponential backoff starting at
+    `base_backoff_seconds`; after `max_attempts` (or a permanent SMTP error)
+    the message is dead-lettered with status 'dead'.
+    """
+
+    def __init__(self, app, pool=None, batch_size=None, poll_interval=None,
+                 max_attempts=None, base_backoff_seconds=None, lease_seconds=None):
+        self.app = app
+        self.pool = pool or SMTPConnectionPool()
+        self.batch_size = int(batch_size or os.getenv('EMAIL_BATCH_SIZE', 50))
+        self.poll_interval = float(poll_interval or os.getenv('EMAIL_POLL_INTERVAL', 2))
+        self.max_attempts = int(max_attempts or os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+        self.base_backoff_seconds = float(base_backoff_seconds or os.getenv('EMAIL_BASE_BACKOFF', 5))
+        # Long enough for a few sends at the SMTP timeout; drain_once renews
+        # it while it works through a batch, so the batch size doesn't matter
+        self.lease_seconds = float(lease_seconds or os.getenv('EMAIL_LEASE_SECONDS') or 4 * self.pool.timeout)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def drain_once(self):
+        """
+        Send one batch. Returns the number of messages claimed.
+        """
+        with self.app.app_context():
+            messages = EmailOutbox.claim_batch(self.batch_size, self.lease_seconds)
+            if not messages:
+                return 0
+
+            claim = messages[0]['claim']
+            lease_until = messages[0]['lease_until']
+            # Renew once less than two sends' worth of lease is left
+            renew_margin = timedelta(seconds=2 * self.pool.timeout)
+            server = None
+            for i, message in enumerate(messages):
+                if lease_until - datetime.utcnow() < renew_margin:
+                    lease_until = EmailOutbox.extend_lease(
+                        claim, [m['_id'] for m in messages[i:]], self.lease_seconds
+                    )
+                started = time.perf_counter()
+                try:
+                    if server is None:
+                        server = self.pool.acquire()
+                    mime = build_message(self.pool.sender_email, message)
+                    server.sendmail(self.pool.sender_email, message['to'], mime.as_string())
+                    SMTP_SEND_LATENCY.labels('sent').observe(time.perf_counter() - started)
+                except PERMANENT_SMTP_ERRORS as e:
+                    SMTP_SEND_LATENCY.labels('rejected').observe(time.perf_counter() - started)
+                    EmailOutbox.mark_failed(message, e, self.max_attempts, self.base_backoff_seconds, permanent=True)
+                except (smtplib.SMTPException, OSError) as e:
+                    SMTP_SEND_LATENCY.labels('failed').observe(time.perf_counter() - started)
+                    logger.warning(f"Sending email {message['_id']} failed: {e}")
+                    EmailOutbox.mark_failed(message, e, self.max_attempts, self.base_backoff_seconds)
+                    if server is not None:
+                        # The connection may be unusable; start fresh for the rest
+                        self.pool.discard(server)
+                        server = None
+                else:
+                    # Straight away, so a crash or a lost lease later in the
+                    # batch can't send this one again
+                    EmailOutbox.mark_sent(claim, [message['_id']])
+            if server is not None:
+                self.pool.release(server)
+            return len(messages)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.drain_once()
+            except Exception as e:
+                logger.error(f"Email outbox sender error: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        # Started on demand so pre-fork servers get one thread per worker
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run_forever, name='email-outbox', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+# Set by init_outbox_sender when mail is sent from the web process itself
+outbox_sender = None
+
+
+def init_outbox_sender(app):
+    """
+    Drain the outbox from a thread inside each web worker. The alternative
+    is running `flask email-sender` as a separate process.
+    """
+    global outbox_sender
+    outbox_sender = OutboxSender(app)
+    return outbox_sender
@@ -1,11 +1,25 @@
 from app.models.meal_plan import MealPlan
 from app.models.health_profile import HealthProfile
 from app.ml_models.nutrition_recommender import NutritionRecommender
+from app.serialization import dumps
+from bson.errors import InvalidId
 from datetime import datetime
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 class MealPlanningService:
     def __init__(self):
         self.nutrition_recommender = NutritionRecommender()
+        self._meal_selector = None
+
+    @property
+    def meal_selector(self):
+        # Loading the food catalog pulls in NumPy, so defer it to the first plan
+        if self._meal_selector is None:
+            from app.ml_models.meal_selector import MealSelector
+            self._meal_selector = MealSelector()
+        return self._meal_selector
 
     def create_meal_plan(self, user_id, duration):
         try:
@@ -18,7 +32,11 @@ class MealPlanningService:
             recommendations = self.nutrition_recommender.recommend_nutrition(health_profile)
 
             # Generate meal plan based on recommendations
-            meals = self._generate_meals(recommendations, duration)
+            meals = self._generate_meals(
+                recommendations,
+                duration,
+                health_profile.get('dietary_restrictions', [])
+            )
 
             # Create and save meal plan
             meal_plan = MealPlan(
@@ -33,48 +51,125 @@ class MealPlanningService:
                 'success': True,
                 'message': 'Meal plan created successfully',
                 'meal_plan_id': meal_plan_id,
-                'meal_plan': meal_plan.to_dict()
+                'meal_plan': meal_plan.to_dict(),
+                'unrecognized_restrictions': self.unrecognized_restrictions(health_profile)
             }, 201
 
         except Exception as e:
             return {'success': False, 'message': str(e)}, 500
 
-    def _generate_meals(self, recommendations, duration):
-        # This is a simplified version. In a real application,
-        # this would be more sophisticated and would use the
-        # nutrition recommender to generate appropriate meals.
-        meals = []
-        for day in range(duration):
-            daily_meals = {
-                'day': day + 1,
-                'breakfast': {
-                    'name': 'Healthy Breakfast',
-                    'calories': recommendations['calories'] * 0.3,
-                    'protein': recommendations['protein'] * 0.3,
-                    'carbs': recommendations['carbs'] * 0.3,
-                    'fat': recommendations['fat'] * 0.3
-                },
-                'lunch': {
-                    'name': 'Balanced Lunch',
-                    'calories': recommendations['calories'] * 0.35,
-                    'protein': recommendations['protein'] * 0.35,
-                    'carbs': recommendations['carbs'] * 0.35,
-                    'fat': recommendations['fat'] * 0.35
-                },
-                'dinner': {
-                    'name': 'Nutritious Dinner',
-                    'calories': recommendations['calories'] * 0.35,
-                    'protein': recommendations['protein'] * 0.35,
-                    'carbs': recommendations['carbs'] * 0.35,
-                    'fat': recommendations['fat'] * 0.35
-                }
-            }
-            meals.append(daily_meals)
-        return meals
-
-    def get_meal_plans(self, user_id):
+    def regenerate_days(self, user_id, meal_plan_id, start_day, version, end_day=None, slot=None,
+                        seed=None):
+        """
+        Re-plan days start_day..end_day (inclusive) of a plan, or just one
+        meal slot on those days, in place. `version` must match the plan's
+        current version or nothing is written and 409 is returned.
+        """
+        try:
+            meal_plan = MealPlan.find_by_id(meal_plan_id)
+            if not meal_plan or meal_plan['user_id'] != user_id:
+                return {'success': False, 'message': 'Meal plan not found'}, 404
+
+            end_day = start_day if end_day is None else end_day
+            if not 1 <= start_day <= end_day <= meal_plan['duration']:
+                return {'success': False, 'message': f"Days must be within 1-{meal_plan['duration']}"}, 400
+            if slot is not None and slot not in self.meal_selector.MEAL_SHARES:
+                return {'success': False, 'message': f'Unknown meal slot: {slot}'}, 400
+
+            current_version = meal_plan.get('version', 0)
+            if version != current_version:
+                return self._version_conflict(current_version)
+
+            health_profile = HealthProfile.find_by_user_id(user_id)
+            if not health_profile:
+                return {'success': False, 'message': 'Health profile not found'}, 404
+
+            days, slots = self.replan_days(
+                health_profile, start_day, end_day, slot,
+                # The selector is deterministic per (day, seed), so a new seed
+                # is what makes the new meals differ from the current ones
+                current_version if seed is None else seed
+            )
+            new_version = MealPlan.replace_meals(meal_plan_id, version, days=days, slots=slots)
+            if new_version is None:
+                current = MealPlan.find_version(meal_plan_id)
+                if current is None:
+                    return {'success': False, 'message': 'Meal plan not found'}, 404
+                return self._version_conflict(current.get('version', 0))
+
+            return {
+                'success': True,
+                'message': 'Meal plan updated successfully',
+                'meal_plan_id': meal_plan_id,
+                'version': new_version,
+                'days': days or [{'day': day, slot: meal} for day, slot, meal in slots],
+                'unrecognized_restrictions': self.unrecognized_restrictions(health_profile)
+            }, 200
+
+        except InvalidId:
+            return {'success': False, 'message': 'Meal plan not found'}, 404
+        except Exception as e:
+            return {'success': False, 'message': str(e)}, 500
+
+    def replan_days(self, health_profile, start_day, end_day, slot=None, seed=0):
+        """
+        New meals for days start_day..end_day: whole day dicts, or
+        (day, slot, meal) triples when only `slot` is replaced.
+        """
+        recommendations = self.nutrition_recommender.recommend_nutrition(health_profile)
+        restrictions = health_profile.get('dietary_restrictions', [])
+        if slot is None:
+            days = self.meal_selector.plan(
+                recommendations, end_day - start_day + 1, restrictions, start_day=start_day, seed=seed
+            )
+            return days, []
+        slots = [
+            (day, slot, self.meal_selector.select_meal(slot, recommendations, restrictions, day=day, seed=seed))
+            for day in range(start_day, end_day + 1)
+        ]
+        return [], slots
+
+    def unrecognized_restrictions(self, health_profile):
+        # Restrictions the planner could not apply; the client has to tell
+        # the user, since foods they excluded may be in the plan
+        _, unknown = self.meal_selector.catalog.resolve_restrictions(
+            health_profile.get('dietary_restrictions', [])
+        )
+        return unknown
+
+    @staticmethod
+    def _version_conflict(current_version):
+        return {
+            'success': False,
+            'message': 'Meal plan was changed by another request',
+            'version': current_version
+        }, 409
+
+    def _generate_meals(self, recommendations, duration, dietary_restrictions=None):
+        # Each day gets concrete foods from the catalog sized to 30/35/35% of
+        # the daily targets, honouring the profile's dietary restrictions
+        return self.meal_selector.plan(recommendations, duration, dietary_restrictions)
+
+    def get_meal_plans(self, user_id, limit=DEFAULT_PAGE_SIZE, cursor=None, fields='full'):
         try:
-            meal_plans = MealPlan.find_by_user_id(user_id)
-            return {'success': True, 'meal_plans': meal_plans}, 200
+            plans, next_cursor = MealPlan.find_page(
+                user_id,
+                limit=min(max(limit, 1), MAX_PAGE_SIZE),
+                after=MealPlan.decode_cursor(cursor) if cursor else None,
+                projection=MealPlan.PROJECTIONS[fields]
+            )
+            return {'success': True, 'meal_plans': plans, 'next_cursor': next_cursor}, 200
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
         except Exception as e:
-            return {'success': False, 'message': str(e)}, 500
\ No newline at end of file
+            return {'success': False, 'message': str(e)}, 500
+
+    def stream_meal_plans(self, user_id, cursor=None, fields='full'):
+        """
+        Return a generator of NDJSON lines fed straight off the Mongo cursor,
+        so only one batch of plans is held in memory at a time. Raises
+        ValueError up front for a malformed cursor.
+        """
+        after = MealPlan.decode_cursor(cursor) if cursor else None
+        plans = MealPlan.iter_by_user_id(user_id, after=after, projection=MealPlan.PROJECTIONS[fields])
+        return (dumps(plan) + '\n' for plan in plans)
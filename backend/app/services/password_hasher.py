@@ -0,0 +1,84 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingOverloaded(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded thread pool.
+
+    hashlib's pbkdf2 and scrypt release the GIL, so the pool spreads the work
+    across cores while request threads just wait on a future. When more than
+    `max_pending` operations are queued, callers wait up to `queue_timeout`
+    seconds for a slot and then get HashingOverloaded instead of piling up.
+    """
+
+    def __init__(self, method=None, workers=None, max_pending=None, queue_timeout=None):
+        self.method = method or os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+        self.salt_length = int(os.getenv('PASSWORD_HASH_SALT_LENGTH', 16))
+        self.workers = workers or int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+        self.max_pending = max_pending or int(os.getenv('PASSWORD_HASH_MAX_PENDING', self.workers * 8))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else \
+            float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', 10))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def _pool(self):
+        # Pools don't survive fork, so each worker process builds its own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hasher'
+                    )
+                    self._slots = threading.BoundedSemaphore(self.max_pending)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _submit(self, fn, *args) -> Future:
+        pool = self._pool()
+        slots = self._slots
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise HashingOverloaded('Too many password operations in flight')
+        future = pool.submit(fn, *args)
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def hash_async(self, password) -> Future:
+        return self._submit(generate_password_hash, password, self.method, self.salt_length)
+
+    def hash(self, password) -> str:
+        return self.hash_async(password).result()
+
+    def verify_async(self, password_hash, password) -> Future:
+        if not password_hash:
+            # OAuth-only accounts have no password to check
+            future = Future()
+            future.set_result(False)
+            return future
+        return self._submit(check_password_hash, password_hash, password)
+
+    def verify(self, password_hash, password) -> bool:
+        return self.verify_async(password_hash, password).result()
+
+    def needs_rehash(self, password_hash) -> bool:
+        """
+        Whether a stored hash was made with a different method or cost than
+        the configured one.
+        """
+        if self._method_prefix is None:
+            # Let werkzeug expand defaults (e.g. iteration counts) once
+            self._method_prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,213 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateMany
+
+from app import mongo
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.meal_plan import MealPlan
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'meal-plan-regeneration'
+DEFAULT_DURATION = 7
+# Failed profiles kept in the checkpoint for the report; the count is exact
+MAX_RECORDED_FAILURES = 100
+
+# Profile fields the planner reads; everything else stays in the parent
+_PLANNER_FIELDS = ('weight', 'height', 'age', 'gender', 'activity_level', 'dietary_restrictions')
+
+# Built once per worker process on its first chunk
+_planner = None
+
+
+def _get_planner():
+    global _planner
+    if _planner is None:
+        from app.ml_models.nutrition_recommender import NutritionRecommender
+        from app.ml_models.meal_selector import MealSelector
+        _planner = (NutritionRecommender(), MealSelector())
+    return _planner
+
+
+def plan_chunk(work):
+    """
+    Runs in a worker process: turn [(user_id, profile, duration)] into
+    [(user_id, duration, meals)]. Returns the plans, [(user_id, error)] for
+    profiles that could not be planned (e.g. a missing or malformed field),
+    and how many nutrition lookups the recommender's memo answered.
+    """
+    recommender, selector = _get_planner()
+    hits_before = recommender.cache_stats()['hits']
+    plans = []
+    failures = []
+    for user_id, profile, duration in work:
+        try:
+            recommendations = recommender.recommend_nutrition(profile)
+            meals = selector.plan(recommendations, duration, profile.get('dietary_restrictions'))
+        except Exception as e:
+            # One bad profile must not sink the chunk, or the job with it
+            failures.append((user_id, f'{type(e).__name__}: {e}'))
+            continue
+        plans.append((user_id, duration, meals))
+    return plans, failures, recommender.cache_stats()['hits'] - hits_before
+
+
+class RegenerationProgress:
+    def __init__(self, processed=0, written=0, failed=0):
+        self.processed = processed
+        self.written = written
+        self.failed = failed
+        self.memo_hits = 0
+        self.started = time.perf_counter()
+        self._resumed_from = processed
+
+    @property
+    def profiles_per_second(self):
+        elapsed = time.perf_counter() - self.started
+        return (self.processed - self._resumed_from) / elapsed if elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'written': self.written,
+            'failed': self.failed,
+            'memo_hits': self.memo_hits,
+            'profiles_per_second': round(self.profiles_per_second)
+        }
+
+
+class MealPlanRegenerationJob:
+    """
+    Regenerates the active meal plan of every user with a health profile.
+    Profiles that fail to plan keep their current plan; they are counted and
+    the first MAX_RECORDED_FAILURES are listed in the checkpoint's
+    `failures`, and the job carries on.
+
+    Profiles are read in _id order and planned in chunks on a process pool.
+    Each chunk's new plans are inserted and the plans they replace marked
+    inactive in one bulk_write, then the last profile _id is checkpointed,
+    so a restarted job skips finished chunks. Re-running a chunk after a
+    crash is harmless: it only leaves the newest plan active.
+    """
+
+    def __init__(self, chunk_size=500, workers=None, job_name=JOB_NAME,
+                 include_without_plan=False, default_duration=DEFAULT_DURATION):
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 2
+        self.job_name = job_name
+        self.include_without_plan = include_without_plan
+        self.default_duration = default_duration
+
+    @staticmethod
+    def chunk_query(after):
+        return {'_id': {'$gt': after}} if after else {}
+
+    def _chunks(self, after):
+        query = self.chunk_query(after)
+        projection = {'user_id': 1, **{field: 1 for field in _PLANNER_FIELDS}}
+        cursor = mongo.db.health_profiles.find(
+            query, projection, sort=[('_id', 1)], batch_size=self.chunk_size
+        )
+        while True:
+            profiles = list(islice(cursor, self.chunk_size))
+            if not profiles:
+                return
+            yield profiles
+
+    def _work_for(self, profiles):
+        """
+        Pair each profile with the duration of the plan it replaces. Users
+        without an active plan are skipped unless include_without_plan.
+        """
+        user_ids = [profile['user_id'] for profile in profiles]
+        durations = {}
+        for plan in mongo.db.meal_plans.find(
+            MealPlan.active_query(user_ids),
+            {'user_id': 1, 'duration': 1}, sort=MealPlan.SORT
+        ):
+            durations.setdefault(plan['user_id'], plan['duration'])
+
+        work = []
+        for profile in profiles:
+            duration = durations.get(profile['user_id'])
+            if duration is None:
+                if not self.include_without_plan:
+                    continue
+                duration = self.default_duration
+            fields = {field: profile.get(field) for field in _PLANNER_FIELDS}
+            work.append((profile['user_id'], fields, duration))
+        return work
+
+    def _write(self, plans):
+        if not plans:
+            return 0
+        now = datetime.utcnow()
+        requests = []
+        new_ids = []
+        for user_id, duration, meals in plans:
+            document = MealPlan(user_id, meals, duration, start_date=now).to_dict()
+            document['_id'] = ObjectId()
+            new_ids.append(document['_id'])
+            requests.append(InsertOne(document))
+        # Ordered, so the old plans are only retired once the new ones exist
+        requests.append(UpdateMany(
+            {'user_id': {'$in': [user_id for user_id, _, _ in plans]},
+             'status': 'active', '_id': {'$nin': new_ids}},
+            {'$set': {'status': 'inactive', 'superseded_at': now}, '$inc': {'version': 1}}
+        ))
+        return mongo.db.meal_plans.bulk_write(requests, ordered=True).inserted_count
+
+    def run(self, restart=False, progress=None):
+        if restart:
+            JobCheckpoint.clear(self.job_name)
+        checkpoint = JobCheckpoint.load(self.job_name) or {}
+        if checkpoint.get('status') == 'done':
+            # A new run; the last run's failures no longer apply
+            JobCheckpoint.clear(self.job_name)
+            checkpoint = {}
+        state = RegenerationProgress(
+            checkpoint.get('processed', 0), checkpoint.get('written', 0), checkpoint.get('failed', 0)
+        )
+
+        def finish(profiles, future):
+            plans, failures, memo_hits = future.result()
+            state.written += self._write(plans)
+            state.processed += len(profiles)
+            state.failed += len(failures)
+            state.memo_hits += memo_hits
+            for user_id, error in failures:
+                logger.warning(f"Regenerating the meal plan of {user_id} failed: {error}")
+            if failures:
+                JobCheckpoint.record_failures(
+                    self.job_name, [{'user_id': user_id, 'error': error} for user_id, error in failures],
+                    keep=MAX_RECORDED_FAILURES
+                )
+            JobCheckpoint.save(
+                self.job_name, status='running', last_id=profiles[-1]['_id'],
+                processed=state.processed, written=state.written, failed=state.failed
+            )
+            if progress:
+                progress(state)
+
+        # Results are written in submission order so the checkpoint only
+        # ever moves past chunks that are fully written
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for profiles in self._chunks(checkpoint.get('last_id')):
+                in_flight.append((profiles, pool.submit(plan_chunk, self._work_for(profiles))))
+                if len(in_flight) >= self.workers * 2:
+                    finish(*in_flight.popleft())
+            while in_flight:
+                finish(*in_flight.popleft())
+
+        JobCheckpoint.save(
+            self.job_name, status='done', processed=state.processed, written=state.written, failed=state.failed
+        )
+        return state
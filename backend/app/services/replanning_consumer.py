@@ -0,0 +1,262 @@
+import logging
+import time
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+from app import mongo
+from app.models.health_profile import HealthProfile
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.meal_plan import MealPlan
+from app.services.meal_planning_service import MealPlanningService
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'replanning-consumer'
+
+# Profile fields that feed recommend_nutrition or meal selection; edits to
+# anything else (health_goals, last_updated alone) don't touch plans
+REPLAN_FIELDS = ('weight', 'height', 'age', 'gender', 'activity_level', 'dietary_restrictions')
+
+_PLAN_FIELDS = {'start_date': 1, 'duration': 1, 'version': 1}
+
+# Database errors are retried this many times before a user is given up on
+MAX_ATTEMPTS = 5
+# Users given up on are listed in the checkpoint's `failures`, newest last
+MAX_RECORDED_FAILURES = 100
+
+
+def change_pipeline(fields=REPLAN_FIELDS):
+    """
+    Server-side filter for the change stream: new or replaced profiles, and
+    updates that set or unset one of `fields`.
+    """
+    return [{'$match': {'$or': [
+        {'operationType': {'$in': ['insert', 'replace']}},
+        *({f'updateDescription.updatedFields.{field}': {'$exists': True}} for field in fields),
+        {'updateDescription.removedFields': {'$in': list(fields)}}
+    ]}}]
+
+
+class ReplanningStats:
+    def __init__(self):
+        self.events = 0
+        self.users = 0
+        self.plans = 0
+        self.days = 0
+        self.conflicts = 0
+        self.retries = 0
+        self.failed = 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class ReplanningConsumer:
+    """
+    Follows the health_profiles change stream and re-plans the remaining
+    days of a user's active meal plans after their profile changes.
+
+    Edits are debounced per user: a user is re-planned once their profile
+    has been quiet for `debounce` seconds, or `max_wait` seconds after the
+    first pending edit, whichever comes first. Plans are rewritten in place
+    from tomorrow onwards with MealPlan.replace_meals, so past days and the
+    plan's history stay as they were.
+
+    The resume token is checkpointed in job_checkpoints only up to the
+    last event whose user has been re-planned, so a restarted consumer
+    replays exactly the edits it had not acted on yet. A user whose
+    re-planning fails is retried after a database error, up to
+    `max_attempts` times; after that, or straight away for any other error,
+    the user is logged, counted in stats.failed and recorded in the
+    checkpoint's `failures`, and the checkpoint moves on without them.
+    Change streams need a replica set; locally `mongod --replSet rs0` plus
+    `rs.initiate()`.
+    """
+
+    def __init__(self, debounce=5.0, max_wait=60.0, job_name=JOB_NAME,
+                 planner=None, clock=time.monotonic, max_attempts=MAX_ATTEMPTS):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.job_name = job_name
+        self.planner = planner or MealPlanningService()
+        self.clock = clock
+        self.max_attempts = max_attempts
+        self.stats = ReplanningStats()
+        # user_id -> failed attempts so far
+        self._attempts = {}
+        # user_id -> (deadline, first seen, sequence, token before the first event)
+        self._pending = {}
+        self._sequence = 0
+        self._last_token = None
+        self._saved_token = None
+
+    def run(self, restart=False, stop=None, on_replan=None):
+        """
+        Consume until `stop` (a threading.Event) is set. `on_replan(user_id,
+        plans_updated)` is called after each re-planned user.
+        """
+        if restart:
+            JobCheckpoint.clear(self.job_name)
+        checkpoint = JobCheckpoint.load(self.job_name) or {}
+        self._saved_token = self._last_token = checkpoint.get('resume_token')
+
+        poll_interval = min(self.debounce, 1.0)
+        with mongo.db.health_profiles.watch(
+            change_pipeline(), full_document='updateLookup', resume_after=self._last_token,
+            max_await_time_ms=int(poll_interval * 1000)
+        ) as stream:
+            if self._last_token is None:
+                # First run: anchor the checkpoint at the stream's start so
+                # edits pending at a crash are replayed, not skipped
+                self._last_token = stream.resume_token
+            next_flush = self.clock()
+            while stop is None or not stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.handle(change)
+                # Act on users whose edits have settled, then move the
+                # checkpoint as far as is safe; also under a steady stream
+                if change is None or self.clock() >= next_flush:
+                    self.replan_due(on_replan=on_replan)
+                    self._checkpoint(stream.resume_token)
+                    next_flush = self.clock() + poll_interval
+
+            # Shutting down: settle everything that is pending
+            self.replan_due(force=True, on_replan=on_replan)
+            self._checkpoint(stream.resume_token)
+        return self.stats
+
+    def handle(self, change):
+        self.stats.events += 1
+        # Null when the profile was deleted before the lookup; nothing to do
+        user_id = (change.get('fullDocument') or {}).get('user_id')
+        if user_id is not None:
+            now = self.clock()
+            if user_id in self._pending:
+                _, first_seen, sequence, token_before = self._pending[user_id]
+            else:
+                first_seen, sequence, token_before = now, self._sequence, self._last_token
+                self._sequence += 1
+            deadline = min(now + self.debounce, first_seen + self.max_wait)
+            self._pending[user_id] = (deadline, first_seen, sequence, token_before)
+        self._last_token = change['_id']
+
+    def due(self, force=False):
+        """
+        Pop and return the users whose debounce window has closed.
+        """
+        now = self.clock()
+        ready = [user_id for user_id, (deadline, *_) in self._pending.items() if force or deadline <= now]
+        for user_id in ready:
+            del self._pending[user_id]
+        return ready
+
+    def replan_due(self, force=False, on_replan=None):
+        """
+        Re-plan every user whose debounce window has closed, loading their
+        profiles with one query.
+        """
+        users = self.due(force=force)
+        if not users:
+            return
+        try:
+            profiles = HealthProfile.find_many_by_user_ids(users)
+        except PyMongoError as e:
+            # Each user loads (and retries) their own profile instead
+            logger.warning(f"Loading {len(users)} profiles failed: {e}")
+            profiles = {}
+        for user_id in users:
+            self.replan_user(user_id, on_replan, profiles=profiles)
+
+    def replan_user(self, user_id, on_replan=None, profiles=None):
+        """
+        Rewrite the future days of every active plan of `user_id` from their
+        current profile, taken from `profiles` ({user_id: profile or None})
+        when it has them. Returns the number of plans updated.
+        """
+        try:
+            if profiles is not None and user_id in profiles:
+                profile = profiles[user_id]
+            else:
+                profile = mongo.db.health_profiles.find_one(HealthProfile.user_query(user_id))
+            if profile is None:
+                self._attempts.pop(user_id, None)
+                return 0
+            updated = 0
+            for plan in mongo.db.meal_plans.find(MealPlan.active_query(user_id), _PLAN_FIELDS):
+                updated += self._replan_plan(plan, profile)
+        except PyMongoError as e:
+            attempts = self._attempts.get(user_id, 0) + 1
+            if attempts >= self.max_attempts:
+                self._give_up(user_id, e)
+                return 0
+            # Put the user back so the next pass (or a restart, since the
+            # checkpoint hasn't moved past them) retries
+            logger.warning(f"Re-planning {user_id} failed (attempt {attempts} of {self.max_attempts}): {e}")
+            self._attempts[user_id] = attempts
+            self.stats.retries += 1
+            self._pending[user_id] = (self.clock() + self.debounce, self.clock(), -1, self._saved_token)
+            return 0
+        except Exception as e:
+            # A bad profile or a planner bug; retrying won't help, and
+            # holding the user back would stall the checkpoint for everyone
+            self._give_up(user_id, e)
+            return 0
+        self._attempts.pop(user_id, None)
+        self.stats.users += 1
+        self.stats.plans += updated
+        if on_replan:
+            on_replan(user_id, updated)
+        return updated
+
+    def _give_up(self, user_id, error):
+        self._attempts.pop(user_id, None)
+        self.stats.failed += 1
+        logger.error(f"Re-planning {user_id} failed, skipping: {error}", exc_info=error)
+        try:
+            JobCheckpoint.record_failures(
+                self.job_name,
+                [{'user_id': user_id, 'error': f'{type(error).__name__}: {error}', 'at': datetime.utcnow()}],
+                keep=-MAX_RECORDED_FAILURES
+            )
+        except PyMongoError as e:
+            logger.error(f"Could not record the failure of {user_id}: {e}")
+
+    def _replan_plan(self, plan, profile, attempts=3):
+        for _ in range(attempts):
+            start_day = self.first_future_day(plan)
+            if start_day > plan['duration']:
+                return 0
+            version = plan.get('version', 0)
+            days, _ = self.planner.replan_days(profile, start_day, plan['duration'], seed=version)
+            if MealPlan.replace_meals(plan['_id'], version, days=days) is not None:
+                self.stats.days += len(days)
+                return 1
+            # Someone edited the plan meanwhile; re-plan on top of their version
+            self.stats.conflicts += 1
+            plan = mongo.db.meal_plans.find_one({'_id': plan['_id'], 'status': 'active'}, _PLAN_FIELDS)
+            if plan is None:
+                return 0
+        return 0
+
+    @staticmethod
+    def first_future_day(plan, today=None):
+        """
+        Day number of tomorrow in `plan` (day 1 is the start date).
+        """
+        today = (today or datetime.utcnow()).date()
+        return (today - plan['start_date'].date()).days + 2
+
+    def _checkpoint(self, stream_token):
+        """
+        Save the newest resume token that no pending user's edits come
+        after. With nothing pending that is the stream's own position.
+        """
+        if self._pending:
+            _, _, _, token = min(self._pending.values(), key=lambda entry: entry[2])
+        else:
+            token = stream_token or self._last_token
+        if token is not None and token != self._saved_token:
+            JobCheckpoint.save(self.job_name, resume_token=token, **self.stats.to_dict())
+            self._saved_token = token
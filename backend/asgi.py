@@ -0,0 +1,5 @@
+from app import create_app
+from app.aio.routes import create_asgi_app
+
+# Async mode: `uvicorn asgi:app --workers N`. run.py remains the WSGI entry.
+app = create_asgi_app(create_app())
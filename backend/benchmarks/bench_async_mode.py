@@ -0,0 +1,96 @@
+"""
+Compare WSGI (run.py) and async (asgi.py) serving under many concurrent
+I/O-bound requests.
+
+For each mode the app is started in a child process against a throwaway
+database (see benchmarks.loadtest), one user with a health profile is
+created, and --concurrency GET /api/profile/health requests are opened at
+once, --rounds times. The profile cache is disabled so every request waits
+on Mongo. Needs a reachable mongod plus uvicorn and motor for the async
+mode. Run from the backend directory:
+
+    python -m benchmarks.bench_async_mode --concurrency 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.loadtest import ThrowawayDatabase, free_port, percentile, start_server
+
+
+async def http(port, method, path, body=None, token=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    headers = [f'{method} {path} HTTP/1.1', 'Host: 127.0.0.1', 'Connection: close',
+               f'Content-Length: {len(payload)}', 'Content-Type: application/json']
+    if token:
+        headers.append(f'Authorization: Bearer {token}')
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + payload)
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ', 2)[1]), data
+
+
+async def setup_user(port):
+    status, data = await http(port, 'POST', '/api/auth/register', {
+        'email': 'bench@example.com', 'password': 'bench-password', 'name': 'Bench', 'role': 'user'
+    })
+    token = json.loads(data)['access_token']
+    await http(port, 'POST', '/api/profile/health', {
+        'age': 35, 'gender': 'female', 'height': 168.0, 'weight': 64.0, 'activity_level': 'moderately_active'
+    }, token)
+    return token
+
+
+async def burst(port, token, concurrency):
+    async def one():
+        start = time.perf_counter()
+        try:
+            status, _ = await http(port, 'GET', '/api/profile/health', token=token)
+        except OSError:
+            status = 0
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(concurrency)))
+    return time.perf_counter() - start, results
+
+
+def measure(server, mongo_uri, concurrency, rounds):
+    port = free_port()
+    process = start_server(mongo_uri, port, server, HEALTH_PROFILE_CACHE_BACKEND='none')
+    try:
+        token = asyncio.run(setup_user(port))
+        asyncio.run(burst(port, token, min(concurrency, 100)))
+        latencies, errors, elapsed = [], 0, 0.0
+        for _ in range(rounds):
+            took, results = asyncio.run(burst(port, token, concurrency))
+            elapsed += took
+            latencies.extend(latency for latency, _ in results)
+            errors += sum(1 for _, status in results if status != 200)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    latencies.sort()
+    return len(latencies) / elapsed, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--mongod', help='start this mongod binary in a temp dir instead')
+    args = parser.parse_args()
+
+    for server in ('wsgi', 'asgi'):
+        with ThrowawayDatabase(args.mongo_uri, args.mongod) as mongo_uri:
+            rps, latencies, errors = measure(server, mongo_uri, args.concurrency, args.rounds)
+        print(f'{server}: {rps:8.0f} req/s  p50 {percentile(latencies, 0.5) * 1e3:8.1f} ms  '
+              f'p99 {percentile(latencies, 0.99) * 1e3:8.1f} ms  errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
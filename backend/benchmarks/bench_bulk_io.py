@@ -0,0 +1,82 @@
+"""
+Measure bulk import/export throughput (rows/s) for health profiles.
+
+Compares one save() per row with chunked unordered insert_many, then
+exports the collection to JSONL and CSV. Needs a reachable MongoDB
+(MONGO_URI, default mongodb://localhost:27017/bench_bulk_io); the database
+is dropped between runs. Run from the backend directory:
+
+    python -m benchmarks.bench_bulk_io --rows 200000 --chunk-size 1000
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import time
+
+from app import create_app, init_database, mongo
+from app.models.health_profile import HealthProfile
+from app.services.bulk_io import export_documents, import_documents
+
+ACTIVITY_LEVELS = ['sedentary', 'lightly_active', 'moderately_active', 'very_active', 'extra_active']
+
+
+def synthetic_csv(rows, seed=0):
+    rng = random.Random(seed)
+    stream = io.StringIO()
+    writer = csv.writer(stream)
+    writer.writerow(['user_id', 'age', 'gender', 'height', 'weight', 'activity_level', 'dietary_restrictions'])
+    for i in range(rows):
+        writer.writerow([
+            f'clinic-{i}', rng.randint(18, 80), rng.choice(['male', 'female']),
+            round(rng.uniform(150, 200), 1), round(rng.uniform(45, 130), 1),
+            rng.choice(ACTIVITY_LEVELS), rng.choice(['', 'vegetarian', 'vegan;nut_free', 'gluten_free'])
+        ])
+    stream.seek(0)
+    return stream
+
+
+def reset(app):
+    with app.app_context():
+        mongo.cx.drop_database(mongo.db.name)
+        init_database(mongo.db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--single-rows', type=int, default=5000,
+                        help='rows to time through one save() each')
+    args = parser.parse_args()
+
+    os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/bench_bulk_io')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    app = create_app()
+
+    reset(app)
+    with app.app_context():
+        rows = list(csv.DictReader(synthetic_csv(args.single_rows)))
+        start = time.perf_counter()
+        for row in rows:
+            HealthProfile(row['user_id'], int(row['age']), row['gender'], float(row['height']),
+                          float(row['weight']), row['activity_level']).save()
+        print(f'save() per row:  {len(rows) / (time.perf_counter() - start):10.0f} rows/s')
+
+    reset(app)
+    with app.app_context():
+        stats = import_documents('health_profiles', synthetic_csv(args.rows), 'csv', io.StringIO(),
+                                 chunk_size=args.chunk_size)
+        print(f'import-data csv: {stats.rows_per_second:10.0f} rows/s  {stats.to_dict()}')
+
+        for fmt in ('jsonl', 'csv'):
+            with open(os.devnull, 'w') as sink:
+                start = time.perf_counter()
+                count = export_documents('health_profiles', sink, fmt, batch_size=args.chunk_size)
+            print(f'export-data {fmt:5s} {count / (time.perf_counter() - start):10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
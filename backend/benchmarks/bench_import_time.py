@@ -0,0 +1,82 @@
+"""
+Report per-module import cost of building the app through create_app.
+
+Runs a fresh interpreter under `python -X importtime`, then aggregates the
+self time per top-level package and lists the slowest modules by cumulative
+time. Run from the backend directory:
+
+    python -m benchmarks.bench_import_time --top 20 --json import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+CHILD = 'import app; app.create_app()'
+
+# Modules that should only be imported once a model is trained or used
+HEAVY_MODULES = ('numpy', 'sklearn', 'scipy')
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into (module, self_us, cumulative_us) rows.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', dest='json_path', help='Write the report to this file.')
+    args = parser.parse_args()
+
+    # create_app refuses to start without the secrets
+    env = {'SECRET_KEY': 'bench', 'JWT_SECRET_KEY': 'bench', **os.environ, 'DB_BOOTSTRAP_ON_STARTUP': '0'}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD],
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode:
+        sys.stderr.write(result.stderr[-2000:])
+        raise SystemExit(result.returncode)
+
+    rows = parse_importtime(result.stderr)
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split('.')[0]] += self_us
+    total_us = sum(by_package.values())
+    heavy = sorted({name.split('.')[0] for name, _, _ in rows} & set(HEAVY_MODULES))
+
+    print(f'total import time: {total_us / 1e3:.1f} ms across {len(rows)} modules')
+    print(f"heavy ML modules loaded: {', '.join(heavy) or 'none'}")
+    print('\nself time by top-level package:')
+    for package, us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {us / 1e3:8.1f} ms  {package}')
+    print('\nslowest modules by cumulative time:')
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f'  {cumulative_us / 1e3:8.1f} ms  {name}')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({
+                'total_ms': total_us / 1e3,
+                'heavy_modules': heavy,
+                'packages_ms': {p: us / 1e3 for p, us in by_package.items()},
+                'modules': [
+                    {'module': name, 'self_ms': s / 1e3, 'cumulative_ms': c / 1e3}
+                    for name, s, c in rows
+                ]
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
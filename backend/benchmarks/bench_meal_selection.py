@@ -0,0 +1,58 @@
+"""
+Time meal selection for plans of increasing length.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_meal_selection --repeat 50
+"""
+import argparse
+import time
+
+from app.ml_models.meal_selector import MealSelector
+from app.ml_models.nutrition_recommender import NutritionRecommender
+
+DURATIONS = (7, 14, 30, 90, 180, 365)
+RESTRICTION_SETS = (
+    [],
+    ['vegetarian'],
+    ['vegan', 'Gluten Free'],
+    ['Dairy Free', 'Nut Free', 'Shellfish Free'],
+)
+PROFILE = {
+    'weight': 72.0,
+    'height': 176.0,
+    'age': 34,
+    'gender': 'female',
+    'activity_level': 'moderately_active'
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    selector = MealSelector()
+    print(f'catalog load: {(time.perf_counter() - start) * 1e3:.2f} ms ({len(selector.catalog)} foods)')
+
+    recommendations = NutritionRecommender().recommend_nutrition(PROFILE)
+    for restrictions in RESTRICTION_SETS:
+        # First call per restriction set builds the candidate index
+        start = time.perf_counter()
+        selector.plan(recommendations, 1, restrictions)
+        cold = (time.perf_counter() - start) * 1e3
+        print(f"\nrestrictions={restrictions or ['none']} cold index build: {cold:.2f} ms")
+
+        for duration in DURATIONS:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                plan = selector.plan(recommendations, duration, restrictions)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1e3
+            meals = [day[slot] for day in plan for slot in MealSelector.MEAL_SHARES]
+            within = sum(m['within_tolerance'] for m in meals) / len(meals)
+            print(f'  {duration:4d} days: {elapsed:7.3f} ms/plan  within tolerance: {within:6.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure what the Prometheus instrumentation adds per request and per Mongo
+command. Run from the backend directory (no database needed):
+
+    python -m benchmarks.bench_metrics_overhead --requests 20000
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from flask import Flask
+
+from app.metrics import MongoCommandMetrics, init_metrics, prometheus_client
+
+
+def per_request(instrumented, requests):
+    app = Flask(__name__)
+    app.add_url_rule('/ping', 'ping', lambda: 'ok')
+    if instrumented:
+        init_metrics(app)
+    client = app.test_client()
+    for _ in range(500):
+        client.get('/ping')
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/ping')
+    return (time.perf_counter() - start) / requests
+
+
+def per_command(commands):
+    listener = MongoCommandMetrics()
+    started = SimpleNamespace(command={'find': 'users'}, command_name='find',
+                              connection_id=('localhost', 27017), request_id=1)
+    succeeded = SimpleNamespace(command_name='find', connection_id=('localhost', 27017),
+                                request_id=1, duration_micros=250)
+    start = time.perf_counter()
+    for _ in range(commands):
+        listener.started(started)
+        listener.succeeded(succeeded)
+    return (time.perf_counter() - start) / commands
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--commands', type=int, default=200000)
+    args = parser.parse_args()
+
+    if prometheus_client is None:
+        print('prometheus_client is not installed; instrumentation is a no-op')
+        return
+    bare = per_request(False, args.requests)
+    instrumented = per_request(True, args.requests)
+    print(f'request without metrics: {bare * 1e6:7.1f} us')
+    print(f'request with metrics:    {instrumented * 1e6:7.1f} us  (+{(instrumented - bare) * 1e6:.1f} us)')
+    print(f'mongo command listener:  {per_command(args.commands) * 1e6:7.2f} us per command')
+
+
+if __name__ == '__main__':
+    main()
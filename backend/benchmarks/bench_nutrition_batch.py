@@ -0,0 +1,66 @@
+"""
+Compare the scalar and vectorized nutrition target paths.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_nutrition_batch --profiles 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.ml_models.nutrition_recommender import NutritionRecommender
+
+
+def make_profiles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    levels = np.array(list(NutritionRecommender.ACTIVITY_MULTIPLIERS) + ['unknown'])
+    profiles = np.empty(n, dtype=NutritionRecommender.profile_dtype())
+    profiles['weight'] = np.round(rng.uniform(40, 150, n), 1)
+    profiles['height'] = np.round(rng.uniform(140, 210, n), 1)
+    profiles['age'] = rng.integers(18, 90, n)
+    profiles['gender'] = rng.choice(np.array(['male', 'female', 'Male', 'other']), n)
+    profiles['activity_level'] = rng.choice(levels, n)
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    recommender = NutritionRecommender()
+    profiles = make_profiles(args.profiles)
+    dicts = [
+        {name: profiles[name][i].item() for name in profiles.dtype.names}
+        for i in range(len(profiles))
+    ]
+
+    scalar_best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        scalar = [recommender.recommend_nutrition(p) for p in dicts]
+        scalar_best = min(scalar_best, time.perf_counter() - start)
+
+    batch_best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        batch = recommender.recommend_nutrition_batch(profiles)
+        batch_best = min(batch_best, time.perf_counter() - start)
+
+    for key in ('calories', 'protein', 'carbs', 'fat'):
+        expected = np.array([r[key] for r in scalar])
+        if not np.array_equal(expected, batch[key]):
+            raise SystemExit(f'{key}: batch result differs from scalar path')
+
+    n = len(profiles)
+    print(f'profiles:          {n}')
+    print(f'scalar per profile: {scalar_best / n * 1e6:8.3f} us')
+    print(f'batch per profile:  {batch_best / n * 1e6:8.3f} us')
+    print(f'speedup:            {scalar_best / batch_best:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
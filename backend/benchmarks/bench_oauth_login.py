@@ -0,0 +1,114 @@
+"""
+Stress concurrent first-time OAuth logins: the old read/update/insert/re-read
+sequence against the single find_one_and_update upsert.
+
+Each identity is logged in by several threads at once, which is exactly
+when the old flow created duplicate users. Needs a reachable MongoDB
+(MONGO_URI, default mongodb://localhost:27017/bench_oauth_login); the
+database is dropped between runs. Run from the backend directory:
+
+    python -m benchmarks.bench_oauth_login --identities 500 --threads 32 --logins-per-identity 4
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from bson import ObjectId
+
+from app import create_app, init_database, mongo
+from app.models.user import User
+
+
+def legacy_login(email, name, provider, oauth_id):
+    users = mongo.db.users
+    user = users.find_one({'oauth_provider': provider, 'oauth_id': oauth_id})
+    if not user:
+        user = users.find_one({'email': email})
+        if user:
+            users.update_one({'_id': user['_id']}, {'$set': {'oauth_provider': provider, 'oauth_id': oauth_id}})
+        else:
+            user = User(email=email, name=name, role='user', oauth_provider=provider, oauth_id=oauth_id)
+            user_id = users.insert_one(dict(user.to_dict(), password_hash='')).inserted_id
+            user = users.find_one({'_id': ObjectId(user_id)})
+    return user
+
+
+def upsert_login(email, name, provider, oauth_id):
+    return User.upsert_oauth_user(email, name, provider, oauth_id)
+
+
+def run(app, login, identities, threads, per_identity):
+    # Every identity appears `per_identity` times back to back, so threads
+    # pulling from the shared queue log the same identity in concurrently
+    work = [i for i in range(identities) for _ in range(per_identity)]
+    lock = threading.Lock()
+    latencies = []
+    errors = Counter()
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    if not work:
+                        return
+                    i = work.pop()
+                start = time.perf_counter()
+                try:
+                    login(f'user{i}@example.com', f'User {i}', 'google', f'g{i}')
+                except Exception as e:
+                    errors[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        duplicates = sum(
+            1 for group in mongo.db.users.aggregate([
+                {'$group': {'_id': '$email', 'count': {'$sum': 1}}},
+                {'$match': {'count': {'$gt': 1}}}
+            ])
+        )
+    ms = np.array(latencies) * 1000
+    return {
+        'logins/s': round(len(latencies) / elapsed),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'errors': dict(errors),
+        'duplicate_emails': duplicates
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--identities', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--logins-per-identity', type=int, default=4)
+    parser.add_argument('--no-indexes', action='store_true',
+                        help='run without the unique indexes to show the duplicates the old flow creates')
+    args = parser.parse_args()
+
+    os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/bench_oauth_login')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    app = create_app()
+
+    for name, login in (('legacy', legacy_login), ('upsert', upsert_login)):
+        with app.app_context():
+            mongo.cx.drop_database(mongo.db.name)
+            if not args.no_indexes:
+                init_database(mongo.db)
+        result = run(app, login, args.identities, args.threads, args.logins_per_identity)
+        print(f'{name:7s} {result}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Bytes sent to Mongo when changing part of a meal plan in place versus
+regenerating the whole plan.
+
+Full regeneration inserts a new plan document; partial regeneration sends
+only a $set of the changed days or meals plus their arrayFilters
+(MealPlan.meals_update). Sizes are the BSON-encoded write payloads, which
+is also what ends up in the oplog. Run from the backend directory (no
+database needed):
+
+    python -m benchmarks.bench_partial_regeneration --duration 90
+"""
+import argparse
+import time
+from datetime import datetime
+
+import bson
+
+from app.ml_models.meal_selector import MealSelector
+from app.models.meal_plan import MealPlan
+
+RECOMMENDATIONS = {'calories': 2500.0, 'protein': 187.5, 'carbs': 250.0, 'fat': 83.33}
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=90)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    selector = MealSelector()
+    duration = args.duration
+
+    def full():
+        meals = selector.plan(RECOMMENDATIONS, duration, seed=1)
+        return MealPlan('user', meals, duration, start_date=datetime.utcnow()).to_dict()
+
+    def days(start, end):
+        def build():
+            return MealPlan.meals_update(
+                days=selector.plan(RECOMMENDATIONS, end - start + 1, start_day=start, seed=1)
+            )
+        return build
+
+    def one_slot():
+        meal = selector.select_meal('dinner', RECOMMENDATIONS, day=duration, seed=1)
+        return MealPlan.meals_update(slots=[(duration, 'dinner', meal)])
+
+    cases = [
+        ('full regeneration', full),
+        ('last 7 days', days(duration - 6, duration)),
+        ('one day', days(duration, duration)),
+        ('one dinner', one_slot)
+    ]
+    if duration > 30:
+        cases.insert(1, ('last 30 days', days(duration - 29, duration)))
+
+    baseline = None
+    for label, build in cases:
+        elapsed, result = best_of(build, args.repeat)
+        if isinstance(result, tuple):
+            updates, array_filters = result
+            size = len(bson.encode({'$set': updates, '$inc': {'version': 1}})) + \
+                len(bson.encode({'arrayFilters': array_filters}))
+        else:
+            size = len(bson.encode(result))
+        baseline = baseline or size
+        print(f'{label:18s} {size / 1024:9.1f} KiB ({size / baseline:6.1%} of full)  '
+              f'build {elapsed * 1e3:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare single-row predict calls with coalesced batches under concurrency.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_predict_batcher --threads 32 --calls 200 --window-ms 2
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from app.ml_models.nutrition_recommender import NutritionRecommender
+from app.ml_models.predict_batcher import PredictBatcher
+
+
+def hammer(predict, rows, threads, calls):
+    def worker(offset):
+        for i in range(calls):
+            predict(rows[(offset + i) % len(rows)][None, :])
+
+    pool = [threading.Thread(target=worker, args=(t * calls,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return threads * calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch', type=int, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(5000, 5))
+    y = X @ rng.normal(size=5) + rng.normal(size=5000)
+    recommender = NutritionRecommender()
+    recommender.train(X, y)
+    recommender.model.set_params(n_jobs=1)
+    rows = rng.normal(size=(1000, 5))
+
+    direct = hammer(recommender.model.predict, rows, args.threads, args.calls)
+    print(f'single-row predict: {direct:10.0f} rows/s')
+
+    batcher = PredictBatcher(recommender.model.predict, max_wait_ms=args.window_ms,
+                             max_batch_size=args.max_batch)
+    coalesced = hammer(batcher.predict, rows, args.threads, args.calls)
+    print(f'coalesced predict:  {coalesced:10.0f} rows/s  ({coalesced / direct:.1f}x)')
+    print(f'batcher stats:      {batcher.stats()}')
+
+
+if __name__ == '__main__':
+    main()
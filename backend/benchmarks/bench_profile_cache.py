@@ -0,0 +1,93 @@
+"""
+Measure GET /api/profile/health with the profile cache off, in memory and in SQLite.
+
+Needs a reachable MongoDB (MONGO_URI, default mongodb://localhost:27017/bench_profile_cache).
+Run from the backend directory:
+
+    python -m benchmarks.bench_profile_cache --users 200 --requests 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app, mongo
+from app.cache import MemoryCache, NullCache, SQLiteCache
+from app.models import health_profile
+from app.models.health_profile import HealthProfile
+
+
+def seed_profiles(users):
+    mongo.db.health_profiles.delete_many({'user_id': {'$regex': '^bench-'}})
+    user_ids = [f'bench-{i}' for i in range(users)]
+    for i, user_id in enumerate(user_ids):
+        HealthProfile(user_id, 20 + i % 50, 'female' if i % 2 else 'male',
+                      150.0 + i % 40, 50.0 + i % 60, 'moderately_active').save()
+    return user_ids
+
+
+def run(app, cache, user_ids, requests, write_every):
+    health_profile.profile_cache = cache
+    client = app.test_client()
+    with app.app_context():
+        headers = {u: {'Authorization': 'Bearer ' + create_access_token(identity=u)} for u in user_ids}
+
+    rng = random.Random(0)
+    statuses = Counter()
+    start = time.perf_counter()
+    for i in range(requests):
+        user_id = rng.choice(user_ids)
+        if write_every and i % write_every == 0:
+            response = client.put('/api/profile/health', headers=headers[user_id],
+                                  json={'weight': 50 + rng.random() * 60})
+        else:
+            response = client.get('/api/profile/health', headers=headers[user_id])
+        statuses[response.status_code] += 1
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, dict(statuses), cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--write-every', type=int, default=50,
+                        help='issue a PUT every N requests to exercise invalidation (0 = reads only)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/bench_profile_cache')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    app = create_app()
+    with app.app_context():
+        user_ids = seed_profiles(args.users)
+
+    sqlite_path = os.path.join(tempfile.mkdtemp(), 'profiles.sqlite3')
+    backends = [
+        ('none', NullCache()),
+        ('memory', MemoryCache(max_entries=args.users * 2, ttl=300)),
+        ('sqlite', SQLiteCache(sqlite_path, max_entries=args.users * 2, ttl=300))
+    ]
+    baseline = None
+    failed = False
+    for name, cache in backends:
+        throughput, statuses, stats = run(app, cache, user_ids, args.requests, args.write_every)
+        baseline = baseline or throughput
+        failed = failed or set(statuses) != {200}
+        print(f'{name:7s} {throughput:9.0f} req/s ({throughput / baseline:.2f}x)  '
+              f'status={statuses}  hit_rate={stats["hit_rate"]:.3f}')
+
+    with app.app_context():
+        mongo.db.health_profiles.delete_many({'user_id': {'$regex': '^bench-'}})
+    if failed:
+        print('some requests failed; the throughput above is not comparable')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
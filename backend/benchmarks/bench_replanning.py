@@ -0,0 +1,103 @@
+"""
+Incremental re-planning from the change stream versus a full rescan.
+
+Seeds --users users with a profile and a 30-day active plan started up to
+29 days ago, then edits the weight of --edited of them in bursts of
+--burst updates each. Reports how long the replanning consumer takes to
+settle those edits and how many days it rewrites, next to a full
+MealPlanRegenerationJob over every profile. Needs a replica set, e.g.
+`mongod --replSet rs0` plus `rs.initiate()`. Run from the backend directory:
+
+    MONGO_URI=mongodb://localhost:27017/dietcraft_bench?replicaSet=rs0 \\
+        python -m benchmarks.bench_replanning --users 5000 --edited 200
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, mongo
+from app.ml_models.meal_selector import MealSelector
+from app.models.meal_plan import MealPlan
+from app.services.plan_regeneration import MealPlanRegenerationJob
+from app.services.replanning_consumer import ReplanningConsumer
+
+RECOMMENDATIONS = {'calories': 2500.0, 'protein': 187.5, 'carbs': 250.0, 'fat': 83.33}
+
+
+def seed(users, rng):
+    mongo.db.health_profiles.delete_many({})
+    mongo.db.meal_plans.delete_many({})
+    meals = MealSelector().plan(RECOMMENDATIONS, 30)
+    profiles, plans = [], []
+    for i in range(users):
+        user_id = f'bench-{i}'
+        profiles.append({
+            'user_id': user_id, 'age': rng.randint(18, 75), 'gender': rng.choice(('male', 'female')),
+            'height': round(rng.uniform(150, 200), 1), 'weight': round(rng.uniform(45, 130), 1),
+            'activity_level': 'moderately_active', 'dietary_restrictions': [], 'health_goals': [],
+            'last_updated': datetime.utcnow()
+        })
+        start = datetime.utcnow() - timedelta(days=rng.randint(0, 29))
+        plans.append(MealPlan(user_id, meals, 30, start_date=start).to_dict())
+    mongo.db.health_profiles.insert_many(profiles)
+    mongo.db.meal_plans.insert_many(plans)
+
+
+def incremental(edited, burst, rng):
+    consumer = ReplanningConsumer(debounce=0.5, max_wait=5, job_name='bench-replanning')
+    settled = threading.Event()
+    done = []
+
+    def on_replan(user_id, plans):
+        done.append(user_id)
+        if len(done) >= len(edited):
+            settled.set()
+
+    stop = threading.Event()
+    worker = threading.Thread(target=consumer.run, kwargs={'restart': True, 'stop': stop, 'on_replan': on_replan})
+    worker.start()
+    time.sleep(1)  # let the stream open
+    start = time.perf_counter()
+    for _ in range(burst):
+        for user_id in edited:
+            mongo.db.health_profiles.update_one(
+                {'user_id': user_id}, {'$set': {'weight': round(rng.uniform(45, 130), 1), 'last_updated': datetime.utcnow()}}
+            )
+    settled.wait(timeout=300)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worker.join()
+    return elapsed, consumer.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--edited', type=int, default=200)
+    parser.add_argument('--burst', type=int, default=3, help='edits per edited user')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench')
+    rng = random.Random(0)
+    app = create_app()
+    with app.app_context():
+        seed(args.users, rng)
+        edited = [f'bench-{i}' for i in rng.sample(range(args.users), args.edited)]
+        elapsed, stats = incremental(edited, args.burst, rng)
+        print(f'change stream: {elapsed:7.2f} s  {stats.events} events -> {stats.users} users, '
+              f'{stats.plans} plans, {stats.days} days rewritten')
+
+        start = time.perf_counter()
+        state = MealPlanRegenerationJob(workers=args.workers, job_name='bench-replanning-full').run(restart=True)
+        elapsed = time.perf_counter() - start
+        print(f'full rescan:   {elapsed:7.2f} s  {state.processed} profiles -> {state.written} plans, '
+              f'{state.written * 30} days written')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Serialize 30/90/365-day meal plan documents with the old and new encoders.
+
+Compares the standard library (what jsonify and the NDJSON stream used),
+app.serialization.dumps (orjson when installed) and the chunked
+stream_object generator. Run from the backend directory (no database
+needed):
+
+    python -m benchmarks.bench_serialization --repeat 50
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import serialization
+from app.ml_models.meal_selector import MealSelector
+
+RECOMMENDATIONS = {'calories': 2500.0, 'protein': 187.5, 'carbs': 250.0, 'fat': 83.33}
+
+
+def meal_plan_document(days):
+    return {
+        '_id': ObjectId(),
+        'user_id': str(ObjectId()),
+        'meals': MealSelector().plan(RECOMMENDATIONS, days),
+        'duration': days,
+        'start_date': datetime.utcnow(),
+        'status': 'active',
+        'version': 1
+    }
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    backend = 'orjson' if serialization.orjson is not None else 'json (orjson not installed)'
+    print(f'app.serialization backend: {backend}')
+    for days in (30, 90, 365):
+        body = {'success': True, 'meal_plan': meal_plan_document(days)}
+        size = len(serialization.dumps_bytes(body))
+        stdlib = best_of(lambda: json.dumps(body, default=str, sort_keys=True), args.repeat)
+        fast = best_of(lambda: serialization.dumps_bytes(body, sort_keys=True), args.repeat)
+        streamed = best_of(lambda: sum(len(c) for c in serialization.stream_object(body)), args.repeat)
+        first_chunk = best_of(lambda: next(iter(serialization.stream_object(body))), args.repeat)
+        print(f'{days:3d} days ({size / 1024:6.0f} KiB): json {stdlib * 1000:7.2f} ms  '
+              f'fast {fast * 1000:6.2f} ms ({stdlib / fast:4.1f}x)  '
+              f'stream {streamed * 1000:6.2f} ms, first chunk {first_chunk * 1e6:5.1f} us')
+
+
+if __name__ == '__main__':
+    main()
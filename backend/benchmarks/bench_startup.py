@@ -0,0 +1,49 @@
+"""
+Measure create_app() wall time with and without schema bootstrap on startup.
+
+Each sample runs in a fresh interpreter, like a newly forked worker. Needs a
+reachable MONGO_URI (a local mongod is fine). Run from the backend directory:
+
+    MONGO_URI=mongodb://localhost:27017/dietcraft_bench python -m benchmarks.bench_startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = '''
+import time
+import app
+start = time.perf_counter()
+app.create_app()
+print(time.perf_counter() - start)
+'''
+
+
+def sample(bootstrap, runs):
+    # create_app refuses to start without the secrets
+    env = {'SECRET_KEY': 'bench', 'JWT_SECRET_KEY': 'bench', **os.environ, 'DB_BOOTSTRAP_ON_STARTUP': '1' if bootstrap else '0'}
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD], env=env, check=True,
+            capture_output=True, text=True
+        ).stdout
+        timings.append(float(out.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    for label, bootstrap in (('bootstrap on startup', True), ('no DDL on startup', False)):
+        timings = sample(bootstrap, args.runs)
+        print(f'{label:22s} median {statistics.median(timings) * 1e3:8.2f} ms'
+              f'  max {max(timings) * 1e3:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
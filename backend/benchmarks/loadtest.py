@@ -0,0 +1,473 @@
+"""
+End-to-end load test of the API against a throwaway database.
+
+`run` builds the app with create_app() in a child process, points it at a
+fresh database on a local mongod (or starts one with --mongod), and drives
+a weighted mix of register, login, health profile, meal plan and
+questionnaire requests from --users concurrent clients. It reports
+throughput, p50/p95/p99 latency and Mongo round trips per request (from the
+X-DB-Round-Trips header) for each operation, and can save the result as a
+JSON baseline. `compare` flags regressions between two saved runs.
+Run from the backend directory:
+
+    python -m benchmarks.loadtest run --users 16 --duration 30 --save base.json
+    python -m benchmarks.loadtest run --mongod mongod --save new.json
+    python -m benchmarks.loadtest run --server asgi --save asgi.json
+    python -m benchmarks.loadtest compare base.json new.json --threshold 0.1
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+SERVERS = {
+    'wsgi': '''
+import sys
+from werkzeug.serving import make_server
+from app import create_app
+make_server('127.0.0.1', int(sys.argv[1]), create_app(), threaded=True).serve_forever()
+''',
+    'asgi': '''
+import sys
+import uvicorn
+from asgi import app
+uvicorn.run(app, host='127.0.0.1', port=int(sys.argv[1]), log_level='warning')
+'''
+}
+
+DEFAULT_MIX = {
+    'register': 2,
+    'login': 5,
+    'get_profile': 25,
+    'update_profile': 5,
+    'create_plan': 8,
+    'list_plans': 25,
+    'get_questionnaire': 15,
+    'analyze_questionnaire': 15
+}
+
+ACTIVITY_LEVELS = ('sedentary', 'lightly_active', 'moderately_active', 'very_active', 'extra_active')
+
+# Lower is better for these, higher for throughput
+_LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'{process.args[0]} exited with status {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing listening on port {port} after {timeout}s')
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def health_profile(rng):
+    return {
+        'age': rng.randint(18, 75),
+        'gender': rng.choice(('male', 'female')),
+        # The schema validator wants doubles for these, not ints
+        'height': round(rng.uniform(150, 200), 1),
+        'weight': round(rng.uniform(45, 130), 1),
+        'activity_level': rng.choice(ACTIVITY_LEVELS),
+        'dietary_restrictions': []
+    }
+
+
+class Client:
+    """
+    One simulated user on a keep-alive connection. Every request is timed
+    and recorded under its operation name.
+    """
+
+    def __init__(self, host, port, rng, record):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+        self.rng = rng
+        self.record = record
+        self.token = None
+        self.email = None
+        self.password = None
+        self.questions = []
+
+    def request(self, op, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.record(op, time.perf_counter() - start, 0, None)
+            return 0, None
+        self.record(op, time.perf_counter() - start, response.status,
+                    response.getheader('X-DB-Round-Trips'))
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def register(self):
+        self.email = f'loadtest-{uuid.uuid4().hex}@example.com'
+        self.password = uuid.uuid4().hex
+        status, body = self.request('register', 'POST', '/api/auth/register', {
+            'email': self.email, 'password': self.password, 'name': 'Load Test', 'role': 'user'
+        })
+        if status == 201:
+            self.token = body['access_token']
+            self.request('create_profile', 'POST', '/api/profile/health', health_profile(self.rng))
+        return status
+
+    def login(self):
+        status, body = self.request('login', 'POST', '/api/auth/login',
+                                    {'email': self.email, 'password': self.password})
+        if status == 200:
+            self.token = body['access_token']
+
+    def get_profile(self):
+        self.request('get_profile', 'GET', '/api/profile/health')
+
+    def update_profile(self):
+        self.request('update_profile', 'PUT', '/api/profile/health',
+                     {'weight': round(self.rng.uniform(45, 130), 1)})
+
+    def create_plan(self):
+        self.request('create_plan', 'POST', '/api/meal-plan', {'duration': self.rng.choice((7, 14, 30))})
+
+    def list_plans(self):
+        self.request('list_plans', 'GET', '/api/meal-plan?fields=summary')
+
+    def get_questionnaire(self):
+        status, body = self.request('get_questionnaire', 'GET',
+                                    f'/api/profile/questionnaire?seed={self.rng.randint(0, 50)}')
+        if status == 200 and body:
+            self.questions = body.get('questions') or []
+
+    def analyze_questionnaire(self):
+        responses = {
+            question['id']: self.rng.choice(question['options'])
+            for question in self.questions
+            if isinstance(question, dict) and question.get('id') and question.get('options')
+        }
+        self.request('analyze_questionnaire', 'POST', '/api/profile/questionnaire/analyze',
+                     {'responses': responses or {'diet_type': 'Omnivore'}})
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.round_trips = defaultdict(list)
+        self.enabled = False
+
+    def __call__(self, op, elapsed, status, round_trips):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples[op].append(elapsed)
+            if not 200 <= status < 400:
+                self.errors[op] += 1
+            if round_trips is not None:
+                self.round_trips[op].append(int(round_trips))
+
+    def summary(self, elapsed):
+        ops = {}
+        for op, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            trips = self.round_trips[op]
+            ops[op] = {
+                'requests': len(ordered),
+                'errors': self.errors[op],
+                'throughput_rps': round(len(ordered) / elapsed, 2),
+                'p50_ms': round(percentile(ordered, 0.50) * 1e3, 3),
+                'p95_ms': round(percentile(ordered, 0.95) * 1e3, 3),
+                'p99_ms': round(percentile(ordered, 0.99) * 1e3, 3),
+                'round_trips': round(sum(trips) / len(trips), 2) if trips else None
+            }
+        everything = sorted(s for samples in self.samples.values() for s in samples)
+        trips = [t for values in self.round_trips.values() for t in values]
+        ops['total'] = {
+            'requests': len(everything),
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(len(everything) / elapsed, 2),
+            'p50_ms': round(percentile(everything, 0.50) * 1e3, 3),
+            'p95_ms': round(percentile(everything, 0.95) * 1e3, 3),
+            'p99_ms': round(percentile(everything, 0.99) * 1e3, 3),
+            'round_trips': round(sum(trips) / len(trips), 2) if trips else None
+        }
+        return ops
+
+
+def parse_mix(text):
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        op = op.strip()
+        if op not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f'unknown operation {op!r}; choose from {", ".join(DEFAULT_MIX)}')
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def user_loop(host, port, seed, mix, recorder, stop):
+    rng = random.Random(seed)
+    client = Client(host, port, rng, recorder)
+    if client.register() != 201:
+        return
+    client.get_questionnaire()
+    ops, weights = zip(*mix.items())
+    while not stop.is_set():
+        op = rng.choices(ops, weights)[0]
+        if op == 'register':
+            # A brand new user, who then carries on as this client
+            client.token = None
+            client.register()
+        else:
+            getattr(client, op)()
+
+
+def drive(url, users, duration, warmup, mix, seed):
+    parts = urlsplit(url)
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=user_loop, args=(parts.hostname, parts.port or 80, seed + i, mix, recorder, stop),
+                         daemon=True)
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.enabled = True
+    start = time.perf_counter()
+    time.sleep(duration)
+    recorder.enabled = False
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    return recorder.summary(elapsed)
+
+
+class ThrowawayDatabase:
+    """
+    A fresh database for one run: on the given server, or on a mongod
+    started in a temporary directory. Dropped (or deleted) afterwards.
+    """
+
+    def __init__(self, mongo_uri, mongod=None, keep=False):
+        self.mongo_uri = mongo_uri
+        self.mongod = mongod
+        self.keep = keep
+        self.name = f'dietcraft_loadtest_{uuid.uuid4().hex[:8]}'
+        self.process = None
+        self.dbpath = None
+
+    def __enter__(self):
+        if self.mongod:
+            self.dbpath = tempfile.mkdtemp(prefix='loadtest-mongod-')
+            port = free_port()
+            self.process = subprocess.Popen(
+                [self.mongod, '--dbpath', self.dbpath, '--port', str(port), '--bind_ip', '127.0.0.1'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            wait_for_port(port, 30, self.process)
+            self.mongo_uri = f'mongodb://127.0.0.1:{port}'
+        return f'{self.mongo_uri.rstrip("/")}/{self.name}'
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+        elif not self.keep:
+            from pymongo import MongoClient
+            client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=5000)
+            client.drop_database(self.name)
+            client.close()
+
+
+def start_server(mongo_uri, port, server='wsgi', **env_overrides):
+    """
+    Serve create_app() on `port` from a child process: Werkzeug's threaded
+    server for 'wsgi', uvicorn with asgi.py for 'asgi'.
+    """
+    env = dict(
+        os.environ, MONGO_URI=mongo_uri, DB_BOOTSTRAP_ON_STARTUP='1', **env_overrides,
+        JWT_SECRET_KEY=os.getenv('JWT_SECRET_KEY') or uuid.uuid4().hex,
+        FLASK_SECRET_KEY=os.getenv('FLASK_SECRET_KEY') or uuid.uuid4().hex
+    )
+    process = subprocess.Popen([sys.executable, '-c', SERVERS[server], str(port)], env=env)
+    try:
+        wait_for_port(port, 60, process)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary):
+    print(f'{"operation":22s} {"reqs":>7s} {"err":>5s} {"rps":>8s} {"p50 ms":>8s} {"p95 ms":>8s} '
+          f'{"p99 ms":>8s} {"trips":>6s}')
+    for op, stats in summary.items():
+        trips = '-' if stats['round_trips'] is None else f'{stats["round_trips"]:.1f}'
+        print(f'{op:22s} {stats["requests"]:7d} {stats["errors"]:5d} {stats["throughput_rps"]:8.1f} '
+              f'{stats["p50_ms"]:8.2f} {stats["p95_ms"]:8.2f} {stats["p99_ms"]:8.2f} {trips:>6s}')
+
+
+def run(args):
+    """
+    Exits 1 if more than --max-error-rate of the measured requests failed,
+    since latencies of a run that mostly errors say nothing.
+    """
+    mix = parse_mix(args.mix)
+    meta = {
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'server': args.url or args.server,
+        'users': args.users,
+        'duration': args.duration,
+        'mix': mix,
+        'seed': args.seed
+    }
+    if args.url:
+        summary = drive(args.url, args.users, args.duration, args.warmup, mix, args.seed)
+    else:
+        with ThrowawayDatabase(args.mongo_uri, args.mongod, args.keep_db) as mongo_uri:
+            port = free_port()
+            server = start_server(mongo_uri, port, args.server)
+            try:
+                summary = drive(f'http://127.0.0.1:{port}', args.users, args.duration,
+                                args.warmup, mix, args.seed)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    print_summary(summary)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': summary}, f, indent=2)
+        print(f'saved {args.save}')
+
+    total = summary['total']
+    error_rate = total['errors'] / total['requests'] if total['requests'] else 1.0
+    if error_rate > args.max_error_rate:
+        failing = ', '.join(f'{op}={stats["errors"]}' for op, stats in summary.items()
+                            if op != 'total' and stats['errors'])
+        print(f'error rate {error_rate:.2%} above {args.max_error_rate:.2%} ({failing or "no requests"})')
+        sys.exit(1)
+
+
+def compare(args):
+    """
+    A regression is a latency percentile or round-trip count that grew, or a
+    throughput that shrank, by more than the threshold. Exits 1 if any.
+    """
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.current) as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    for op in sorted(set(baseline) & set(current)):
+        before, after = baseline[op], current[op]
+        checks = [(key, before[key], after[key], 1) for key in _LATENCY_KEYS]
+        checks.append(('round_trips', before['round_trips'], after['round_trips'], 1))
+        checks.append(('throughput_rps', before['throughput_rps'], after['throughput_rps'], -1))
+        for key, old, new, direction in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = change * direction > args.threshold
+            if flag:
+                regressions.append((op, key))
+            if flag or args.verbose:
+                print(f'{"REGRESSION" if flag else "ok":10s} {op:22s} {key:15s} '
+                      f'{old:10.2f} -> {new:10.2f} ({change:+.1%})')
+    for op in sorted(set(baseline) - set(current)):
+        print(f'missing    {op}')
+
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+        sys.exit(1)
+    print(f'no regressions beyond {args.threshold:.0%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='drive a mixed workload and report latencies')
+    run_parser.add_argument('--users', type=int, default=8, help='concurrent clients')
+    run_parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds first')
+    run_parser.add_argument('--mix', help=f'op=weight,... from: {", ".join(DEFAULT_MIX)}')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--mongo-uri', default=os.getenv('LOADTEST_MONGO_URI', 'mongodb://localhost:27017'),
+                            help='server to create the throwaway database on')
+    run_parser.add_argument('--mongod', help='start this mongod binary in a temp dir instead')
+    run_parser.add_argument('--keep-db', action='store_true', help="don't drop the database afterwards")
+    run_parser.add_argument('--server', choices=sorted(SERVERS), default='wsgi',
+                            help='serve run.py-style WSGI or the asgi.py async mode')
+    run_parser.add_argument('--url', help='load an already running server instead of starting one')
+    run_parser.add_argument('--save', help='write the results as a JSON baseline')
+    run_parser.add_argument('--max-error-rate', type=float, default=0.0,
+                            help='fail the run above this fraction of failed requests')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='compare two saved runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='allowed relative change')
+    compare_parser.add_argument('--verbose', action='store_true', help='print every metric')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Lets `python -m pytest` from the backend directory import the `app` package
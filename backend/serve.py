@@ -0,0 +1,99 @@
+"""
+Production server: gunicorn with the app preloaded before forking.
+
+The master builds the app and everything the request path would otherwise
+load lazily (food catalog, NumPy, model artifact, question bank), then
+freezes the GC so those objects stay in pages the workers share
+copy-on-write. Each worker gets its own MongoClient after the fork.
+Workers, threads, timeouts and pool sizes come from config.Config.
+
+    python serve.py
+"""
+import gc
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from app import create_app, init_mongo, mongo
+from config import Config
+
+
+def warm_up():
+    """
+    Build the lazily-created state of the controller singletons now, once,
+    instead of in every worker on its first request. The question bank is
+    already loaded when the profile controller is imported.
+    """
+    from app.controllers import meal_plan_controlller
+    meal_planning_service = meal_plan_controlller.meal_planning_service
+    meal_planning_service.meal_selector  # food catalog and NumPy
+    recommender = meal_planning_service.nutrition_recommender
+    if recommender.model_store is not None:
+        recommender.model_store.reload()
+
+
+class Server(BaseApplication):
+    def __init__(self, app):
+        self.application = app
+        super().__init__()
+
+    def load_config(self):
+        config = self.application.config
+        settings = {
+            'bind': config['SERVER_BIND'],
+            'workers': config['SERVER_WORKERS'],
+            'threads': config['SERVER_THREADS'],
+            'worker_class': 'gthread' if config['SERVER_THREADS'] > 1 else 'sync',
+            'timeout': config['SERVER_TIMEOUT'],
+            'graceful_timeout': config['SERVER_GRACEFUL_TIMEOUT'],
+            'keepalive': config['SERVER_KEEPALIVE'],
+            'max_requests': config['SERVER_MAX_REQUESTS'],
+            'max_requests_jitter': config['SERVER_MAX_REQUESTS_JITTER'],
+            'preload_app': True,
+            'pre_fork': self.pre_fork,
+            'post_fork': self.post_fork
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+    def pre_fork(self, server, worker):
+        # Nothing should have connected in the master, but if something did
+        # (e.g. DB_BOOTSTRAP_ON_STARTUP) its sockets and monitor threads
+        # must not be inherited
+        mongo.cx.close()
+
+    def post_fork(self, server, worker):
+        init_mongo(self.application)
+        # Drain the outbox from every worker (claims keep them apart), so
+        # mail queued before a restart goes out without waiting for new mail
+        from app.services import email_service
+        if email_service.outbox_sender is not None:
+            email_service.outbox_sender.start()
+
+
+def main():
+    if Config.SERVER_WORKERS > 1:
+        # The in-memory profile cache is per process, so a profile update
+        # would only reach the worker that handled it; share one instead
+        os.environ.setdefault('HEALTH_PROFILE_CACHE_BACKEND', 'sqlite')
+    # Without a sender nothing delivers queued mail; set it to 0 when
+    # running `flask email-sender` separately
+    os.environ.setdefault('EMAIL_SENDER_IN_PROCESS', '1')
+    # create_app raises without SECRET_KEY/JWT_SECRET_KEY except in debug
+    # or testing, where it makes up throwaway keys; neither belongs here
+    app = create_app()
+    if app.debug or app.testing:
+        raise SystemExit('serve.py does not run with FLASK_DEBUG or TESTING; set real secrets instead')
+    warm_up()
+    # Move everything built so far out of the collector's reach, so a
+    # worker's GC passes don't touch (and un-share) the preloaded pages
+    gc.collect()
+    gc.freeze()
+    Server(app).run()
+
+
+if __name__ == '__main__':
+    main()
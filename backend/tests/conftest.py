@@ -0,0 +1,62 @@
+import os
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Tests that need a real server use this one; they are skipped without it
+TEST_MONGO_URI = os.environ.get('TEST_MONGO_URI') or 'mongodb://localhost:27017'
+
+
+@pytest.fixture
+def mongo_client():
+    client = MongoClient(TEST_MONGO_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        client.close()
+        pytest.skip(f'No MongoDB server at {TEST_MONGO_URI}')
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def mongo_db(mongo_client):
+    """
+    A throwaway database on the TEST_MONGO_URI server.
+    """
+    name = f'dietcraft_test_{uuid.uuid4().hex[:8]}'
+    yield mongo_client[name]
+    mongo_client.drop_database(name)
+
+
+@pytest.fixture
+def api():
+    """
+    The Flask blueprints on an in-memory Mongo (mongomock), with a
+    `token(user_id)` helper that returns an Authorization header.
+    """
+    mongomock = pytest.importorskip('mongomock')
+    from flask import Flask
+    from flask_jwt_extended import create_access_token
+
+    from app import jwt, mongo
+    from app.controllers import auth_controller, meal_plan_controlller, profile_controller
+    from app.serialization import init_json
+
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-secret', SECRET_KEY='test-secret', TESTING=True)
+    init_json(app)
+    jwt.init_app(app)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    for module in (auth_controller, profile_controller, meal_plan_controlller):
+        app.register_blueprint(module.bp)
+
+    def token(user_id):
+        with app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+    app.token = token
+    return app
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+from app import mongo
+
+
+@pytest.fixture
+def plan_id(api):
+    with api.app_context():
+        result = mongo.db.meal_plans.insert_one({
+            'user_id': 'owner', 'meals': [], 'duration': 1,
+            'start_date': datetime(2024, 1, 1), 'status': 'active', 'version': 3
+        })
+    return str(result.inserted_id)
+
+
+def test_owner_reads_and_revalidates_their_plan(api, plan_id):
+    client = api.test_client()
+    response = client.get(f'/api/meal-plan/{plan_id}', headers=api.token('owner'))
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    response = client.get(f'/api/meal-plan/{plan_id}', headers={**api.token('owner'), 'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_other_users_get_404_with_or_without_an_etag(api, plan_id):
+    client = api.test_client()
+    etag = client.get(f'/api/meal-plan/{plan_id}', headers=api.token('owner')).headers['ETag']
+
+    response = client.get(f'/api/meal-plan/{plan_id}', headers=api.token('intruder'))
+    assert response.status_code == 404
+    # A matching ETag must not confirm that the plan exists
+    response = client.get(f'/api/meal-plan/{plan_id}', headers={**api.token('intruder'), 'If-None-Match': etag})
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+
+
+def test_malformed_plan_ids_are_404(api):
+    response = api.test_client().get('/api/meal-plan/not-an-id', headers=api.token('owner'))
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('count', ['-1', '0', '51', '1000000'])
+def test_questionnaire_count_is_bounded(api, count):
+    response = api.test_client().get(f'/api/profile/questionnaire?seed=1&count={count}', headers=api.token('u'))
+    assert response.status_code == 400
+    response = api.test_client().get(f'/api/profile/questionnaire?count={count}', headers=api.token('u'))
+    assert response.status_code == 400
+
+
+def test_questionnaire_count_in_range(api):
+    response = api.test_client().get('/api/profile/questionnaire?seed=1&count=3', headers=api.token('u'))
+    assert response.status_code == 200
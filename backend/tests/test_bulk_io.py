@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+from flask import Flask
+from werkzeug.security import check_password_hash
+
+from app import mongo
+from app.services.bulk_io import import_documents, prepare_document
+from app.services.password_hasher import PasswordHasher
+
+mongomock = pytest.importorskip('mongomock')
+
+USER = {'email': 'a@example.com', 'name': 'A', 'role': 'user', 'active': 'true'}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    # Cheap hashes keep the test fast
+    import app.services.password_hasher as hasher_module
+    monkeypatch.setattr(hasher_module, 'password_hasher', PasswordHasher(method='pbkdf2:sha256:1000'))
+    return app
+
+
+def test_unknown_fields_are_rejected():
+    _, errors = prepare_document('health_profiles', {
+        'user_id': 'u', 'age': '30', 'gender': 'male', 'height': '180', 'weight': '80',
+        'activity_level': 'sedentary', 'favourite_colour': 'blue'
+    })
+    assert errors == ['favourite_colour: unknown field']
+
+
+def test_fields_the_app_writes_are_accepted():
+    document, errors = prepare_document('meal_plans', {
+        'user_id': 'u', 'meals': '[]', 'duration': '7', 'superseded_at': '2024-01-01T00:00:00'
+    })
+    assert errors == []
+    assert document['superseded_at'].year == 2024
+
+
+@pytest.mark.parametrize('field', ['passwd', 'user_password', 'pwd', 'api_secret'])
+def test_credential_columns_are_refused(field):
+    _, errors = prepare_document('users', {**USER, field: 'hunter2'})
+    assert errors == [f'{field}: refusing to import a plaintext credential']
+
+
+def test_plaintext_in_password_hash_is_refused():
+    _, errors = prepare_document('users', {**USER, 'password_hash': 'hunter2'})
+    assert errors == ['password_hash: not a password hash; import plaintext as password']
+
+
+def test_passwords_are_hashed_on_import(app):
+    stream = io.StringIO('email,name,role,active,password\n'
+                         'a@example.com,A,user,true,hunter2\n'
+                         'b@example.com,B,user,true,\n'
+                         'c@example.com,C,user,true,s3cret\n')
+    rejects = io.StringIO()
+    with app.app_context():
+        stats = import_documents('users', stream, 'csv', rejects)
+        users = {user['email']: user for user in mongo.db.users.find()}
+
+    assert stats.written == 3
+    for user in users.values():
+        assert 'password' not in user
+    assert check_password_hash(users['a@example.com']['password_hash'], 'hunter2')
+    assert check_password_hash(users['c@example.com']['password_hash'], 's3cret')
+    # No password: no way to log in with one, as for OAuth-only users
+    assert users['b@example.com']['password_hash'] == ''
+
+
+def test_rejected_rows_do_not_leak_credentials(app):
+    stream = io.StringIO(json.dumps({**USER, 'password': 'hunter2', 'password_hash': 'x'}) + '\n')
+    rejects = io.StringIO()
+    with app.app_context():
+        stats = import_documents('users', stream, 'jsonl', rejects)
+    assert stats.rejected == 1
+    assert 'hunter2' not in rejects.getvalue()
+    assert json.loads(rejects.getvalue())['row']['password'] == '<redacted>'
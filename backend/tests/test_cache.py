@@ -0,0 +1,143 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app import cache as cache_module
+from app.cache import MISSING, MemoryCache, SQLiteCache, private_dir
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache(ttl=60)
+    return SQLiteCache(str(tmp_path / 'cache.sqlite3'), ttl=60)
+
+
+def test_a_stale_versioned_set_is_refused(cache):
+    # A reader loads version 1, a writer then caches version 2, and the
+    # reader's late set must not put version 1 back
+    cache.set('user', {'weight': 80.0}, version=2.0)
+    cache.set('user', {'weight': 75.0}, version=1.0)
+    assert cache.get('user') == {'weight': 80.0}
+
+
+def test_newer_and_unversioned_sets_overwrite(cache):
+    cache.set('user', None, version=0.0)
+    cache.set('user', {'weight': 80.0}, version=2.0)
+    assert cache.get('user') == {'weight': 80.0}
+    cache.set('user', {'weight': 70.0})
+    assert cache.get('user') == {'weight': 70.0}
+
+
+def test_expired_entries_do_not_block_sets(cache):
+    cache.ttl = 0
+    cache.set('user', 'new', version=2.0)
+    cache.ttl = 60
+    cache.set('user', 'old', version=1.0)
+    assert cache.get('user') == 'old'
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a, worker_b = SQLiteCache(path), SQLiteCache(path)
+    worker_a.set('user', 'v1', version=1.0)
+    assert worker_b.get('user') == 'v1'
+    worker_b.set('user', 'v2', version=2.0)
+    assert worker_a.get('user') == 'v2'
+    worker_a.delete('user')
+    assert worker_b.get('user') is MISSING
+
+
+def test_sqlite_cache_round_trips_mongo_types(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    profile = {'_id': ObjectId(), 'last_updated': datetime(2024, 1, 1, 12), 'weight': 80.5, 'restrictions': ['nuts']}
+    cache.set('user', profile)
+    assert cache.get('user') == profile
+    assert os.stat(tmp_path / 'cache.sqlite3').st_mode & 0o777 == 0o600
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ('false',))
+
+
+def test_sqlite_cache_never_unpickles(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = SQLiteCache(path)
+    cache.set('user', 'v1')
+    conn = sqlite3.connect(path)
+    conn.execute('UPDATE cache SET value = ?', (pickle.dumps(Exploit()),))
+    conn.commit()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(os, 'system', lambda command: pytest.fail('unpickled a cache value'))
+        assert cache.get('user') is MISSING
+
+
+@pytest.mark.skipif(not hasattr(os, 'geteuid') or os.geteuid() != 0, reason='needs root to chown')
+def test_sqlite_cache_refuses_another_users_file(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    path.touch()
+    os.chown(path, 65534, 65534)
+    with pytest.raises(PermissionError):
+        SQLiteCache(str(path)).get('user')
+
+
+def test_private_dir_is_owner_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module.tempfile, 'gettempdir', lambda: str(tmp_path))
+    path = private_dir('cache')
+    assert os.stat(path).st_mode & 0o777 == 0o700
+    os.chmod(path, 0o777)
+    with pytest.raises(PermissionError):
+        private_dir('cache')
+
+
+class RecordingSQLiteCache(SQLiteCache):
+    def __init__(self, path):
+        super().__init__(path, ttl=60)
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, version=None):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, version=version)
+
+
+class Profiles:
+    def __init__(self, profile):
+        self.profile = profile
+        self.finds = 0
+
+    async def find_one(self, query):
+        self.finds += 1
+        return self.profile
+
+
+def test_the_async_models_keep_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    from app.aio import models as aio_models
+
+    profile_cache = RecordingSQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    profiles = Profiles({'_id': ObjectId(), 'user_id': 'u1', 'last_updated': datetime(2024, 1, 1)})
+    monkeypatch.setattr(aio_models, 'profile_cache', profile_cache)
+    monkeypatch.setattr(aio_models.aio_mongo, 'db', SimpleNamespace(health_profiles=profiles))
+
+    async def lookups():
+        first = await aio_models.AsyncHealthProfile.find_by_user_id('u1')
+        second = await aio_models.AsyncHealthProfile.find_by_user_id('u1')
+        return first, second, threading.get_ident()
+
+    first, second, loop_thread = asyncio.run(lookups())
+    assert first == second == profiles.profile
+    assert profiles.finds == 1
+    # get, set, get
+    assert len(profile_cache.threads) == 3
+    assert loop_thread not in profile_cache.threads
@@ -0,0 +1,37 @@
+import pytest
+
+from app import check_secrets
+from flask import Flask
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update({'SECRET_KEY': None, 'JWT_SECRET_KEY': None, **config})
+    return app
+
+
+def test_missing_secrets_refuse_to_start():
+    with pytest.raises(RuntimeError, match='SECRET_KEY and JWT_SECRET_KEY'):
+        check_secrets(make_app())
+
+
+@pytest.mark.parametrize('key, value', [('SECRET_KEY', 'dev-secret-key'), ('JWT_SECRET_KEY', 'jwt-secret-key')])
+def test_old_default_secrets_refuse_to_start(key, value):
+    app = make_app(SECRET_KEY='a' * 32, JWT_SECRET_KEY='b' * 32)
+    app.config[key] = value
+    with pytest.raises(RuntimeError, match=key):
+        check_secrets(app)
+
+
+def test_configured_secrets_are_kept():
+    app = make_app(SECRET_KEY='a' * 32, JWT_SECRET_KEY='b' * 32)
+    check_secrets(app)
+    assert (app.config['SECRET_KEY'], app.config['JWT_SECRET_KEY']) == ('a' * 32, 'b' * 32)
+
+
+def test_testing_gets_random_secrets():
+    first, second = make_app(TESTING=True), make_app(TESTING=True)
+    check_secrets(first)
+    check_secrets(second)
+    assert len(first.config['JWT_SECRET_KEY']) == 64
+    assert first.config['JWT_SECRET_KEY'] != second.config['JWT_SECRET_KEY']
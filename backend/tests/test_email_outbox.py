@@ -0,0 +1,206 @@
+"""
+The outbox sender against a local debugging SMTP server (aiosmtpd) and an
+in-memory Mongo (mongomock).
+"""
+import socket
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+mongomock = pytest.importorskip('mongomock')
+
+from app import mongo
+from app.models.email_outbox import EmailOutbox
+from app.models.indexes import INDEXES
+from app.services import email_service
+from app.services.email_service import OutboxSender, SMTPConnectionPool
+
+
+class Handler:
+    """
+    Accepts mail, except: recipients starting with 'reject' are refused
+    outright, and DATA for 'flaky' recipients fails while `failures` lasts.
+    """
+
+    def __init__(self):
+        self.received = []
+        self.failures = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('reject'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if any(rcpt.startswith('flaky') for rcpt in envelope.rcpt_tos) and self.failures:
+            self.failures -= 1
+            return '451 Try again later'
+        self.received.append((envelope.rcpt_tos, envelope.content.decode()))
+        return '250 Message accepted'
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    return app
+
+
+@pytest.fixture
+def sender(app, smtp_server):
+    _, port = smtp_server
+    pool = SMTPConnectionPool(host='127.0.0.1', port=port, starttls=False, timeout=5)
+    return OutboxSender(app, pool=pool, batch_size=3, max_attempts=3, base_backoff_seconds=60)
+
+
+def queue(app, *recipients):
+    with app.app_context():
+        return [EmailOutbox(to, 'Password Reset OTP', f'Your OTP is {i:06d}', '<p>otp</p>').save()
+                for i, to in enumerate(recipients)]
+
+
+def outbox(app):
+    with app.app_context():
+        return {message['to']: message for message in mongo.db.email_outbox.find()}
+
+
+def make_due(app):
+    with app.app_context():
+        mongo.db.email_outbox.update_many({}, {'$set': {'next_attempt_at': datetime.utcnow()}})
+
+
+def test_batches_are_sent_over_the_pool(app, sender, smtp_server):
+    handler, _ = smtp_server
+    queue(app, *(f'user{i}@example.com' for i in range(5)))
+
+    assert sender.drain_once() == 3
+    assert sender.drain_once() == 2
+    assert sender.drain_once() == 0
+
+    assert len(handler.received) == 5
+    assert 'Your OTP is 000000' in handler.received[0][1]
+    for message in outbox(app).values():
+        assert message['status'] == 'sent'
+        # The OTP doesn't outlive delivery
+        assert 'text' not in message and 'html' not in message
+        assert 'claim' not in message and 'lease_until' not in message
+
+
+def test_temporary_failures_back_off_and_retry(app, sender, smtp_server):
+    handler, _ = smtp_server
+    handler.failures = 1
+    queue(app, 'flaky@example.com')
+
+    before = datetime.utcnow()
+    sender.drain_once()
+    message = outbox(app)['flaky@example.com']
+    assert message['status'] == 'pending'
+    assert message['attempts'] == 1
+    assert message['next_attempt_at'] >= before + timedelta(seconds=59)
+    # Not due yet
+    assert sender.drain_once() == 0
+
+    make_due(app)
+    sender.drain_once()
+    assert outbox(app)['flaky@example.com']['status'] == 'sent'
+    assert len(handler.received) == 1
+
+
+def test_messages_are_dead_lettered(app, sender, smtp_server):
+    handler, _ = smtp_server
+    handler.failures = 10
+    queue(app, 'reject@example.com', 'flaky@example.com')
+
+    sender.drain_once()
+    # A refused recipient is permanent
+    assert outbox(app)['reject@example.com']['status'] == 'dead'
+    for _ in range(2):
+        make_due(app)
+        sender.drain_once()
+    message = outbox(app)['flaky@example.com']
+    assert message['status'] == 'dead'
+    assert message['attempts'] == 3
+    assert handler.received == []
+    # Dead messages don't keep the OTP either, so they can't be requeued
+    for message in outbox(app).values():
+        assert 'text' not in message and 'html' not in message
+    with app.app_context():
+        assert EmailOutbox.requeue_dead() == 0
+        mongo.db.email_outbox.update_one({'to': 'reject@example.com'}, {'$set': {'text': 'old body'}})
+        assert EmailOutbox.requeue_dead() == 1
+
+
+def test_a_lease_can_only_be_used_by_its_holder(app):
+    queue(app, 'a@example.com', 'b@example.com')
+    with app.app_context():
+        first = EmailOutbox.claim_batch(10, lease_seconds=0)
+        time.sleep(0.01)
+        # The first lease has run out; a second sender takes the messages over
+        second = EmailOutbox.claim_batch(10, lease_seconds=60)
+        assert {m['_id'] for m in first} == {m['_id'] for m in second}
+        assert EmailOutbox.claim_batch(10) == []
+
+        EmailOutbox.mark_sent(first[0]['claim'], [m['_id'] for m in first])
+        assert all(m['status'] == 'sending' for m in outbox(app).values())
+
+        lease = EmailOutbox.extend_lease(second[0]['claim'], [m['_id'] for m in second], 120)
+        # Stored at millisecond precision
+        assert all(abs(m['lease_until'] - lease) < timedelta(milliseconds=1) for m in outbox(app).values())
+        EmailOutbox.mark_sent(second[0]['claim'], [m['_id'] for m in second])
+        assert all(m['status'] == 'sent' for m in outbox(app).values())
+
+
+def test_the_lease_is_renewed_during_a_slow_batch(app, sender, monkeypatch):
+    queue(app, 'a@example.com', 'b@example.com', 'c@example.com')
+    renewals = []
+    extend = EmailOutbox.extend_lease
+    monkeypatch.setattr(EmailOutbox, 'extend_lease',
+                        staticmethod(lambda *args: renewals.append(args[1]) or extend(*args)))
+    # A lease shorter than two sends' worth is renewed before every message
+    sender.lease_seconds = 1
+    sender.drain_once()
+    assert [len(ids) for ids in renewals] == [3, 2, 1]
+
+
+def test_sent_messages_expire():
+    ttl = [model.document for model in INDEXES['email_outbox'] if 'expireAfterSeconds' in model.document]
+    assert [dict(spec['key']) for spec in ttl] == [{'sent_at': 1}]
+
+
+def test_each_message_is_marked_sent_as_soon_as_it_goes_out(app, sender, smtp_server, monkeypatch):
+    handler, _ = smtp_server
+    queue(app, 'a@example.com', 'b@example.com', 'c@example.com')
+    # The sender dies after handing over the second message
+    build = email_service.build_message
+    calls = []
+
+    def build_then_crash(sender_email, message):
+        calls.append(message['to'])
+        if len(calls) == 3:
+            raise RuntimeError('worker killed')
+        return build(sender_email, message)
+
+    monkeypatch.setattr(email_service, 'build_message', build_then_crash)
+    with pytest.raises(RuntimeError):
+        sender.drain_once()
+
+    statuses = {to: message['status'] for to, message in outbox(app).items()}
+    assert statuses == {'a@example.com': 'sent', 'b@example.com': 'sent', 'c@example.com': 'sending'}
+    assert len(handler.received) == 2
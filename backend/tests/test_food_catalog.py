@@ -0,0 +1,36 @@
+import pytest
+
+from app.ml_models.food_catalog import FoodCatalog, RESTRICTION_TAGS
+
+
+def bit(tag):
+    return 1 << RESTRICTION_TAGS.index(tag)
+
+
+@pytest.mark.parametrize('restriction, tag', [
+    ('Vegan', 'vegan'),
+    ('gluten-free', 'gluten_free'),
+    # The questionnaire's allergy options
+    ('Dairy', 'dairy_free'),
+    ('Gluten', 'gluten_free'),
+    ('Nuts', 'nut_free'),
+    # Free text
+    ('peanut allergy', 'nut_free'),
+    ('lactose intolerant', 'dairy_free'),
+    ('no shellfish', 'shellfish_free'),
+])
+def test_restrictions_map_to_tags(restriction, tag):
+    assert FoodCatalog.resolve_restrictions([restriction]) == (bit(tag), [])
+
+
+def test_unknown_restrictions_are_reported():
+    mask, unknown = FoodCatalog.resolve_restrictions(['Vegetarian', 'Other', 'sesame allergy', 'None', 'Omnivore'])
+    assert mask == bit('vegetarian')
+    assert unknown == ['Other', 'sesame allergy']
+
+
+def test_nut_allergy_excludes_nuts():
+    catalog = FoodCatalog.from_csv()
+    mask = catalog.restriction_mask(['Nuts'])
+    for slot in ('breakfast', 'lunch', 'dinner'):
+        assert all(catalog.tag_mask[i] & bit('nut_free') for i in catalog.eligible(slot, mask))
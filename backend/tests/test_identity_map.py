@@ -0,0 +1,125 @@
+import pytest
+from flask import Flask, jsonify
+from pymongo import MongoClient
+
+from app import mongo
+from app.models.health_profile import HealthProfile
+from app.models.user import User
+from app.models.identity_map import RoundTripCounter, report_round_trips
+from tests.conftest import TEST_MONGO_URI
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    return app
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """
+    Filters of every query sent to mongomock, in order (its find_one
+    goes through find).
+    """
+    sent = []
+    find = mongomock.collection.Collection.find
+
+    def spy(self, filter=None, *args, **kwargs):
+        sent.append((self.name, filter))
+        return find(self, filter, *args, **kwargs)
+    monkeypatch.setattr(mongomock.collection.Collection, 'find', spy)
+    return sent
+
+
+def make_user(app, email):
+    with app.app_context():
+        return User(email=email, name=email, role='user', password_hash='x').save()
+
+
+def test_repeated_lookups_hit_the_database_once(app, queries):
+    user_id = make_user(app, 'a@example.com')
+    with app.test_request_context():
+        by_email = User.find_by_email('a@example.com')
+        assert User.find_by_email('a@example.com') is by_email
+        # Filed under its _id too
+        assert User.find_by_id(user_id) is by_email
+        assert User.find_by_email('missing@example.com') is None
+        assert User.find_by_email('missing@example.com') is None
+    assert [collection for collection, _ in queries] == ['users', 'users']
+
+
+def test_writes_evict_the_collection(app, queries):
+    user_id = make_user(app, 'a@example.com')
+    with app.test_request_context():
+        User.find_by_id(user_id)
+        User.update_oauth_info(user_id, 'github', '42')
+        assert User.find_by_id(user_id)['oauth_id'] == '42'
+    assert len(queries) == 2
+
+
+def test_outside_a_request_nothing_is_cached(app, queries):
+    user_id = make_user(app, 'a@example.com')
+    with app.app_context():
+        User.find_by_id(user_id)
+        User.find_by_id(user_id)
+    assert len(queries) == 2
+
+
+def test_many_lookups_are_one_in_query(app, queries):
+    with app.app_context():
+        for user_id in ('u1', 'u2'):
+            mongo.db.health_profiles.insert_one({'user_id': user_id, 'weight': 70.0})
+    with app.test_request_context():
+        first = HealthProfile.find_by_user_id('u1')
+        queries.clear()
+        profiles = HealthProfile.find_many_by_user_ids(['u1', 'u2', 'u3', 'u2'])
+        assert profiles['u1'] is first
+        assert profiles['u2']['user_id'] == 'u2' and profiles['u3'] is None
+        # Only what the map didn't know, in one query
+        assert queries == [('health_profiles', {'user_id': {'$in': ['u2', 'u3']}})]
+        HealthProfile.find_many_by_user_ids(['u2', 'u3'])
+        assert len(queries) == 1
+
+
+def test_round_trips_are_reported_per_request():
+    app = Flask(__name__)
+    app.after_request(report_round_trips)
+    counter = RoundTripCounter()
+
+    @app.route('/three')
+    def three():
+        for _ in range(3):
+            counter.started(None)
+        return jsonify({})
+
+    @app.route('/none')
+    def none():
+        return jsonify({})
+
+    client = app.test_client()
+    assert client.get('/three').headers['X-DB-Round-Trips'] == '3'
+    assert client.get('/none').headers['X-DB-Round-Trips'] == '0'
+
+
+def test_round_trips_header_on_a_server(mongo_client):
+    app = Flask(__name__)
+    app.after_request(report_round_trips)
+    client = MongoClient(TEST_MONGO_URI, event_listeners=[RoundTripCounter()])
+    db = client['dietcraft_test_round_trips']
+
+    @app.route('/profiles')
+    def profiles():
+        mongo.cx, mongo.db = client, db
+        HealthProfile.find_many_by_user_ids(['u1', 'u2'])
+        HealthProfile.find_many_by_user_ids(['u1', 'u2'])
+        return jsonify({})
+
+    try:
+        assert app.test_client().get('/profiles').headers['X-DB-Round-Trips'] == '1'
+    finally:
+        client.drop_database(db.name)
+        client.close()
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from pymongo import ASCENDING
+
+from app.models.indexes import INDEXES, DuplicateKeysError, ensure_indexes, remove_duplicates
+
+PROFILES = {'health_profiles': INDEXES['health_profiles']}
+
+
+def seed_duplicates(db):
+    # What older versions left behind: a plain user_id index and one
+    # profile per save
+    db.health_profiles.create_index([('user_id', ASCENDING)], name='user_id')
+    db.health_profiles.insert_many([
+        {'user_id': 'u1', 'weight': 70.0, 'last_updated': datetime(2024, 1, 1)},
+        {'user_id': 'u1', 'weight': 72.0, 'last_updated': datetime(2024, 3, 1)},
+        {'user_id': 'u1', 'weight': 71.0, 'last_updated': datetime(2024, 2, 1)},
+        {'user_id': 'u2', 'weight': 60.0, 'last_updated': datetime(2024, 1, 1)}
+    ])
+
+
+def check_duplicates_block_then_dedupe(db):
+    seed_duplicates(db)
+
+    with pytest.raises(DuplicateKeysError, match="'user_id': 'u1'"):
+        ensure_indexes(db, PROFILES)
+    # Nothing was dropped
+    assert 'user_id' in db.health_profiles.index_information()
+
+    assert remove_duplicates(db.health_profiles, ['user_id'], [('last_updated', -1)], dry_run=True) == 2
+    assert db.health_profiles.count_documents({}) == 4
+    assert remove_duplicates(db.health_profiles, ['user_id'], [('last_updated', -1)]) == 2
+    assert sorted((p['user_id'], p['weight']) for p in db.health_profiles.find()) == [('u1', 72.0), ('u2', 60.0)]
+
+    assert ensure_indexes(db, PROFILES) == [
+        ('health_profiles', 'user_id', 'dropped'), ('health_profiles', 'user_id_unique', 'created')
+    ]
+    assert db.health_profiles.index_information()['user_id_unique']['unique']
+
+
+def test_duplicates_block_the_unique_index_until_removed():
+    mongomock = pytest.importorskip('mongomock')
+    check_duplicates_block_then_dedupe(mongomock.MongoClient().db)
+
+
+def test_duplicates_block_the_unique_index_on_a_server(mongo_db):
+    check_duplicates_block_then_dedupe(mongo_db)
@@ -0,0 +1,80 @@
+import pytest
+
+from app import mongo
+from app.models.meal_plan import MealPlan
+
+PROFILE = {'age': 30, 'gender': 'female', 'height': 168.0, 'weight': 64.0,
+           'activity_level': 'moderately_active', 'dietary_restrictions': []}
+
+
+def test_meals_update_targets_days_and_slots():
+    updates, filters = MealPlan.meals_update(days=[{'day': 2, 'lunch': 'a'}], slots=[(3, 'dinner', 'b')])
+    assert updates == {'meals.$[d2]': {'day': 2, 'lunch': 'a'}, 'meals.$[d3].dinner': 'b'}
+    assert filters == [{'d2.day': 2}, {'d3.day': 3}]
+
+
+@pytest.mark.parametrize('body', [{'start_day': 1}, {'version': 0}, {}])
+def test_start_day_and_version_are_required(api, body):
+    response = api.test_client().patch('/api/meal-plan/0123456789abcdef01234567/days',
+                                       json=body, headers=api.token('u1'))
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def live_api(api, mongo_client, mongo_db):
+    # arrayFilters need a real server; mongomock doesn't implement them
+    mongo.cx, mongo.db = mongo_client, mongo_db
+    return api
+
+
+@pytest.fixture
+def plan(live_api):
+    client, headers = live_api.test_client(), live_api.token('u1')
+    assert client.post('/api/profile/health', json=PROFILE, headers=headers).status_code in (200, 201)
+    response = client.post('/api/meal-plan', json={'duration': 3}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['meal_plan_id']
+
+
+def meals(api, plan_id):
+    response = api.test_client().get(f'/api/meal-plan/{plan_id}', headers=api.token('u1'))
+    return response.get_json()['meal_plan']
+
+
+def patch(api, plan_id, **body):
+    return api.test_client().patch(f'/api/meal-plan/{plan_id}/days', json=body, headers=api.token('u1'))
+
+
+def test_days_are_replaced_in_place(live_api, plan):
+    before = meals(live_api, plan)
+    response = patch(live_api, plan, start_day=2, version=0, seed=99)
+    assert response.status_code == 200
+    assert response.get_json()['version'] == 1
+
+    after = meals(live_api, plan)
+    assert after['version'] == 1
+    assert after['meals'][0] == before['meals'][0]
+    assert after['meals'][2] == before['meals'][2]
+    assert after['meals'][1]['day'] == 2 and after['meals'][1] != before['meals'][1]
+
+
+def test_a_single_slot_is_replaced(live_api, plan):
+    before = meals(live_api, plan)
+    assert patch(live_api, plan, start_day=3, slot='dinner', version=0, seed=99).status_code == 200
+    day = meals(live_api, plan)['meals'][2]
+    assert day['breakfast'] == before['meals'][2]['breakfast']
+    assert day['dinner'] != before['meals'][2]['dinner']
+
+
+def test_a_stale_version_is_a_conflict(live_api, plan):
+    assert patch(live_api, plan, start_day=1, version=0, seed=1).status_code == 200
+    response = patch(live_api, plan, start_day=2, version=0, seed=2)
+    assert response.status_code == 409
+    assert response.get_json()['version'] == 1
+    assert meals(live_api, plan)['version'] == 1
+
+
+def test_other_users_plans_are_not_found(live_api, plan):
+    response = live_api.test_client().patch(f'/api/meal-plan/{plan}/days', json={'start_day': 1, 'version': 0},
+                                            headers=live_api.token('u2'))
+    assert response.status_code == 404
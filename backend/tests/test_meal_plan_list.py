@@ -0,0 +1,83 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app import mongo
+
+
+@pytest.fixture
+def plans(api):
+    # Five plans for 'owner', two sharing a start_date so _id breaks the tie,
+    # and one for someone else
+    starts = [datetime(2024, 1, day) for day in (1, 2, 2, 3, 4)]
+    with api.app_context():
+        for start in starts:
+            mongo.db.meal_plans.insert_one({
+                'user_id': 'owner', 'meals': [{'day': 1}], 'duration': 1,
+                'start_date': start, 'status': 'active', 'version': 1
+            })
+        mongo.db.meal_plans.insert_one({
+            'user_id': 'other', 'meals': [], 'duration': 1,
+            'start_date': datetime(2024, 1, 5), 'status': 'active', 'version': 1
+        })
+        ordered = mongo.db.meal_plans.find({'user_id': 'owner'}, sort=[('start_date', -1), ('_id', -1)])
+        return [str(plan['_id']) for plan in ordered]
+
+
+def get(api, query=''):
+    return api.test_client().get(f'/api/meal-plan{query}', headers=api.token('owner'))
+
+
+def test_pages_walk_every_plan_once_newest_first(api, plans):
+    seen, cursor = [], None
+    while True:
+        response = get(api, '?limit=2' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['meal_plans']) <= 2
+        seen += [plan['_id'] for plan in body['meal_plans']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    assert seen == plans
+
+
+def test_the_last_page_has_no_cursor(api, plans):
+    body = get(api, '?limit=5').get_json()
+    assert len(body['meal_plans']) == 5
+    assert body['next_cursor'] is None
+
+
+def test_summary_drops_meals(api, plans):
+    plan = get(api, '?fields=summary').get_json()['meal_plans'][0]
+    assert 'meals' not in plan
+    assert plan['duration'] == 1
+
+
+@pytest.mark.parametrize('query', ['?fields=everything', '?limit=ten', '?cursor=garbage', '?stream=1&cursor=garbage'])
+def test_bad_parameters_are_400(api, plans, query):
+    assert get(api, query).status_code == 400
+
+
+def test_limit_is_clamped(api, plans):
+    assert len(get(api, '?limit=0').get_json()['meal_plans']) == 1
+    assert len(get(api, '?limit=1000').get_json()['meal_plans']) == 5
+
+
+@pytest.mark.parametrize('query, headers', [('?stream=1', {}), ('', {'Accept': 'application/x-ndjson'})])
+def test_streaming_returns_every_plan_as_ndjson(api, plans, query, headers):
+    response = api.test_client().get(f'/api/meal-plan{query}', headers={**api.token('owner'), **headers})
+    with response:
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert [json.loads(line)['_id'] for line in lines] == plans
+
+
+def test_streaming_resumes_from_a_cursor(api, plans):
+    cursor = get(api, '?limit=2').get_json()['next_cursor']
+    lines = get(api, f'?stream=1&fields=summary&cursor={cursor}').get_data(as_text=True).splitlines()
+    streamed = [json.loads(line) for line in lines]
+    assert [plan['_id'] for plan in streamed] == plans[2:]
+    assert all('meals' not in plan for plan in streamed)
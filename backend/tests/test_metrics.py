@@ -0,0 +1,29 @@
+import pytest
+from flask import Flask
+
+pytest.importorskip('prometheus_client')
+
+from app.metrics import init_metrics
+
+
+def make_app(token=None):
+    app = Flask(__name__)
+    app.config['METRICS_TOKEN'] = token
+    init_metrics(app)
+    return app
+
+
+def test_metrics_not_served_without_a_token():
+    assert make_app().test_client().get('/metrics').status_code == 404
+
+
+@pytest.mark.parametrize('header', [None, 'Bearer wrong', 'Bearer s3cret-but-longer', 's3cret'])
+def test_metrics_rejects_missing_or_wrong_token(header):
+    headers = {'Authorization': header} if header else {}
+    assert make_app('s3cret').test_client().get('/metrics', headers=headers).status_code == 404
+
+
+def test_metrics_served_with_the_token():
+    response = make_app('s3cret').test_client().get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert b'http_request_duration_seconds' in response.data
@@ -0,0 +1,68 @@
+import numpy as np
+
+from app.ml_models.nutrition_recommender import NutritionRecommender
+from benchmarks.bench_nutrition_batch import make_profiles
+
+
+def test_batch_matches_recommend_nutrition():
+    recommender = NutritionRecommender()
+    profiles = make_profiles(20000, seed=1)
+    batch = recommender.recommend_nutrition_batch(profiles)
+    for i in range(len(profiles)):
+        expected = recommender.recommend_nutrition({name: profiles[name][i].item() for name in profiles.dtype.names})
+        assert {key: batch[key][i] for key in expected} == expected
+
+
+def test_round2_matches_builtin_round_on_half_cents():
+    # Values whose * 100 lands on or next to .5, where np.round and round() disagree
+    values = np.array([0.125, 0.135, 1.005, 2.675, 1234.565, 1234.575, 99.995, -0.125, 0.0])
+    assert NutritionRecommender._round2(values).tolist() == [round(x, 2) for x in values.tolist()]
+
+
+def test_round2_matches_builtin_round_on_a_dense_grid():
+    # Every third decimal up to 5000, so every half-cent in range is hit
+    values = np.arange(0, 5_000_000, 7) / 1000
+    assert NutritionRecommender._round2(values).tolist() == [round(x, 2) for x in values.tolist()]
+
+
+PROFILE = {'weight': 70, 'height': 175, 'age': 30, 'gender': 'Male', 'activity_level': 'moderately_active'}
+
+
+def test_equivalent_profiles_share_a_fingerprint():
+    recommender = NutritionRecommender()
+    same = {'weight': 70.0, 'height': 175.0, 'age': '30', 'gender': 'male',
+            'activity_level': 'moderately_active', 'dietary_restrictions': ['vegan']}
+    assert recommender.fingerprint(same) == recommender.fingerprint(PROFILE)
+    # Unknown activity levels all fall back to the same multiplier
+    assert (recommender.fingerprint({**PROFILE, 'activity_level': 'couch'})
+            == recommender.fingerprint({**PROFILE, 'activity_level': 'hammock'}))
+    assert recommender.fingerprint({**PROFILE, 'weight': 71}) != recommender.fingerprint(PROFILE)
+
+
+def test_recommendations_are_memoized(monkeypatch):
+    recommender = NutritionRecommender()
+    calls = []
+    compute = recommender._compute_nutrition
+    monkeypatch.setattr(recommender, '_compute_nutrition', lambda profile: calls.append(profile) or compute(profile))
+
+    first = recommender.recommend_nutrition(PROFILE)
+    first['calories'] = -1
+    # The caller's copy is theirs to change; the cached targets aren't touched
+    assert recommender.recommend_nutrition({**PROFILE, 'weight': 70.0}) == compute(PROFILE)
+    assert len(calls) == 1
+    assert recommender.cache_stats()['hits'] == 1
+
+
+def test_a_new_model_version_misses(monkeypatch):
+    recommender = NutritionRecommender()
+    recommender.recommend_nutrition(PROFILE)
+    monkeypatch.setattr(recommender, 'model_version', lambda: 'v2')
+    recommender.recommend_nutrition(PROFILE)
+    assert recommender.cache_stats()['misses'] == 2
+
+
+def test_memoization_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv('NUTRITION_CACHE_SIZE', '0')
+    recommender = NutritionRecommender()
+    assert recommender.recommend_nutrition(PROFILE) == recommender.recommend_nutrition(PROFILE)
+    assert recommender.cache_stats()['hits'] == 0
@@ -0,0 +1,80 @@
+import pytest
+from flask import Flask
+from pymongo.errors import DuplicateKeyError
+
+from app import mongo
+from app.models.indexes import ensure_indexes
+from app.models.user import User
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    with app.app_context():
+        ensure_indexes(mongo.db)
+    return app
+
+
+def users(app):
+    with app.app_context():
+        return {user['email']: user for user in mongo.db.users.find()}
+
+
+def test_a_new_user_is_created(app):
+    with app.app_context():
+        user = User.upsert_oauth_user('new@example.com', 'New', 'google', 'g1')
+    assert user['email'] == 'new@example.com'
+    assert (user['oauth_provider'], user['oauth_id']) == ('google', 'g1')
+    assert user['password_hash'] == '' and user['role'] == 'user'
+    assert list(users(app)) == ['new@example.com']
+
+
+def test_an_existing_email_is_linked(app):
+    with app.app_context():
+        user_id = User(email='pw@example.com', name='Pw', role='user', password_hash='hash').save()
+        user = User.upsert_oauth_user('pw@example.com', 'Someone else', 'github', 'h1')
+    assert str(user['_id']) == user_id
+    assert (user['oauth_provider'], user['oauth_id']) == ('github', 'h1')
+    # Nothing else about the account changes
+    assert user['name'] == 'Pw' and user['password_hash'] == 'hash'
+    assert len(users(app)) == 1
+
+
+def test_the_identity_owner_wins_over_the_email_owner(app):
+    with app.app_context():
+        User(email='first@example.com', name='First', role='user', oauth_provider='google', oauth_id='g1').save()
+        User(email='second@example.com', name='Second', role='user', password_hash='hash').save()
+        # Google still reports the old address, which now belongs to another account
+        user = User.upsert_oauth_user('second@example.com', 'First', 'google', 'g1')
+    assert user['email'] == 'first@example.com'
+    second = users(app)['second@example.com']
+    assert second['oauth_provider'] is None and second['oauth_id'] is None
+
+
+def test_a_lost_race_finds_the_winner(app, monkeypatch):
+    save = User.save
+
+    def save_after_rival(self):
+        # Another login created the same user between our lookups and insert
+        monkeypatch.setattr(User, 'save', save)
+        save(User(email=self.email, name='Rival', role='user', oauth_provider='google', oauth_id='g1'))
+        return save(self)
+
+    monkeypatch.setattr(User, 'save', save_after_rival)
+    with app.app_context():
+        user = User.upsert_oauth_user('race@example.com', 'Racer', 'google', 'g1')
+    assert user['name'] == 'Rival'
+    assert len(users(app)) == 1
+
+
+def test_retries_are_bounded(app, monkeypatch):
+    def always_conflicts(self):
+        raise DuplicateKeyError('E11000')
+
+    monkeypatch.setattr(User, 'save', always_conflicts)
+    with app.app_context(), pytest.raises(DuplicateKeyError):
+        User.upsert_oauth_user('race@example.com', 'Racer', 'google', 'g1', attempts=2)
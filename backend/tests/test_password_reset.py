@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import mongo
+from app.models.user import User
+from app.services.auth_service import MAX_RESET_ATTEMPTS
+from app.services.password_hasher import password_hasher
+
+
+@pytest.fixture
+def users(api):
+    with api.app_context():
+        for email in ('alice@example.com', 'bob@example.com'):
+            User(email=email, name=email, role='user', password_hash=password_hasher.hash('old-password')).save()
+    return api
+
+
+def request_code(api, email):
+    client = api.test_client()
+    assert client.post('/api/auth/reset-password', json={'email': email}).status_code == 200
+    with api.app_context():
+        return mongo.db.users.find_one({'email': email})['reset_token']
+
+
+def reset(api, email, code, password='new-password'):
+    return api.test_client().post(f'/api/auth/reset-password/{code}',
+                                  json={'email': email, 'new_password': password})
+
+
+def password_of(api, email):
+    with api.app_context():
+        return mongo.db.users.find_one({'email': email})['password_hash']
+
+
+def test_the_code_resets_the_password_once(users):
+    code = request_code(users, 'alice@example.com')
+    assert len(code) == 6 and code.isdigit()
+
+    assert reset(users, 'alice@example.com', code).status_code == 200
+    assert password_hasher.verify(password_of(users, 'alice@example.com'), 'new-password')
+    # Used up
+    assert reset(users, 'alice@example.com', code, 'another').status_code == 400
+
+
+def test_the_code_only_works_for_its_own_email(users):
+    code = request_code(users, 'alice@example.com')
+    assert reset(users, 'bob@example.com', code).status_code == 400
+    assert password_hasher.verify(password_of(users, 'bob@example.com'), 'old-password')
+
+
+def test_email_is_required(users):
+    code = request_code(users, 'alice@example.com')
+    response = users.test_client().post(f'/api/auth/reset-password/{code}', json={'new_password': 'x'})
+    assert response.status_code == 400
+
+
+def test_too_many_wrong_guesses_discard_the_code(users):
+    code = request_code(users, 'alice@example.com')
+    wrong = f'{(int(code) + 1) % 10 ** 6:06d}'
+    for _ in range(MAX_RESET_ATTEMPTS):
+        assert reset(users, 'alice@example.com', wrong).status_code == 400
+    assert reset(users, 'alice@example.com', code).status_code == 400
+    assert password_hasher.verify(password_of(users, 'alice@example.com'), 'old-password')
+
+
+def test_an_expired_code_is_refused(users):
+    code = request_code(users, 'alice@example.com')
+    with users.app_context():
+        mongo.db.users.update_one({'email': 'alice@example.com'},
+                                  {'$set': {'reset_token_expires': datetime.utcnow() - timedelta(seconds=1)}})
+    assert reset(users, 'alice@example.com', code).status_code == 400
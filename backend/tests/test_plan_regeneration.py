@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from app import mongo
+from app.models.job_checkpoint import JobCheckpoint
+from app.services.plan_regeneration import MealPlanRegenerationJob, plan_chunk
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def profile(weight):
+    return {'weight': weight, 'height': 180.0, 'age': 30, 'gender': 'male',
+            'activity_level': 'sedentary', 'dietary_restrictions': []}
+
+
+def test_a_bad_profile_fails_alone():
+    plans, failures, _ = plan_chunk([('ok', profile(80.0), 2), ('bad', profile(None), 2), ('ok2', profile(70.0), 2)])
+    assert [user_id for user_id, _, _ in plans] == ['ok', 'ok2']
+    assert [user_id for user_id, _ in failures] == ['bad']
+    assert failures[0][1].startswith('TypeError')
+
+
+def test_the_job_records_failures_and_finishes():
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    with app.app_context():
+        for i, weight in enumerate([80.0, None, 70.0, 'heavy', 90.0]):
+            mongo.db.health_profiles.insert_one({'user_id': f'u{i}', **profile(weight)})
+            mongo.db.meal_plans.insert_one({'user_id': f'u{i}', 'meals': [], 'duration': 3,
+                                            'start_date': datetime(2024, 1, 1), 'status': 'active'})
+
+        state = MealPlanRegenerationJob(chunk_size=2, workers=1, job_name='test-regeneration').run()
+
+        assert (state.processed, state.written, state.failed) == (5, 3, 2)
+        checkpoint = JobCheckpoint.load('test-regeneration')
+        assert checkpoint['status'] == 'done'
+        assert checkpoint['failed'] == 2
+        assert [failure['user_id'] for failure in checkpoint['failures']] == ['u1', 'u3']
+        # Users whose profile failed keep their old plan active
+        active = {plan['user_id'] for plan in mongo.db.meal_plans.find({'status': 'active', 'duration': 3, 'meals': []})}
+        assert active == {'u1', 'u3'}
+
+        # The next run starts over with a clean failure list
+        MealPlanRegenerationJob(chunk_size=2, workers=1, job_name='test-regeneration').run()
+        assert len(JobCheckpoint.load('test-regeneration')['failures']) == 2
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+import pytest
+
+from app.ml_models.predict_batcher import PredictBatcher, batcher_stats
+
+
+def row_sums(features):
+    if np.any(features < 0):
+        raise ValueError('negative feature')
+    return features.sum(axis=1)
+
+
+def test_concurrent_calls_share_a_batch():
+    batcher = PredictBatcher(row_sums, max_wait_ms=50)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: batcher.predict([i, i, i]), range(8)))
+    assert [r.tolist() for r in results] == [[3.0 * i] for i in range(8)]
+    assert batcher.stats()['batches'] < 8
+
+
+def test_wrong_feature_count_is_rejected_up_front():
+    batcher = PredictBatcher(row_sums, n_features=3)
+    with pytest.raises(ValueError):
+        batcher.predict([1, 2])
+    assert batcher.predict([1, 2, 3]).tolist() == [6.0]
+    assert batcher.stats()['rejected'] == 1
+
+
+def test_a_failing_row_only_fails_its_caller():
+    batcher = PredictBatcher(row_sums, max_wait_ms=100)
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(batcher.predict, [i, 1.0]) for i in (1, -1, 2, 3)]
+        outcomes = [f.exception() or f.result().tolist() for f in futures]
+    assert isinstance(outcomes[1], ValueError)
+    assert [outcomes[i] for i in (0, 2, 3)] == [[2.0], [3.0], [4.0]]
+
+
+def test_callers_time_out_instead_of_blocking():
+    release = threading.Event()
+
+    def stuck(features):
+        release.wait(5)
+        return features.sum(axis=1)
+
+    batcher = PredictBatcher(stuck, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        batcher.predict([1.0])
+    assert time.monotonic() - started < 2
+    release.set()
+    assert batcher.stats()['timeouts'] == 1
+
+
+def test_stats_are_exported_to_prometheus():
+    prometheus_client = pytest.importorskip('prometheus_client')
+    batcher = PredictBatcher(row_sums)
+    batcher.predict([1.0, 2.0])
+    assert batcher_stats()['requests'] >= 1
+    exposition = prometheus_client.generate_latest().decode()
+    assert 'nutrition_predict_batcher_requests_total' in exposition
+    assert 'nutrition_predict_batcher_queue_depth' in exposition
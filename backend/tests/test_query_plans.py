@@ -0,0 +1,22 @@
+from app.models.email_outbox import EmailOutbox
+from app.models.health_profile import HealthProfile
+from app.models.indexes import check_query_plans, ensure_indexes, query_shapes
+from app.models.meal_plan import MealPlan
+from app.models.user import User
+from app.services.plan_regeneration import MealPlanRegenerationJob
+from app.services.replanning_consumer import ReplanningConsumer
+
+MODELS = {cls.__name__: cls for cls in (
+    User, HealthProfile, MealPlan, EmailOutbox, MealPlanRegenerationJob, ReplanningConsumer
+)}
+
+
+def test_query_shapes_name_existing_methods():
+    for name, _, _, _ in query_shapes():
+        cls, method = name.split('.')
+        assert hasattr(MODELS[cls], method), name
+
+
+def test_model_queries_use_an_index(mongo_db):
+    ensure_indexes(mongo_db)
+    assert check_query_plans(mongo_db) == []
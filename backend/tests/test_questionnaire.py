@@ -0,0 +1,53 @@
+import pytest
+
+from app.ml_models.questionnaire_generator import CompiledRules, QuestionnaireGenerator
+from app.services.assessment_service import MAX_ANALYSIS_BATCH
+from benchmarks.bench_questionnaire import legacy_analyze, random_response_sets
+
+
+def test_compiled_rules_match_the_if_chain():
+    generator = QuestionnaireGenerator()
+    for responses in random_response_sets(generator, 2000, seed=3):
+        assert generator.analyze_responses(responses) == legacy_analyze(responses)
+
+
+@pytest.mark.parametrize('responses', [
+    {},
+    {'medical_conditions': None},
+    {'medical_conditions': ['Diabetes']},
+    {'diet_type': ['Vegan'], 'sleep_quality': {'answer': 'Poor'}},
+    {'diet_type': 'vegan', 'exercise_frequency': 'Never', 'medical_conditions': 'None'}
+])
+def test_unlisted_and_unhashable_answers_match_the_if_chain(responses):
+    assert QuestionnaireGenerator().analyze_responses(responses) == legacy_analyze(responses)
+
+
+def test_rules_fire_in_declaration_order():
+    rules = CompiledRules([
+        {'question_id': 'q', 'answers': ['a'], 'category': 'health_alerts', 'recommendation': 'first'},
+        {'question_id': 'q', 'answers_except': ['b'], 'category': 'health_alerts', 'recommendation': 'second'},
+        {'question_id': 'r', 'answers': ['a'], 'category': 'health_alerts', 'recommendation': 'third'}
+    ])
+    assert rules.analyze({'q': 'a', 'r': 'a'})['health_alerts'] == ['first', 'second', 'third']
+    assert rules.analyze({'q': 'b'})['health_alerts'] == []
+    assert rules.analyze({})['health_alerts'] == ['second']
+
+
+def analyze_batch(api, body):
+    return api.test_client().post('/api/profile/questionnaire/analyze-batch', json=body, headers=api.token('u'))
+
+
+def test_batch_endpoint_analyzes_each_set(api):
+    sets = [{'diet_type': 'Vegan'}, {'sleep_quality': 'Good', 'medical_conditions': 'None'}]
+    response = analyze_batch(api, {'responses': sets})
+    assert response.status_code == 200
+    assert response.get_json()['analyses'] == [legacy_analyze(responses) for responses in sets]
+
+
+@pytest.mark.parametrize('body', [{}, {'responses': {'diet_type': 'Vegan'}}, {'responses': ['Vegan']}])
+def test_batch_endpoint_rejects_malformed_bodies(api, body):
+    assert analyze_batch(api, body).status_code == 400
+
+
+def test_batch_endpoint_is_bounded(api):
+    assert analyze_batch(api, {'responses': [{}] * (MAX_ANALYSIS_BATCH + 1)}).status_code == 413
@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from pymongo.errors import AutoReconnect
+
+from app import mongo
+from app.models.health_profile import HealthProfile
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.meal_plan import MealPlan
+from app.services.replanning_consumer import ReplanningConsumer
+
+PROFILE = {'age': 30, 'gender': 'male', 'height': 180.0, 'weight': 80.0,
+           'activity_level': 'sedentary', 'dietary_restrictions': []}
+
+
+class FailingPlanner:
+    def __init__(self, error):
+        self.error = error
+
+    def replan_days(self, *args, **kwargs):
+        raise self.error
+
+
+@pytest.fixture
+def app():
+    mongomock = pytest.importorskip('mongomock')
+    app = Flask(__name__)
+    client = mongomock.MongoClient()
+    mongo.cx, mongo.db = client, client.db
+    with app.app_context():
+        mongo.db.health_profiles.insert_one({'user_id': 'u1', **PROFILE})
+        mongo.db.meal_plans.insert_one({'user_id': 'u1', 'meals': [], 'duration': 7, 'version': 0,
+                                        'start_date': datetime.utcnow(), 'status': 'active'})
+        yield app
+
+
+def test_a_broken_user_is_recorded_and_skipped(app):
+    consumer = ReplanningConsumer(job_name='test-replanning', planner=FailingPlanner(KeyError('weight')))
+
+    assert consumer.replan_user('u1') == 0
+
+    assert (consumer.stats.failed, consumer.stats.retries, consumer.stats.users) == (1, 0, 0)
+    # Not pending again, so the checkpoint can move past their edits
+    assert 'u1' not in consumer._pending
+    failures = JobCheckpoint.load('test-replanning')['failures']
+    assert [(f['user_id'], f['error']) for f in failures] == [('u1', "KeyError: 'weight'")]
+
+
+def test_database_errors_are_retried_then_given_up(app):
+    consumer = ReplanningConsumer(job_name='test-replanning', planner=FailingPlanner(AutoReconnect('down')),
+                                  max_attempts=3)
+
+    for _ in range(2):
+        consumer.replan_user('u1')
+        assert consumer.due(force=True) == ['u1']
+    consumer.replan_user('u1')
+
+    assert (consumer.stats.retries, consumer.stats.failed) == (2, 1)
+    assert 'u1' not in consumer._pending
+    assert JobCheckpoint.load('test-replanning')['failures'][0]['error'] == 'AutoReconnect: down'
+
+
+def test_the_change_stream_replans_edited_users(mongo_client, mongo_db):
+    if not mongo_client.admin.command('hello').get('setName'):
+        pytest.skip('Change streams need a replica set')
+    app = Flask(__name__)
+    mongo.cx, mongo.db = mongo_client, mongo_db
+    with app.app_context():
+        mongo.db.health_profiles.insert_one({'user_id': 'u1', **PROFILE, 'last_updated': datetime.utcnow()})
+        plan_id = MealPlan('u1', [], 7, start_date=datetime.utcnow() - timedelta(days=1)).save()
+
+        consumer = ReplanningConsumer(debounce=0.1, max_wait=1, job_name='test-replanning')
+        replanned = threading.Event()
+        stop = threading.Event()
+        worker = threading.Thread(target=consumer.run, kwargs={
+            'restart': True, 'stop': stop, 'on_replan': lambda user_id, plans: replanned.set()
+        })
+        worker.start()
+        try:
+            time.sleep(0.5)  # let the stream open
+            mongo.db.health_profiles.update_one({'user_id': 'u1'}, {'$set': {'weight': 95.0}})
+            assert replanned.wait(timeout=10)
+        finally:
+            stop.set()
+            worker.join()
+
+        assert (consumer.stats.users, consumer.stats.plans, consumer.stats.failed) == (1, 1, 0)
+        assert MealPlan.find_version(plan_id)['version'] == 1
+        assert JobCheckpoint.load('test-replanning')['resume_token'] is not None
+
+
+def test_due_users_are_loaded_with_one_query(app, monkeypatch):
+    mongo.db.health_profiles.insert_one({'user_id': 'u2', **PROFILE})
+    loads = []
+    find_many = HealthProfile.find_many_by_user_ids
+    monkeypatch.setattr(HealthProfile, 'find_many_by_user_ids',
+                        staticmethod(lambda user_ids: loads.append(list(user_ids)) or find_many(user_ids)))
+    consumer = ReplanningConsumer(job_name='test-replanning', planner=FailingPlanner(KeyError('weight')))
+    for user_id in ('u1', 'u2', 'gone'):
+        consumer.handle({'_id': {'_data': user_id}, 'fullDocument': {'user_id': user_id}})
+
+    consumer.replan_due(force=True)
+
+    assert loads == [['u1', 'u2', 'gone']]
+    # u1's plan reached the planner, u2 has no plan, 'gone' has no profile
+    assert (consumer.stats.failed, consumer.stats.users) == (1, 1)
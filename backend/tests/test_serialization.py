@@ -0,0 +1,89 @@
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from bson import Binary, Decimal128, ObjectId
+from flask import Flask, jsonify
+
+from app import mongo
+from app.controllers.meal_plan_controlller import STREAM_MEALS_THRESHOLD
+from app.serialization import default, dumps, init_json, loads, stream_object
+
+OID = ObjectId('0123456789abcdef01234567')
+DOCUMENT = {
+    '_id': OID,
+    'created': datetime(2024, 1, 2, 3, 4, 5),
+    'day': date(2024, 1, 2),
+    'price': Decimal128('1.10'),
+    'ratio': Decimal('0.5'),
+    'token': uuid.UUID(int=1),
+    'blob': Binary(b'\x00\x01'),
+    'targets': np.array([1.5, 2.0]),
+    'count': np.int64(3),
+    'name': 'Crème brûlée',
+    'nested': {'ids': [OID, OID]}
+}
+EXPECTED = {
+    '_id': '0123456789abcdef01234567',
+    'created': '2024-01-02T03:04:05',
+    'day': '2024-01-02',
+    'price': '1.10',
+    'ratio': '0.5',
+    'token': '00000000-0000-0000-0000-000000000001',
+    'blob': 'AAE=',
+    'targets': [1.5, 2.0],
+    'count': 3,
+    'name': 'Crème brûlée',
+    'nested': {'ids': ['0123456789abcdef01234567'] * 2}
+}
+
+
+def test_mongo_documents_encode():
+    assert loads(dumps(DOCUMENT)) == EXPECTED
+    # The standard library with the same default agrees, so the output doesn't
+    # depend on whether orjson is installed
+    assert json.loads(json.dumps(DOCUMENT, default=default)) == EXPECTED
+
+
+def test_unknown_types_are_refused():
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_sort_keys_and_indent():
+    assert dumps({'b': 1, 'a': 2}, sort_keys=True) == '{"a":2,"b":1}'
+    assert dumps({'a': [1]}, indent=True) == '{\n  "a": [\n    1\n  ]\n}'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 32])
+def test_streamed_objects_match_dumps(chunk_size):
+    body = {'success': True, 'empty': [], 'meal_plan': {**DOCUMENT, 'meals': [{'day': day} for day in range(70)]}}
+    assert loads(''.join(stream_object(body, chunk_size))) == loads(dumps(body))
+
+
+def test_jsonify_uses_the_bson_encoder():
+    app = Flask(__name__)
+    init_json(app)
+    with app.app_context():
+        assert loads(jsonify(DOCUMENT).get_data()) == EXPECTED
+
+
+def test_long_plans_are_streamed(api):
+    meals = [{'day': day, 'breakfast': {'name': 'Oats'}} for day in range(1, STREAM_MEALS_THRESHOLD + 2)]
+    with api.app_context():
+        plan_id = mongo.db.meal_plans.insert_one({
+            'user_id': 'owner', 'meals': meals, 'duration': len(meals),
+            'start_date': datetime(2024, 1, 1), 'status': 'active', 'version': 1
+        }).inserted_id
+
+    response = api.test_client().get(f'/api/meal-plan/{plan_id}', headers=api.token('owner'))
+    with response:
+        assert response.status_code == 200
+        assert response.is_streamed
+        plan = loads(response.get_data())['meal_plan']
+    assert plan['_id'] == str(plan_id)
+    assert plan['start_date'] == '2024-01-01T00:00:00'
+    assert plan['meals'] == meals